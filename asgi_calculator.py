@@ -0,0 +1,413 @@
+"""ASGI variant of the web calculator routes
+
+Run it with any ASGI server, for example:
+
+    uvicorn asgi_calculator:app
+
+Cheap calculations are evaluated inline on the event loop.  Plots and
+anything that can run away (factorials, powers) are awaited from a thread
+pool that hands them to the worker processes, so keypad requests are never
+stuck behind a render.
+"""
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl
+
+import core
+import telemetry
+import web_calculator
+from expression import parse
+from web_calculator import (
+    PoolBusy, REQUESTS, REQUEST_SECONDS, batch_items, cached_render, calculate_batch_results,
+    count_error, evaluate, STREAM_HEADERS, index_page, list_elements, metrics_text,
+    numeric_mode, plot_batch_body, plot_cache, plot_error_fields, plot_json, plot_stream_events,
+    prepare_plot, preview_result, profile_file, profile_listing,
+    run_job, search_elements, solve_job, worker_pool,
+)
+
+config = web_calculator.app.config
+
+# Request bodies larger than this are rejected before they are parsed
+MAX_BODY_BYTES = 1024 * 1024
+
+# Threads that wait on the worker pool; one per job it will accept
+executor = ThreadPoolExecutor(
+    max_workers=max(1, config['WORKER_PROCESSES'] + config['WORKER_QUEUE_SIZE']),
+    thread_name_prefix='plot',
+)
+
+
+class Request:
+    def __init__(self, scope, body):
+        self.method = scope['method']
+        self.path = scope['path']
+        self.headers = {name.decode('latin-1').lower(): value.decode('latin-1')
+                        for name, value in scope['headers']}
+        self.query = dict(parse_qsl(scope['query_string'].decode('latin-1')))
+        self.body = body
+
+    @property
+    def form(self):
+        if self.headers.get('content-type', '').startswith('application/x-www-form-urlencoded'):
+            return dict(parse_qsl(self.body.decode('utf-8')))
+        return {}
+
+    @property
+    def values(self):
+        """Query string and form fields merged, like Flask's request.values"""
+        return {**self.query, **self.form}
+
+    def json(self):
+        try:
+            return json.loads(self.body)
+        except ValueError:
+            return None
+
+
+class Response:
+    def __init__(self, body=b'', status=200, content_type='application/json', headers=None):
+        self.body = body
+        self.status = status
+        self.headers = dict(headers or {})
+        if body or status != 304:
+            self.headers['content-type'] = content_type
+
+
+class StreamingResponse:
+    """A response whose body comes from a (blocking) iterator of chunks"""
+
+    def __init__(self, chunks, content_type, headers=None):
+        self.chunks = chunks
+        self.status = 200
+        self.headers = {name.lower(): value for name, value in (headers or {}).items()}
+        self.headers['content-type'] = content_type
+
+
+def json_response(payload, status=200, headers=None):
+    if not isinstance(payload, bytes):
+        payload = json.dumps(payload).encode('utf-8')
+    return Response(payload, status, headers=headers)
+
+
+def busy_response(request, fields, error):
+    count_error(request.path, error)
+    return json_response({**fields, "error": str(error)}, 503, {'retry-after': '1'})
+
+
+def error_response(request, fields, error):
+    count_error(request.path, error)
+    return json_response({**fields, "error": str(error)})
+
+
+def cache_headers(etag):
+    return {
+        'etag': f'"{etag}"',
+        'cache-control': f"public, max-age={config['PLOT_CACHE_MAX_AGE']}",
+    }
+
+
+def etag_matches(request, etag):
+    header = request.headers.get('if-none-match', '')
+    tags = [tag.strip().removeprefix('W/').strip('"') for tag in header.split(',')]
+    return etag in tags or '*' in tags
+
+
+async def in_executor(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+
+
+def _may_run_away(node):
+    """True if evaluating the tree can take unbounded time or memory"""
+    if node[0] == 'pow' or (node[0] == 'call' and node[1] == 'factorial'):
+        return True
+    if node[0] == 'call':
+        return any(_may_run_away(arg) for arg in node[2])
+    return any(isinstance(child, tuple) and _may_run_away(child) for child in node[1:])
+
+
+def is_cheap(expression, mode='float', precision=None):
+    """Whether an expression is safe to evaluate on the event loop
+
+    Decided from the parse tree alone: compiling folds constants, which
+    would evaluate the expression right here.  Decimal and exact arithmetic
+    cost grows with precision and digits, so only float mode qualifies.
+    Parse errors count as cheap: evaluating inline reports them at once.
+    """
+    if mode != 'float':
+        return False
+    try:
+        tree = parse(expression)
+    except Exception:
+        return True
+    return not _may_run_away(tree)
+
+
+def asset_response(request, asset):
+    """Serve a prebuilt Asset: 304 if the client has it, else its best encoding"""
+    if asset.matches(request.headers.get('if-none-match')):
+        return Response(status=304, headers={k.lower(): v for k, v in asset.headers().items()})
+    encoding, body = asset.negotiate(request.headers.get('accept-encoding'))
+    return Response(body, content_type=asset.content_type,
+                    headers={k.lower(): v for k, v in asset.headers(encoding).items()})
+
+
+async def index(request):
+    # Rendered once by web_calculator when it was imported
+    return asset_response(request, index_page)
+
+
+async def static_asset(request):
+    asset = web_calculator.static_assets.get(request.path.removeprefix(ASSET_PREFIX))
+    if asset is None:
+        return json_response({"error": "Not found"}, 404)
+    return asset_response(request, asset)
+
+
+async def calculate(request):
+    expression = request.form.get('expression', '')
+    try:
+        mode, precision = numeric_mode(request.form)
+        if is_cheap(expression, mode, precision):
+            result = evaluate(expression, mode, precision)
+        else:
+            result = await in_executor(run_job, evaluate, expression, mode, precision)
+        return json_response({"result": result, "error": None})
+    except PoolBusy as e:
+        return busy_response(request, {"result": None}, e)
+    except Exception as e:
+        return error_response(request, {"result": None}, e)
+
+
+async def calculate_preview(request):
+    # Off the loop: a session waits for its previous preview, and non-float
+    # previews wait for the worker pool
+    return json_response(await in_executor(preview_result, request.form))
+
+
+async def calculate_batch(request):
+    try:
+        body = request.json()
+        expressions = batch_items(body, 'expressions')
+        mode, precision = numeric_mode(body if isinstance(body, dict) else {})
+        if all(isinstance(expression, str) and is_cheap(expression, mode, precision) for expression in expressions):
+            results = calculate_batch_results(expressions, mode, precision, run=lambda func, *args: func(*args))
+        else:
+            results = await in_executor(calculate_batch_results, expressions, mode, precision)
+        return json_response({"results": results, "error": None})
+    except PoolBusy as e:
+        return busy_response(request, {"results": None}, e)
+    except Exception as e:
+        return error_response(request, {"results": None}, e)
+
+
+async def solve_equation(request):
+    values = request.values
+    try:
+        x_min = float(values.get('x_min', '-100'))
+        x_max = float(values.get('x_max', '100'))
+        result = await in_executor(run_job, solve_job, values.get('equation', ''), x_min, x_max)
+        return json_response({**result, "error": None})
+    except PoolBusy as e:
+        return busy_response(request, {"roots": None}, e)
+    except Exception as e:
+        return error_response(request, {"roots": None}, e)
+
+
+async def plot(request):
+    try:
+        output_format, key, render = prepare_plot(request.values)
+        etag = key[:32]
+        if etag_matches(request, etag):
+            return Response(status=304, headers=cache_headers(etag))
+
+        # Memory hits are served straight from the loop; misses wait on a worker
+        data = plot_cache.get(key)
+        if data is None:
+            data = await in_executor(cached_render, key, render)
+
+        return json_response(plot_json(output_format, data), headers=cache_headers(etag))
+    except PoolBusy as e:
+        return busy_response(request, plot_error_fields(request.values), e)
+    except Exception as e:
+        return error_response(request, plot_error_fields(request.values), e)
+
+
+async def elements(request):
+    # Index lookups on data already in memory: cheap enough for the event loop
+    try:
+        return json_response(list_elements(request.query))
+    except ValueError as e:
+        return error_response(request, {"elements": []}, e)
+
+
+async def elements_search(request):
+    try:
+        return json_response(search_elements(request.query))
+    except ValueError as e:
+        return error_response(request, {"elements": []}, e)
+
+
+async def metrics(request):
+    return Response(metrics_text().encode('utf-8'), content_type=telemetry.CONTENT_TYPE)
+
+
+async def profiles(request):
+    # Profiles are captured by the Flask app; this serves the same store
+    return json_response(profile_listing())
+
+
+def read_file(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+async def download_profile(request):
+    profile_id, _, kind = request.path.removeprefix(PROFILES_PREFIX).partition('/')
+    found = profile_file(profile_id, kind)
+    if found is None:
+        return json_response({"error": "Not found"}, 404)
+    path, mimetype, download_name = found
+    body = await in_executor(read_file, path)
+    return Response(body, content_type=mimetype,
+                    headers={'content-disposition': f'attachment; filename={download_name}'})
+
+
+async def plot_stream(request):
+    return StreamingResponse(plot_stream_events(request.query), 'text/event-stream', STREAM_HEADERS)
+
+
+async def plot_batch(request):
+    try:
+        return json_response(await in_executor(plot_batch_body, request.json()))
+    except PoolBusy as e:
+        return busy_response(request, {"results": None}, e)
+    except Exception as e:
+        return error_response(request, {"results": None}, e)
+
+
+ROUTES = {
+    '/': (index, ('GET',)),
+    '/calculate': (calculate, ('POST',)),
+    '/calculate/batch': (calculate_batch, ('POST',)),
+    '/calculate/preview': (calculate_preview, ('POST',)),
+    '/solve': (solve_equation, ('GET', 'POST')),
+    '/plot': (plot, ('GET', 'POST')),
+    '/plot/stream': (plot_stream, ('GET',)),
+    '/plot/batch': (plot_batch, ('POST',)),
+    '/elements': (elements, ('GET',)),
+    '/elements/search': (elements_search, ('GET',)),
+    '/metrics': (metrics, ('GET',)),
+    '/profiles': (profiles, ('GET',)),
+}
+
+# Fingerprinted files from static/ and /profiles/<id>/<kind> downloads are
+# matched by prefix rather than exact path
+ASSET_PREFIX = web_calculator.static_assets.prefix
+PROFILES_PREFIX = '/profiles/'
+
+
+async def read_body(receive):
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if size > MAX_BODY_BYTES:
+            raise ValueError("Request body too large")
+        chunks.append(chunk)
+        if not message.get('more_body', False):
+            return b''.join(chunks)
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            # Spawning the workers blocks, so keep it off the loop
+            await in_executor(worker_pool.start)
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await in_executor(worker_pool.close)
+            executor.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] != 'http':
+        return
+
+    route = ROUTES.get(scope['path'])
+    if route is None and scope['path'].startswith(ASSET_PREFIX):
+        route = (static_asset, ('GET',))
+    elif route is None and scope['path'].startswith(PROFILES_PREFIX):
+        route = (download_profile, ('GET',))
+    try:
+        body = await read_body(receive)
+    except ValueError as e:
+        return await respond(send, json_response({"error": str(e)}, 413))
+    if body is None:
+        return
+
+    start = time.perf_counter()
+    if route is None:
+        response = json_response({"error": "Not found"}, 404)
+    elif scope['method'] not in route[1]:
+        response = json_response({"error": "Method not allowed"}, 405, {'allow': ', '.join(route[1])})
+    else:
+        response = await route[0](Request(scope, body))
+    if route is None:
+        label = 'unmatched'
+    elif route[0] is static_asset:
+        label = ASSET_PREFIX
+    elif route[0] is download_profile:
+        label = PROFILES_PREFIX
+    else:
+        label = scope['path']
+    REQUESTS.inc(route=label, status=response.status)
+    REQUEST_SECONDS.observe(time.perf_counter() - start, route=label)
+    if isinstance(response, StreamingResponse):
+        await stream(receive, send, response)
+    else:
+        await respond(send, response)
+
+
+async def respond(send, response):
+    headers = [(name.encode('latin-1'), value.encode('latin-1')) for name, value in response.headers.items()]
+    headers.append((b'content-length', str(len(response.body)).encode('latin-1')))
+    await send({'type': 'http.response.start', 'status': response.status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': response.body})
+
+
+async def stream(receive, send, response):
+    """Send chunks as they are produced, abandoning them if the client goes away"""
+    headers = [(name.encode('latin-1'), value.encode('latin-1')) for name, value in response.headers.items()]
+    await send({'type': 'http.response.start', 'status': response.status, 'headers': headers})
+
+    async def wait_for_disconnect():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    disconnected = asyncio.ensure_future(wait_for_disconnect())
+    chunks = iter(response.chunks)
+    try:
+        while True:
+            # Each chunk is computed off the loop; between chunks is where
+            # a disconnect is noticed and the rest of the work is skipped
+            chunk = await in_executor(next, chunks, None)
+            if chunk is None or disconnected.done():
+                break
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        if not disconnected.done():
+            await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        disconnected.cancel()
+        if hasattr(chunks, 'close'):
+            chunks.close()
@@ -0,0 +1,239 @@
+"""Evaluate or plot expressions from files or stdin, one per line
+
+    python batch.py eval corpus.txt > results.jsonl
+    python batch.py plot functions.txt --output-dir plots --format svg
+    cat functions.txt | python batch.py plot --cache-dir /var/cache/calculator
+
+Each input line is an expression (for plot, a function of x), or a JSON
+object: {"expression": ..., "mode": ..., "precision": ...} for eval and
+{"function": ..., "x_min": ..., "x_max": ..., "name": ...} for plot.  Blank
+lines and lines starting with '#' are skipped.
+
+Records stream through a pool of worker processes with a bounded number in
+flight, and every result is written as soon as it and those before it are
+done, so memory stays flat however long the input is.  One JSON line per
+record goes to stdout (or --output), in input order.  Plots are written to
+--output-dir and/or into a --cache-dir that the web server can be pointed
+at with PLOT_CACHE_DIR.
+"""
+import argparse
+import collections
+import json
+import os
+import sys
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import core
+from expression import normalize
+from plot_cache import PlotCache
+from worker_pool import WorkerPool
+
+FILE_EXTENSIONS = {'png': '.png', 'svg': '.svg', 'points': '.json'}
+
+
+def read_lines(paths):
+    """Yield (path, line_number, text) for every record line; '-' is stdin"""
+    for path in paths or ['-']:
+        f = sys.stdin if path == '-' else open(path, encoding='utf-8')
+        try:
+            for line_number, line in enumerate(f, 1):
+                text = line.strip()
+                if text and not text.startswith('#'):
+                    yield path, line_number, text
+        finally:
+            if f is not sys.stdin:
+                f.close()
+
+
+def parse_record(text, field):
+    """A line is bare text for `field` or a JSON object holding it"""
+    if not text.startswith('{'):
+        return {field: text}
+    record = json.loads(text)
+    if not isinstance(record, dict) or not isinstance(record.get(field), str):
+        raise ValueError(f"Expected a JSON object with a string '{field}'")
+    return record
+
+
+def eval_jobs(lines, args):
+    """Turn input lines into (record, func, args) jobs for run_pipeline()"""
+    for path, line_number, text in lines:
+        record = {'source': path, 'line': line_number}
+        try:
+            fields = parse_record(text, 'expression')
+            record['expression'] = fields['expression']
+            mode = fields.get('mode', args.mode)
+            precision = fields.get('precision', args.precision)
+            # Rejecting a bad mode here saves a round trip to a worker
+            core.evaluation_mode(mode, precision)
+        except ValueError as e:
+            yield record, e, None
+            continue
+        yield record, core.evaluate, (record['expression'], mode, precision)
+
+
+def plot_jobs(lines, args):
+    """Turn input lines into (record, func, args) jobs for run_pipeline()"""
+    for path, line_number, text in lines:
+        record = {'source': path, 'line': line_number}
+        try:
+            fields = parse_record(text, 'function')
+            record['function'] = normalize(fields['function'])
+            record['x_min'] = float(fields.get('x_min', args.x_min))
+            record['x_max'] = float(fields.get('x_max', args.x_max))
+            if 'name' in fields:
+                record['name'] = str(fields['name'])
+        except ValueError as e:
+            yield record, e, None
+            continue
+        yield record, core.render_plot, (record['function'], record['x_min'], record['x_max'],
+                                         args.format, args.renderer, args.sampling)
+
+
+def run_pipeline(jobs, pool, window):
+    """Run jobs on the pool and yield (record, result, error) in input order
+
+    At most `window` jobs are submitted or waiting to be written at any
+    time.  A job given as (record, error, None) failed before it could be
+    submitted and is passed through in its place.
+    """
+    threads = max(1, min(window, pool.processes))
+    pending = collections.deque()
+    with ThreadPoolExecutor(max_workers=threads, thread_name_prefix='batch') as executor:
+        for record, func, func_args in jobs:
+            if len(pending) >= window:
+                yield _finish(*pending.popleft())
+            if func_args is None:
+                future = Future()
+                future.set_exception(func)
+            else:
+                future = executor.submit(pool.run, func, *func_args)
+            pending.append((record, future))
+        while pending:
+            yield _finish(*pending.popleft())
+
+
+def _finish(record, future):
+    try:
+        return record, future.result(), None
+    except Exception as e:
+        return record, None, e
+
+
+def output_name(record):
+    """File name for a plot, without extension: its 'name', else source and line"""
+    if 'name' in record:
+        # Names come from the input, so never let them leave the output directory
+        return os.path.basename(record['name']) or f"line-{record['line']}"
+    source = 'stdin' if record['source'] == '-' else os.path.splitext(os.path.basename(record['source']))[0]
+    return f"{source}-{record['line']:06d}"
+
+
+def write_file(path, data):
+    # Write then rename, so an interrupted run never leaves half a file
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+def run(args):
+    if args.command == 'plot':
+        if args.output_dir:
+            os.makedirs(args.output_dir, exist_ok=True)
+        cache = None
+        if args.cache_dir:
+            # With no room in memory every entry goes straight to the directory
+            cache = PlotCache(max_bytes=float('inf'), max_entries=0, spill_dir=args.cache_dir,
+                              max_disk_bytes=args.cache_max_bytes)
+        jobs = plot_jobs(read_lines(args.inputs), args)
+        preload = ('core:warm_up',)
+    else:
+        jobs = eval_jobs(read_lines(args.inputs), args)
+        preload = ('core',)
+
+    pool = WorkerPool(
+        processes=args.jobs,
+        max_queue=args.window,
+        timeout=args.timeout,
+        memory_limit=args.memory_limit,
+        preload=preload,
+    )
+    out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    succeeded = failed = 0
+    start = time.perf_counter()
+    try:
+        for record, result, error in run_pipeline(jobs, pool, args.window):
+            if error is None and args.command == 'plot':
+                try:
+                    name = output_name(record) + FILE_EXTENSIONS[args.format]
+                    if args.output_dir:
+                        record['file'] = os.path.join(args.output_dir, name)
+                        write_file(record['file'], result)
+                    if cache is not None:
+                        cache.put(core.plot_key(record['function'], record['x_min'], record['x_max'],
+                                                args.format, args.renderer, args.sampling), result)
+                except OSError as e:
+                    error = e
+            elif error is None:
+                record['result'] = str(result)
+            record['error'] = None if error is None else str(error)
+            if error is None:
+                succeeded += 1
+            else:
+                failed += 1
+            out.write(json.dumps(record) + '\n')
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        pool.close()
+
+    elapsed = time.perf_counter() - start
+    print(f'{succeeded} succeeded, {failed} failed in {elapsed:.2f} s', file=sys.stderr)
+    return 1 if failed and args.strict else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('inputs', nargs='*', help="files to read, '-' or nothing for stdin")
+    common.add_argument('--output', '-o', help='write the JSON lines here instead of stdout')
+    common.add_argument('--jobs', '-j', type=int, default=os.cpu_count() or 1,
+                        help='worker processes; 0 evaluates in this process')
+    common.add_argument('--window', type=int, default=None,
+                        help='records in flight at once (default: four per worker)')
+    common.add_argument('--timeout', type=float, default=10.0, help='seconds allowed per record')
+    common.add_argument('--memory-limit', type=int, default=1024 * 1024 * 1024,
+                        help='address space of each worker in bytes')
+    common.add_argument('--strict', action='store_true', help='exit with status 1 if any record failed')
+
+    eval_parser = commands.add_parser('eval', parents=[common], help='evaluate expressions')
+    eval_parser.add_argument('--mode', choices=core.NUMERIC_MODES, default='float')
+    eval_parser.add_argument('--precision', type=int, default=None,
+                             help='significant digits in decimal mode')
+
+    plot_parser = commands.add_parser('plot', parents=[common], help='render functions of x')
+    plot_parser.add_argument('--x-min', type=float, default=-10.0)
+    plot_parser.add_argument('--x-max', type=float, default=10.0)
+    plot_parser.add_argument('--format', choices=core.PLOT_FORMATS, default='png')
+    plot_parser.add_argument('--renderer', choices=core.RENDERERS, default='matplotlib')
+    plot_parser.add_argument('--sampling', choices=core.SAMPLINGS, default='adaptive')
+    plot_parser.add_argument('--output-dir', help='write each plot to a file here')
+    plot_parser.add_argument('--cache-dir', help='store each plot in a plot cache directory')
+    plot_parser.add_argument('--cache-max-bytes', type=int, default=512 * 1024 * 1024,
+                             help='size the cache directory is pruned to')
+
+    args = parser.parse_args(argv)
+    if args.window is None:
+        args.window = 4 * max(args.jobs, 1)
+    if args.window < 1:
+        parser.error('--window must be at least 1')
+    return run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,457 @@
+"""Local benchmarks for the expression engine, plot rendering and web routes
+
+    python benchmark.py run --output before.json
+    ... change something ...
+    python benchmark.py run --output after.json
+    python benchmark.py compare before.json after.json
+
+Everything runs in-process with no network.  compare exits with status 1
+when any benchmark's median got slower than the threshold allows.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+# Expressions typed on the keypad: plain arithmetic, functions, implicit
+# multiplication and percentages
+CALCULATION_CORPUS = [
+    '2+3',
+    '12.5*4-3/2',
+    '(1+2)*(3+4)/(5-6)',
+    '2^10',
+    '2**0.5',
+    '50%',
+    '3pi',
+    'sin(pi/4)+cos(pi/3)',
+    'sqrt(2)*sqrt(8)',
+    'log10(1000)+ln(e)',
+    'factorial(10)/factorial(8)',
+    'nthroot(-27, 3)',
+    'abs(-3.5)*exp(1)',
+    '((((1+2)*3)-4)/5)^2',
+    '1+2+3+4+5+6+7+8+9+10+11+12+13+14+15+16',
+]
+
+# Functions typed into the graph tab
+FUNCTION_CORPUS = [
+    'x',
+    'x^2',
+    '3x^3-2x+1',
+    'sin(x)',
+    'sin(x)*cos(2x)',
+    'tan(x)',
+    '1/x',
+    'sqrt(x)',
+    'ln(abs(x))',
+    'exp(-x^2/2)',
+    'sin(1/x)',
+    'x*sin(x)^2+nthroot(x, 3)',
+]
+
+
+def measure(func, min_time=0.2, max_runs=10000, min_runs=5):
+    """Time repeated calls to func and summarize the per-call seconds"""
+    func()  # Warm up caches and lazy imports
+    timings = []
+    deadline = time.perf_counter() + min_time
+    while len(timings) < max_runs and (len(timings) < min_runs or time.perf_counter() < deadline):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return {
+        'runs': len(timings),
+        'min': timings[0],
+        'median': statistics.median(timings),
+        'mean': statistics.fmean(timings),
+        'p95': timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+    }
+
+
+def legacy_calculate(expression):
+    """The string-rewrite and eval() chain /calculate used before the expression engine"""
+    import math
+
+    try:
+        expression = expression.replace("sqrt(", "math.sqrt(")
+        expression = expression.replace("log10(", "math.log10(")
+        expression = expression.replace("log(", "math.log(")
+        expression = expression.replace("factorial(", "math.factorial(")
+        expression = expression.replace("sin(", "math.sin(")
+        expression = expression.replace("cos(", "math.cos(")
+        expression = expression.replace("tan(", "math.tan(")
+        if "%" in expression:
+            expression = expression.replace("%", "/100")
+        return str(eval(expression, {"__builtins__": {}, "math": math}))
+    except Exception as e:
+        # It failed on names like pi and nthroot; failing was part of its cost
+        return str(e)
+
+
+def bench_expressions(min_time):
+    """Parse, compile and evaluate every expression in the corpora"""
+    from expression import ExpressionCache, compile_ast, get_backend, parse
+
+    scalar = get_backend('scalar')
+    vector = get_backend('vector')
+    import numpy as np
+    x_values = np.linspace(-10, 10, 1000)
+
+    trees = [parse(text) for text in CALCULATION_CORPUS]
+    compiled = [compile_ast(tree, scalar) for tree in trees]
+    function_trees = [parse(text, ('x',)) for text in FUNCTION_CORPUS]
+    functions = [compile_ast(tree, vector) for tree in function_trees]
+    cache = ExpressionCache(maxsize=len(CALCULATION_CORPUS) * 2)
+
+    def evaluate_all():
+        for evaluator in compiled:
+            evaluator({})
+
+    def evaluate_functions():
+        with np.errstate(all='ignore'):
+            for evaluator in functions:
+                evaluator({'x': x_values})
+
+    def cached():
+        for text in CALCULATION_CORPUS:
+            cache.compile_expression(text)()
+
+    def uncached():
+        for text in CALCULATION_CORPUS:
+            compile_ast(parse(text), scalar)({})
+
+    def legacy():
+        for text in CALCULATION_CORPUS:
+            legacy_calculate(text)
+
+    results = {
+        'expression.parse': measure(lambda: [parse(text) for text in CALCULATION_CORPUS], min_time),
+        'expression.compile': measure(lambda: [compile_ast(tree, scalar) for tree in trees], min_time),
+        'expression.eval_scalar': measure(evaluate_all, min_time),
+        'expression.eval_vector_1000': measure(evaluate_functions, min_time),
+        'expression.cached_calculate': measure(cached, min_time),
+        'expression.uncached_calculate': measure(uncached, min_time),
+        'expression.legacy_calculate': measure(legacy, min_time),
+    }
+    # How many times faster than the old eval() chain each way of calculating is
+    legacy_median = results['expression.legacy_calculate']['median']
+    for name in ('expression.cached_calculate', 'expression.uncached_calculate'):
+        results[name]['speedup_vs_legacy'] = legacy_median / results[name]['median']
+    return results
+
+
+def bench_rendering(min_time, sample_counts):
+    """Sample and render the function corpus in every output format"""
+    import numpy as np
+
+    import plot_formats
+    import raster
+    import core
+    from expression import compile_function
+    from sampling import adaptive_sample, uniform_sample
+
+    functions = [(text, compile_function(text)) for text in FUNCTION_CORPUS]
+    results = {}
+
+    def run_all(work):
+        def run():
+            with np.errstate(all='ignore'):
+                for text, function in functions:
+                    work(text, function)
+        return run
+
+    def adaptive(text, function):
+        return adaptive_sample(lambda x: function(x=x), -10, 10)
+
+    results['sampling.adaptive'] = measure(run_all(adaptive), min_time)
+
+    for samples in sample_counts:
+        def uniform(text, function, samples=samples):
+            return uniform_sample(lambda x: function(x=x), -10, 10, samples)
+
+        def matplotlib_png(text, function, uniform=uniform):
+            x_values, y_values = uniform(text, function)
+            return core.draw_figure([(x_values, y_values)], f'f(x) = {text}')
+
+        def raster_png(text, function, uniform=uniform):
+            return raster.render_png(*uniform(text, function))
+
+        def svg(text, function, uniform=uniform):
+            return plot_formats.render_svg(*uniform(text, function), f'f(x) = {text}')
+
+        def points(text, function, uniform=uniform):
+            return plot_formats.encode_points(*uniform(text, function))
+
+        results[f'sampling.uniform_{samples}'] = measure(run_all(uniform), min_time)
+        results[f'render.matplotlib_png_{samples}'] = measure(run_all(matplotlib_png), min_time, min_runs=2)
+        results[f'render.raster_png_{samples}'] = measure(run_all(raster_png), min_time)
+        results[f'render.svg_{samples}'] = measure(run_all(svg), min_time)
+        results[f'render.points_{samples}'] = measure(run_all(points), min_time)
+    return results
+
+
+def bench_tk_plot_path(min_time):
+    """The work CalculatorApp.plot_graph does, minus the Tk canvas itself"""
+    import numpy as np
+
+    from expression import compile_function
+    from sampling import adaptive_sample
+
+    def plot_graph():
+        with np.errstate(all='ignore'):
+            for text in FUNCTION_CORPUS:
+                function = compile_function(text)
+                adaptive_sample(lambda x: function(x=x), -10, 10, pixel_width=640, pixel_height=480)
+
+    return {'tk.plot_graph_compute': measure(plot_graph, min_time)}
+
+
+# Functions for the chunked evaluation benchmarks; the first repeats sin(x)
+CHUNKED_CORPUS = [
+    'sin(x)^2 + cos(x)^2*exp(-x^2/10) + sin(x)',
+    'sqrt(abs(x))*log(x^2 + 1) - 3x/(x^2 + 1)',
+]
+
+
+def peak_memory(func):
+    """Bytes allocated at the peak of one call to func, as tracemalloc sees it"""
+    import tracemalloc
+
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_chunked(min_time, sizes):
+    """Whole-array evaluation against VectorProgram on large inputs, with peak memory"""
+    import numpy as np
+
+    from expression import compile_function
+    from vector_program import VectorProgram
+
+    results = {}
+    for size in sizes:
+        x_values = np.linspace(-10, 10, size)
+        out = np.empty(size)
+        for i, text in enumerate(CHUNKED_CORPUS):
+            function = compile_function(text)
+            program = VectorProgram(function.tree)
+
+            def whole():
+                with np.errstate(all='ignore'):
+                    function(x=x_values)
+
+            def chunked():
+                program(x=x_values, out=out)
+
+            for name, work in (('whole', whole), ('chunked', chunked)):
+                stats = measure(work, min_time, min_runs=3)
+                stats['peak_bytes'] = peak_memory(work)
+                results[f'eval.{name}_{i}_{size}'] = stats
+    return results
+
+
+def bench_flask(min_time):
+    """Latency of /calculate and /plot through the Flask test client"""
+    # Run jobs inline so the numbers measure the routes, not process startup
+    os.environ.setdefault('WORKER_PROCESSES', '0')
+    import web_calculator
+
+    client = web_calculator.app.test_client()
+    results = {}
+
+    def calculate():
+        for text in CALCULATION_CORPUS:
+            client.post('/calculate', data={'expression': text})
+
+    def plot(output_format, renderer='matplotlib', cold=True):
+        def run():
+            for text in FUNCTION_CORPUS:
+                if cold:
+                    web_calculator.plot_cache.clear()
+                client.get('/plot', query_string={
+                    'function': text, 'format': output_format, 'renderer': renderer,
+                })
+        return run
+
+    def calculate_batch():
+        client.post('/calculate/batch', json=CALCULATION_CORPUS)
+
+    results['flask.calculate'] = measure(calculate, min_time)
+    results['flask.calculate_batch'] = measure(calculate_batch, min_time)
+    results['flask.plot_png_matplotlib'] = measure(plot('png'), min_time, min_runs=2)
+    results['flask.plot_png_raster'] = measure(plot('png', 'raster'), min_time)
+    results['flask.plot_svg'] = measure(plot('svg'), min_time)
+    results['flask.plot_points'] = measure(plot('points'), min_time)
+    results['flask.plot_cached'] = measure(plot('png', cold=False), min_time)
+
+    # Requests per second for one sequential client
+    for name in ('flask.calculate', 'flask.calculate_batch'):
+        count = 1 if name.endswith('batch') else len(CALCULATION_CORPUS)
+        results[name]['requests_per_second'] = count / results[name]['median']
+    return results
+
+
+# Each snippet runs in a fresh interpreter; the last line it prints says
+# which heavy modules ended up loaded
+STARTUP_SNIPPETS = {
+    'startup.import_expression': 'import expression',
+    'startup.import_web_calculator': 'import web_calculator',
+    'startup.import_calculator': 'import calculator',
+    'startup.first_calculate': (
+        'import web_calculator\n'
+        'web_calculator.app.test_client().post("/calculate", data={"expression": "2+3"})'
+    ),
+    'startup.first_plot': (
+        'import web_calculator\n'
+        'web_calculator.app.test_client().get("/plot", query_string={"function": "sin(x)"})'
+    ),
+}
+
+HEAVY_MODULES = ('numpy', 'matplotlib', 'matplotlib.pyplot', 'scipy', 'PIL')
+
+
+def bench_startup(min_time):
+    """Wall time of a cold interpreter importing each entry point"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = {**os.environ, 'WORKER_PROCESSES': '0', 'PYTHONPATH': here}
+    report = f'import sys; print(sorted(m for m in {HEAVY_MODULES!r} if m in sys.modules))'
+    results = {}
+    for name, snippet in STARTUP_SNIPPETS.items():
+        loaded = []
+
+        def run(snippet=snippet):
+            completed = subprocess.run([sys.executable, '-c', snippet + '\n' + report],
+                                       capture_output=True, text=True, cwd=here, env=env)
+            if completed.returncode != 0:
+                raise RuntimeError(f'{name} failed: {completed.stderr.strip()}')
+            loaded[:] = json.loads(completed.stdout.splitlines()[-1].replace("'", '"'))
+
+        try:
+            results[name] = measure(run, min_time, min_runs=3)
+        except RuntimeError as e:
+            # calculator needs tkinter, which headless Pythons may lack
+            print(e, file=sys.stderr)
+            continue
+        results[name]['heavy_modules'] = loaded
+    return results
+
+
+def environment():
+    import matplotlib
+    import numpy as np
+
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'numpy': np.__version__,
+        'matplotlib': matplotlib.__version__,
+    }
+
+
+SUITES = {
+    'expressions': lambda args: bench_expressions(args.min_time),
+    'rendering': lambda args: bench_rendering(args.min_time, args.samples),
+    'tk': lambda args: bench_tk_plot_path(args.min_time),
+    'chunked': lambda args: bench_chunked(args.min_time, args.chunked_sizes),
+    'flask': lambda args: bench_flask(args.min_time),
+    'startup': lambda args: bench_startup(args.min_time),
+}
+
+
+def run(args):
+    results = {}
+    for name in args.suites:
+        print(f'Running {name} ...', file=sys.stderr)
+        results.update(SUITES[name](args))
+
+    report = {'environment': environment(), 'results': results}
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    for name, stats in sorted(results.items()):
+        peak = f', peak {stats["peak_bytes"] / 1e6:.1f} MB' if 'peak_bytes' in stats else ''
+        speedup = f', {stats["speedup_vs_legacy"]:.2f}x legacy' if 'speedup_vs_legacy' in stats else ''
+        print(f'{name:40s} {stats["median"] * 1000:10.3f} ms  (p95 {stats["p95"] * 1000:.3f} ms, '
+              f'{stats["runs"]} runs{peak}{speedup})', file=sys.stderr)
+    return 0
+
+
+def compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)['results']
+    with open(args.current) as f:
+        current = json.load(f)['results']
+
+    regressions = []
+    for name in sorted(set(baseline) & set(current)):
+        before = baseline[name]['median']
+        after = current[name]['median']
+        ratio = after / before if before > 0 else float('inf')
+        if ratio > 1 + args.threshold:
+            flag = 'SLOWER'
+            regressions.append(name)
+        elif ratio < 1 - args.threshold:
+            flag = 'faster'
+        else:
+            flag = ''
+        print(f'{name:40s} {before * 1000:10.3f} ms -> {after * 1000:10.3f} ms  {ratio:6.2f}x  {flag}')
+
+    for name in sorted(set(baseline) ^ set(current)):
+        print(f'{name:40s} only in {"baseline" if name in baseline else "current"}')
+
+    if regressions:
+        print(f'\n{len(regressions)} regression(s) beyond {args.threshold:.0%}', file=sys.stderr)
+        return 1
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='run the benchmarks and emit JSON')
+    run_parser.add_argument('--output', '-o', help='write JSON here instead of stdout')
+    run_parser.add_argument('--suites', nargs='+', choices=sorted(SUITES), default=list(SUITES))
+    run_parser.add_argument('--samples', nargs='+', type=int, default=[200, 1000, 5000],
+                            help='sample counts for the rendering benchmarks')
+    run_parser.add_argument('--chunked-sizes', nargs='+', type=int, default=[1000000, 4000000],
+                            help='array sizes for the chunked evaluation benchmarks')
+    run_parser.add_argument('--min-time', type=float, default=0.2,
+                            help='seconds to spend on each benchmark')
+    run_parser.set_defaults(func=run)
+
+    compare_parser = commands.add_parser('compare', help='compare two JSON runs')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.10,
+                                help='relative slowdown that counts as a regression')
+    compare_parser.set_defaults(func=compare)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,11 +1,102 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 import math
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import numpy as np
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from functools import partial
-from matplotlib.backends.backend_tkagg import NavigationToolbar2Tk
+import core
+import telemetry
+from expression import to_source
+
+# matplotlib, NumPy and the solver are imported when first needed, so the
+# keypad comes up without waiting for the plotting stack.  Evaluating,
+# sampling and solving go through core, the same code the web server runs.
+
+# JSON logs on stderr, configured like the web server's: LOG_LEVEL (or OFF)
+# and LOG_SAMPLE_RATE for records below WARNING
+log = telemetry.configure_logging('calculator.tk', os.environ.get('LOG_LEVEL', 'WARNING'),
+                                  float(os.environ.get('LOG_SAMPLE_RATE', '1')))
+
+class Cancelled(Exception):
+    """Raised inside a background job once a newer job has superseded it"""
+
+class BackgroundJobs:
+    """Run slow work off the Tk main thread and hand the results back to it
+    
+    Every job belongs to a channel such as "plot" or "solve", and submitting
+    a job cancels the one still running on the same channel: its result is
+    thrown away, and its `cancelled` event is set so it can stop early.  Tk
+    may only be touched from the main thread, so finished jobs go on a queue
+    that the main thread polls with root.after.
+    """
+    
+    POLL_MS = 30
+    
+    def __init__(self, root, on_busy=None):
+        self.root = root
+        self.on_busy = on_busy
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="calculator")
+        self._finished = queue.Queue()
+        self._running = {}
+        self._busy = False
+        self._polling = False
+    
+    def submit(self, channel, work, on_done, on_error):
+        """Run work(cancelled) in the background
+        
+        on_done(result) or on_error(exception) is then called on the main
+        thread, unless the job was cancelled first.
+        """
+        previous = self._running.get(channel)
+        if previous is not None:
+            previous.set()
+        cancelled = threading.Event()
+        self._running[channel] = cancelled
+        
+        def run():
+            try:
+                outcome = (on_done, work(cancelled))
+            except Exception as e:
+                outcome = (on_error, e)
+            self._finished.put((channel, cancelled, outcome))
+        
+        self._executor.submit(run)
+        self._update_busy()
+        if not self._polling:
+            self._polling = True
+            self.root.after(self.POLL_MS, self._poll)
+    
+    def cancel(self, channel):
+        """Cancel the job running on a channel, if there is one"""
+        cancelled = self._running.pop(channel, None)
+        if cancelled is not None:
+            cancelled.set()
+            self._update_busy()
+    
+    def _poll(self):
+        while True:
+            try:
+                channel, cancelled, (callback, value) = self._finished.get_nowait()
+            except queue.Empty:
+                break
+            if cancelled.is_set():
+                continue
+            del self._running[channel]
+            self._update_busy()
+            callback(value)
+        if self._running:
+            self.root.after(self.POLL_MS, self._poll)
+        else:
+            self._polling = False
+    
+    def _update_busy(self):
+        busy = bool(self._running)
+        if busy != self._busy:
+            self._busy = busy
+            if self.on_busy is not None:
+                self.on_busy(busy)
 
 class CalculatorApp:
     def __init__(self, root):
@@ -73,6 +164,9 @@ class CalculatorApp:
         self.memory_value = 0
         self.history = []
         
+        # Plotting and solving run in the background so the window never freezes
+        self.jobs = BackgroundJobs(self.root, on_busy=self.show_busy)
+        
         # Main frames - calculator and graph
         self.frames = {}
         self.current_frame = "calculator"
@@ -329,15 +423,27 @@ class CalculatorApp:
         controls_frame = tk.Frame(graph_frame, bg=self.themes[self.current_theme]["bg"])
         controls_frame.pack(fill="x", padx=10, pady=5)
         
+        # Plot type: y = f(x), parametric, polar or a surface f(x, y)
+        self.plot_kind = tk.StringVar(value="function")
+        kind_box = ttk.Combobox(
+            controls_frame,
+            textvariable=self.plot_kind,
+            values=core.PLOT_KINDS,
+            state="readonly",
+            width=10
+        )
+        kind_box.pack(side="left", padx=5)
+        kind_box.bind("<<ComboboxSelected>>", self.update_graph_controls)
+        
         # Function entry
-        function_label = tk.Label(
+        self.function_label = tk.Label(
             controls_frame, 
             text="f(x) =", 
             bg=self.themes[self.current_theme]["bg"],
             fg=self.themes[self.current_theme]["display_fg"],
             font=("Arial", 12)
         )
-        function_label.pack(side="left", padx=5)
+        self.function_label.pack(side="left", padx=5)
         
         self.function_entry = tk.Entry(
             controls_frame,
@@ -349,19 +455,35 @@ class CalculatorApp:
         self.function_entry.pack(side="left", fill="x", expand=True, padx=5)
         self.function_entry.insert(0, "sin(x)")  # Default function
         
+        # Second function, y(t), shown for parametric curves only
+        self.function2_label = tk.Label(
+            controls_frame, 
+            text="y(t) =", 
+            bg=self.themes[self.current_theme]["bg"],
+            fg=self.themes[self.current_theme]["display_fg"],
+            font=("Arial", 12)
+        )
+        self.function2_entry = tk.Entry(
+            controls_frame,
+            font=("Arial", 12),
+            bg=self.themes[self.current_theme]["number_bg"],
+            fg=self.themes[self.current_theme]["number_fg"],
+            insertbackground=self.themes[self.current_theme]["number_fg"]
+        )
+        
         # Range controls
         range_frame = tk.Frame(graph_frame, bg=self.themes[self.current_theme]["bg"])
         range_frame.pack(fill="x", padx=10, pady=5)
         
         # X range
-        x_min_label = tk.Label(
+        self.x_min_label = tk.Label(
             range_frame, 
             text="X Min:", 
             bg=self.themes[self.current_theme]["bg"],
             fg=self.themes[self.current_theme]["display_fg"],
             font=("Arial", 10)
         )
-        x_min_label.pack(side="left", padx=5)
+        self.x_min_label.pack(side="left", padx=5)
         
         self.x_min_entry = tk.Entry(
             range_frame,
@@ -373,14 +495,14 @@ class CalculatorApp:
         self.x_min_entry.pack(side="left", padx=5)
         self.x_min_entry.insert(0, "-10")
         
-        x_max_label = tk.Label(
+        self.x_max_label = tk.Label(
             range_frame, 
             text="X Max:", 
             bg=self.themes[self.current_theme]["bg"],
             fg=self.themes[self.current_theme]["display_fg"],
             font=("Arial", 10)
         )
-        x_max_label.pack(side="left", padx=5)
+        self.x_max_label.pack(side="left", padx=5)
         
         self.x_max_entry = tk.Entry(
             range_frame,
@@ -392,6 +514,56 @@ class CalculatorApp:
         self.x_max_entry.pack(side="left", padx=5)
         self.x_max_entry.insert(0, "10")
         
+        # Y range, shown for surfaces only
+        self.y_range_widgets = []
+        for name, default in (("Y Min:", "-10"), ("Y Max:", "10")):
+            label = tk.Label(
+                range_frame, 
+                text=name, 
+                bg=self.themes[self.current_theme]["bg"],
+                fg=self.themes[self.current_theme]["display_fg"],
+                font=("Arial", 10)
+            )
+            entry = tk.Entry(
+                range_frame,
+                font=("Arial", 10),
+                width=5,
+                bg=self.themes[self.current_theme]["number_bg"],
+                fg=self.themes[self.current_theme]["number_fg"]
+            )
+            entry.insert(0, default)
+            self.y_range_widgets.extend([label, entry])
+        self.y_min_entry = self.y_range_widgets[1]
+        self.y_max_entry = self.y_range_widgets[3]
+        
+        # Derivative, integral and tangent overlays, shown for y = f(x) only
+        self.overlay_frame = tk.Frame(graph_frame, bg=self.themes[self.current_theme]["bg"])
+        self.overlay_frame.pack(fill="x", padx=10)
+        self.overlay_vars = {}
+        for overlay in core.OVERLAYS:
+            self.overlay_vars[overlay] = tk.BooleanVar(value=False)
+            ttk.Checkbutton(
+                self.overlay_frame,
+                text=overlay.capitalize(),
+                variable=self.overlay_vars[overlay]
+            ).pack(side="left", padx=5)
+        tk.Label(
+            self.overlay_frame, 
+            text="at x =", 
+            bg=self.themes[self.current_theme]["bg"],
+            fg=self.themes[self.current_theme]["display_fg"],
+            font=("Arial", 10)
+        ).pack(side="left")
+        self.tangent_entry = tk.Entry(
+            self.overlay_frame,
+            font=("Arial", 10),
+            width=5,
+            bg=self.themes[self.current_theme]["number_bg"],
+            fg=self.themes[self.current_theme]["number_fg"]
+        )
+        self.tangent_entry.pack(side="left", padx=5)
+        self.tangent_entry.insert(0, "0")
+        
         # Button frame
         button_frame = tk.Frame(graph_frame, bg=self.themes[self.current_theme]["bg"])
         button_frame.pack(fill="x", padx=10, pady=5)
@@ -414,6 +586,9 @@ class CalculatorApp:
         )
         clear_button.pack(side="left", padx=5)
         
+        # Busy indicator, shown while a plot or solve is running
+        self.busy_bar = ttk.Progressbar(button_frame, mode="indeterminate", length=60)
+        
         # Back button
         back_button = ttk.Button(
             button_frame,
@@ -423,8 +598,74 @@ class CalculatorApp:
         )
         back_button.pack(side="right", padx=5)
         
+        # Editing the function or range abandons a plot that is still computing
+        for entry in (self.function_entry, self.function2_entry, self.x_min_entry, self.x_max_entry,
+                      self.y_min_entry, self.y_max_entry):
+            entry.bind("<Key>", lambda event: self.jobs.cancel("plot"))
+        
+        # The canvas needs matplotlib, so build it once the window is up
+        self.root.after_idle(self.create_graph_canvas)
+    
+    def show_busy(self, busy):
+        """Show or hide the busy indicator while background work runs"""
+        if busy:
+            self.busy_bar.pack(side="left", padx=5)
+            self.busy_bar.start(15)
+        else:
+            self.busy_bar.stop()
+            self.busy_bar.pack_forget()
+        self.root.configure(cursor="watch" if busy else "")
+    
+    # Labels and example inputs for each plot type: the function labels, the
+    # range labels and the default functions and range
+    GRAPH_CONTROLS = {
+        "function": ("f(x) =", "X", ("sin(x)", ""), ("-10", "10")),
+        "parametric": ("x(t) =", "T", ("cos(3t)", "sin(2t)"), ("0", "6.2832")),
+        "polar": ("r(θ) =", "θ", ("1 + cos(theta)", ""), ("0", "6.2832")),
+        "surface": ("f(x, y) =", "X", ("sin(x)cos(y)", ""), ("-5", "5")),
+    }
+    
+    def update_graph_controls(self, event=None):
+        """Relabel the graph controls for the selected plot type"""
+        kind = self.plot_kind.get()
+        function_label, range_name, functions, plot_range = self.GRAPH_CONTROLS[kind]
+        self.function_label.configure(text=function_label)
+        self.x_min_label.configure(text=f"{range_name} Min:")
+        self.x_max_label.configure(text=f"{range_name} Max:")
+        for entry, value in ((self.function_entry, functions[0]), (self.function2_entry, functions[1]),
+                             (self.x_min_entry, plot_range[0]), (self.x_max_entry, plot_range[1])):
+            entry.delete(0, tk.END)
+            entry.insert(0, value)
+        
+        if kind == "parametric":
+            self.function2_label.pack(side="left", padx=5)
+            self.function2_entry.pack(side="left", fill="x", expand=True, padx=5)
+        else:
+            self.function2_label.pack_forget()
+            self.function2_entry.pack_forget()
+        for widget in self.y_range_widgets:
+            if kind == "surface":
+                widget.pack(side="left", padx=5)
+            else:
+                widget.pack_forget()
+        for widget in self.overlay_frame.winfo_children():
+            if kind == "function":
+                widget.pack(side="left", padx=5)
+            else:
+                widget.pack_forget()
+    
+    def create_graph_canvas(self):
+        """Create the matplotlib canvas of the graph tab"""
+        if getattr(self, 'canvas', None) is not None:
+            return
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
+        
+        graph_frame = self.frames["graph"]
+        
         # Canvas for graph - with better integration
-        self.figure, self.ax = plt.subplots(figsize=(5, 4), dpi=100)
+        self.figure = Figure(figsize=(5, 4), dpi=100)
+        self.ax = self.figure.add_subplot(111)
         self.canvas = FigureCanvasTkAgg(self.figure, master=graph_frame)
         canvas_widget = self.canvas.get_tk_widget()
         canvas_widget.pack(fill="both", expand=True, padx=10, pady=10)
@@ -442,11 +683,26 @@ class CalculatorApp:
         self.ax.set_title('Graph')
         self.canvas.draw()
     
+    def evaluate(self):
+        """Evaluate the current expression and show the result"""
+        try:
+            result = core.evaluate(self.current_expression)
+        except Exception as e:
+            self.expression_display.configure(text="Error")
+            log.info("Evaluation error",
+                     extra={'fields': {'expression': self.current_expression, 'error': str(e)}})
+            return
+        
+        self.history.append(f"{self.current_expression} = {result}")
+        self.history_display.configure(text=f"{self.current_expression} =")
+        self.current_expression = str(result)
+        self.expression_display.configure(text=self.current_expression)
+    
     def show_solver(self):
         """Show a simple equation solver dialog"""
         solver_window = tk.Toplevel(self.root)
         solver_window.title("Equation Solver")
-        solver_window.geometry("300x200")
+        solver_window.geometry("300x240")
         solver_window.configure(bg=self.themes[self.current_theme]["bg"])
         
         # Instruction
@@ -479,71 +735,44 @@ class CalculatorApp:
             textvariable=result_var,
             bg=self.themes[self.current_theme]["bg"],
             fg=self.themes[self.current_theme]["display_fg"],
-            font=("Arial", 12)
+            font=("Arial", 12),
+            wraplength=280
         )
         result_label.pack(pady=10)
         
         # Solve button
         def solve_equation():
             equation = equation_entry.get()
-            try:
-                # Handle common equation formats
-                if "=" in equation:
-                    left, right = equation.split("=")
-                    equation = f"({left}) - ({right})"
-                
-                # For simple equations, use np.roots
-                if "x**2" in equation and "x**3" not in equation:
-                    # Extract coefficients for ax^2 + bx + c = 0
-                    # This is a very simplified approach
-                    import re
-                    
-                    # Find coefficient of x^2
-                    a_match = re.search(r'([+-]?\s*\d*\.?\d*)\s*\*?\s*x\*\*2', equation)
-                    a = 1.0 if a_match and not a_match.group(1) else 0.0
-                    if a_match and a_match.group(1):
-                        a_str = a_match.group(1).replace(" ", "")
-                        if a_str in ["+", "-"]:
-                            a = float(a_str + "1")
-                        else:
-                            a = float(a_str)
-                    
-                    # Find coefficient of x
-                    b_match = re.search(r'([+-]?\s*\d*\.?\d*)\s*\*?\s*x(?!\*)', equation)
-                    b = 0.0
-                    if b_match and b_match.group(1):
-                        b_str = b_match.group(1).replace(" ", "")
-                        if b_str in ["+", "-"]:
-                            b = float(b_str + "1")
-                        else:
-                            b = float(b_str)
-                    
-                    # Find constant term - very simplified approach
-                    c_pattern = r'([+-]?\s*\d+\.?\d*(?!\s*\*?\s*x))'
-                    c_matches = re.findall(c_pattern, equation)
-                    c = 0.0
-                    for match in c_matches:
-                        c_str = match.replace(" ", "")
-                        c += float(c_str)
-                    
-                    roots = np.roots([a, b, c])
-                    result_var.set(f"Solutions: x = {', '.join([str(round(root, 4)) for root in roots])}")
+            result_var.set("Solving...")
+            # Polynomials are solved exactly; anything else is scanned on [-100, 100]
+            self.jobs.submit(
+                "solve",
+                lambda cancelled: core.solve(equation, x_min=-100, x_max=100),
+                show_solution,
+                lambda e: result_var.set(f"Error: {str(e)}"),
+            )
+        
+        def show_solution(solution):
+            if solution.method == 'identity':
+                result_var.set("Every x is a solution")
+            elif not solution.roots and not solution.complex_roots:
+                if solution.method == 'numeric':
+                    result_var.set("Could not find a solution in range [-100, 100]")
                 else:
-                    # For linear equations or more complex equations
-                    # Use a numerical method
-                    def f(x):
-                        return eval(equation)
-                    
-                    # Try to find a root between -100 and 100
-                    from scipy import optimize
-                    try:
-                        root = optimize.brentq(f, -100, 100)
-                        result_var.set(f"Solution: x ≈ {round(root, 4)}")
-                    except:
-                        result_var.set("Could not find a solution in range [-100, 100]")
-            
-            except Exception as e:
-                result_var.set(f"Error: {str(e)}")
+                    result_var.set("No solutions")
+            else:
+                lines = []
+                if solution.roots:
+                    shown = ', '.join(str(round(root, 4)) for root in solution.roots[:8])
+                    more = f" (+{len(solution.roots) - 8} more)" if len(solution.roots) > 8 else ""
+                    lines.append(f"Solutions: x = {shown}{more}")
+                if solution.complex_roots:
+                    shown = ', '.join(f"{root.real:.4g}{root.imag:+.4g}i" for root in solution.complex_roots[:4])
+                    lines.append(f"Complex: {shown}")
+                result_var.set("\n".join(lines))
+        
+        # Closing the dialog drops a solve that is still running
+        solver_window.bind("<Destroy>", lambda event: event.widget is solver_window and self.jobs.cancel("solve"))
         
         solve_button = ttk.Button(
             solver_window,
@@ -554,77 +783,112 @@ class CalculatorApp:
         solve_button.pack(pady=10)
     
     def plot_graph(self):
-        """Plot the function on the graph"""
-        # Clear the current plot
-        self.ax.clear()
+        """Plot the function on the graph
+        
+        Sampling runs in the background and the previous plot stays up until
+        the new one is ready.  Plotting again, or editing the function,
+        cancels a plot that has not finished.
+        """
+        self.create_graph_canvas()
         
         # Get the function and range
+        kind = self.plot_kind.get()
         function_str = self.function_entry.get()
         try:
             x_min = float(self.x_min_entry.get())
             x_max = float(self.x_max_entry.get())
+            if kind == "surface":
+                y_min = float(self.y_min_entry.get())
+                y_max = float(self.y_max_entry.get())
         except ValueError:
-            messagebox.showerror("Invalid Range", "Please enter valid numbers for X Min and X Max.")
+            messagebox.showerror("Invalid Range", "Please enter valid numbers for the plot range.")
             return
+        overlays = [name for name, selected in self.overlay_vars.items() if selected.get()]
+        tangent_at = None
+        if "tangent" in overlays:
+            try:
+                tangent_at = float(self.tangent_entry.get())
+            except ValueError:
+                messagebox.showerror("Invalid Tangent", "Please enter a valid x for the tangent line.")
+                return
         
-        # Create x values
-        x_values = np.linspace(x_min, x_max, 1000)
-        
-        # Better function parsing - handle more expressions
-        expression = function_str
-        
-        # Handle implicit multiplication like 2x -> 2*x
-        import re
-        expression = re.sub(r'(\d+)([a-zA-Z])', r'\1*\2', expression)
-        expression = re.sub(r'(\))([a-zA-Z\(])', r'\1*\2', expression)
-        
-        # Replace common functions with numpy versions
-        replacements = [
-            ("sin(", "np.sin("), 
-            ("cos(", "np.cos("),
-            ("tan(", "np.tan("),
-            ("exp(", "np.exp("),
-            ("sqrt(", "np.sqrt("),
-            ("log10(", "np.log10("),
-            ("log(", "np.log("),
-            ("ln(", "np.log("),
-            ("abs(", "np.abs("),
-            ("pi", "np.pi"),
-            ("^", "**"),  # Handle caret for exponents
-        ]
-        
-        for old, new in replacements:
-            expression = expression.replace(old, new)
-        
-        print(f"Original: {function_str} -> Parsed: {expression}")  # Debugging
-        
-        # Create vectorized function using numpy
-        try:
-            # Create a safe evaluation environment
-            safe_dict = {
-                'np': np,
-                'x': x_values,
-                'e': np.e,  # Add e constant
-                'pi': np.pi  # Add pi constant
-            }
+        if kind == "function":
+            # Parse the function with the shared expression engine
+            try:
+                function = core.compile_plot_function(function_str)
+            except Exception as e:
+                self.show_plot_error(e)
+                return
             
-            # Evaluate the function 
-            y_values = eval(expression, {"__builtins__": {}}, safe_dict)
+            log.debug("Plotting", extra={'fields': {'function': function_str, 'parsed': to_source(function.tree)}})
             
+            # Sample adaptively at the resolution of the canvas
+            canvas_widget = self.canvas.get_tk_widget()
+            work = partial(
+                self.sample_refinements, function, x_min, x_max,
+                max(canvas_widget.winfo_width(), 100), max(canvas_widget.winfo_height(), 100),
+                overlays, tangent_at,
+            )
+            title = f'f(x) = {function_str}'
+        elif kind == "parametric":
+            y_function = self.function2_entry.get()
+            work = lambda cancelled: core.sample_parametric(function_str, y_function, x_min, x_max)
+            title = f"(x, y) = ({function_str}, {y_function})"
+        elif kind == "polar":
+            work = lambda cancelled: core.sample_polar(function_str, x_min, x_max)
+            title = f"r = {function_str}"
+        else:
+            work = lambda cancelled: core.sample_surface(function_str, x_min, x_max, y_min, y_max)
+            title = f"z = {function_str}"
+        
+        self.jobs.submit("plot", work, partial(self.draw_plot, kind, title), self.show_plot_error)
+    
+    @staticmethod
+    def sample_refinements(function, x_min, x_max, pixel_width, pixel_height, overlays, tangent_at,
+                           cancelled):
+        """Sample adaptively, giving up between refinement levels once cancelled
+        
+        Overlays are sampled on the final x values and returned after them.
+        """
+        for x_values, y_values in core.sample_stages(function, x_min, x_max, pixel_width=pixel_width,
+                                                     pixel_height=pixel_height):
+            if cancelled.is_set():
+                raise Cancelled()
+        extra = core.sample_overlays(function, x_values, y_values, overlays, tangent_at) if overlays else []
+        return x_values, y_values, extra
+    
+    def show_plot_error(self, error):
+        messagebox.showerror("Error", f"Could not plot function: {str(error)}")
+        log.info("Graphing error", extra={'fields': {'error': str(error)}})
+    
+    def draw_plot(self, kind, title, samples):
+        """Draw finished samples; this runs on the main thread"""
+        # Clear the current plot
+        self.ax.clear()
+        
+        if kind == "surface":
+            x_values, y_values, z = samples
+            extent = (x_values[0], x_values[-1], y_values[0], y_values[-1])
+            self.ax.imshow(z, origin="lower", extent=extent, aspect="auto", cmap="viridis")
+            self.ax.contour(x_values, y_values, z, levels=10, colors="white", linewidths=0.8, alpha=0.7)
+        else:
             # Plot with a more visible line
-            self.ax.plot(x_values, y_values, 'b-', linewidth=2)
+            x_values, y_values, *extra = samples
+            self.ax.plot(x_values, y_values, 'b-', linewidth=2, label=title)
+            if kind != "function":
+                self.ax.set_aspect("equal", adjustable="datalim")
+            elif extra and extra[0]:
+                for label, overlay in extra[0]:
+                    self.ax.plot(x_values, overlay, '--', linewidth=1.5, label=label)
+                self.ax.legend(loc="best", fontsize="small")
             
             # Set grid and labels
             self.ax.grid(True)
             self.ax.axhline(y=0, color='k', linestyle='-', alpha=0.3)
             self.ax.axvline(x=0, color='k', linestyle='-', alpha=0.3)
-            self.ax.set_xlabel('x')
-            self.ax.set_ylabel('y')
-            self.ax.set_title(f'f(x) = {function_str}')
-            
-            # Update the plot
-            self.canvas.draw()
-            
-        except Exception as e:
-            messagebox.showerror("Error", f"Could not plot function: {str(e)}")
-            print(f"Graphing error: {str(e)}")
\ No newline at end of file
+        self.ax.set_xlabel('x')
+        self.ax.set_ylabel('y')
+        self.ax.set_title(title)
+        
+        # Update the plot once Tk is idle, so the window stays responsive
+        self.canvas.draw_idle()
@@ -0,0 +1,197 @@
+"""Symbolic derivatives of parsed expressions
+
+differentiate() applies the usual rules to the tuple AST from expression,
+and simplify() tidies the result (0 * u, u^1, nested negations, number
+arithmetic) so it compiles to little work and reads well in a legend.
+Functions without a rule here, such as factorial, raise ExpressionError;
+callers fall back to a numeric derivative.
+"""
+import math
+import operator
+
+from expression import ExpressionError, variables_of
+
+ZERO = ('num', 0)
+ONE = ('num', 1)
+TWO = ('num', 2)
+
+
+def _call(name, *args):
+    return ('call', name, args)
+
+
+def differentiate(node, variable='x'):
+    """Return the AST of d(node)/d(variable), unsimplified"""
+    kind = node[0]
+    if kind in ('num', 'const'):
+        return ZERO
+    if kind == 'var':
+        return ONE if node[1] == variable else ZERO
+    if kind == 'neg':
+        return ('neg', differentiate(node[1], variable))
+    if kind == 'call':
+        return _differentiate_call(node[1], node[2], variable)
+    left, right = node[1], node[2]
+    if kind in ('add', 'sub'):
+        return (kind, differentiate(left, variable), differentiate(right, variable))
+    if kind == 'mul':
+        return ('add', ('mul', differentiate(left, variable), right),
+                ('mul', left, differentiate(right, variable)))
+    if kind == 'div':
+        return ('div', ('sub', ('mul', differentiate(left, variable), right),
+                        ('mul', left, differentiate(right, variable))),
+                ('pow', right, TWO))
+    # pow: three cases, depending on where the variable appears
+    if variable not in variables_of(right):
+        return ('mul', ('mul', right, ('pow', left, ('sub', right, ONE))), differentiate(left, variable))
+    if variable not in variables_of(left):
+        return ('mul', ('mul', node, _call('ln', left)), differentiate(right, variable))
+    return ('mul', node, ('add', ('mul', differentiate(right, variable), _call('ln', left)),
+                          ('div', ('mul', right, differentiate(left, variable)), left)))
+
+
+def _differentiate_call(name, args, variable):
+    inner = args[0]
+    if name == 'nthroot':
+        if variable in variables_of(args[1]):
+            raise ExpressionError("Cannot differentiate nthroot with a variable root")
+        # d/du u^(1/n) = u^(1/n) / (n u)
+        outer = ('div', _call('nthroot', *args), ('mul', args[1], inner))
+    elif name == 'sin':
+        outer = _call('cos', inner)
+    elif name == 'cos':
+        outer = ('neg', _call('sin', inner))
+    elif name == 'tan':
+        outer = ('div', ONE, ('pow', _call('cos', inner), TWO))
+    elif name == 'exp':
+        outer = _call('exp', inner)
+    elif name == 'sqrt':
+        outer = ('div', ONE, ('mul', TWO, _call('sqrt', inner)))
+    elif name == 'log' and len(args) == 2:
+        if variable in variables_of(args[1]):
+            raise ExpressionError("Cannot differentiate log with a variable base")
+        # log(u, b) = ln(u) / ln(b)
+        outer = ('div', ONE, ('mul', inner, _call('ln', args[1])))
+    elif name in ('ln', 'log'):
+        outer = ('div', ONE, inner)
+    elif name == 'log10':
+        outer = ('div', ONE, ('mul', inner, _call('ln', ('num', 10))))
+    elif name == 'abs':
+        outer = ('div', inner, _call('abs', inner))
+    else:
+        raise ExpressionError(f"Cannot differentiate '{name}'")
+    return ('mul', outer, differentiate(inner, variable))
+
+
+_ARITHMETIC = {'add': operator.add, 'sub': operator.sub, 'mul': operator.mul}
+
+
+def _fold(kind, left, right):
+    # Number arithmetic, unless the result would be long or inexact to print
+    if kind in _ARITHMETIC:
+        return _ARITHMETIC[kind](left, right)
+    if kind == 'div' and right != 0:
+        quotient = left / right
+        if not math.isfinite(quotient):
+            return None
+        if quotient == int(quotient):
+            return int(quotient)
+        return quotient if len(repr(quotient)) <= 8 else None
+    if kind == 'pow' and isinstance(left, int) and isinstance(right, int) and 0 <= right <= 16:
+        return left ** right
+    return None
+
+
+def _is_num(node, value=None):
+    return node[0] == 'num' and (value is None or node[1] == value)
+
+
+def simplify(node):
+    """Return an equivalent, usually smaller AST
+
+    Only rewrites that hold wherever the original is defined are used, plus
+    0 * u = 0, which also hides points where u alone is undefined.
+    """
+    kind = node[0]
+    if kind in ('num', 'const', 'var'):
+        return node
+    if kind == 'call':
+        args = tuple(simplify(arg) for arg in node[2])
+        if node[1] in ('ln', 'log') and args == (('const', 'e'),):
+            return ONE
+        return ('call', node[1], args)
+    if kind == 'neg':
+        operand = simplify(node[1])
+        if operand[0] == 'neg':
+            return operand[1]
+        if _is_num(operand):
+            return ('num', -operand[1])
+        return ('neg', operand)
+
+    left, right = simplify(node[1]), simplify(node[2])
+    if _is_num(left) and _is_num(right):
+        folded = _fold(kind, left[1], right[1])
+        if folded is not None:
+            return ('num', folded)
+    if kind == 'add':
+        if _is_num(left, 0):
+            return right
+        if _is_num(right, 0):
+            return left
+        if right[0] == 'neg':
+            return simplify(('sub', left, right[1]))
+        if left[0] == 'neg':
+            return simplify(('sub', right, left[1]))
+    elif kind == 'sub':
+        if _is_num(right, 0):
+            return left
+        if _is_num(left, 0):
+            return simplify(('neg', right))
+        if left == right:
+            return ZERO
+        if right[0] == 'neg':
+            return ('add', left, right[1])
+    elif kind == 'mul':
+        if _is_num(left, 0) or _is_num(right, 0):
+            return ZERO
+        if _is_num(left, 1):
+            return right
+        if _is_num(right, 1):
+            return left
+        if left[0] == 'neg' or right[0] == 'neg':
+            # Pull signs out front: (-u) * v = -(u * v)
+            unsigned = ('mul', left[1] if left[0] == 'neg' else left, right[1] if right[0] == 'neg' else right)
+            product = simplify(unsigned)
+            return product if (left[0] == 'neg') == (right[0] == 'neg') else simplify(('neg', product))
+        if _is_num(right):
+            # Numbers go first: u * 2 -> 2 * u
+            left, right = right, left
+        if _is_num(left) and right[0] == 'mul' and _is_num(right[1]):
+            return simplify(('mul', ('num', left[1] * right[1][1]), right[2]))
+        if left == right:
+            return ('pow', left, TWO)
+    elif kind == 'div':
+        if (_is_num(left) and _is_num(right) and isinstance(left[1], int) and isinstance(right[1], int)
+                and right[1] != 0):
+            # A fraction that did not fold: 3/9 -> 1/3
+            divisor = math.gcd(left[1], right[1])
+            return ('div', ('num', left[1] // divisor), ('num', right[1] // divisor))
+        if _is_num(right, 1):
+            return left
+        if _is_num(left, 0):
+            return ZERO
+        if left == right:
+            return ONE
+    elif kind == 'pow':
+        if _is_num(right, 0):
+            return ONE
+        if _is_num(right, 1):
+            return left
+        if _is_num(left, 1):
+            return ONE
+    return (kind, left, right)
+
+
+def derivative(node, variable='x'):
+    """The simplified AST of d(node)/d(variable)"""
+    return simplify(differentiate(node, variable))
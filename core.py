@@ -0,0 +1,583 @@
+"""GUI-free calculator core shared by the Tk app, the web server and scripts
+
+    >>> import core
+    >>> core.evaluate('2^10')
+    1024
+    >>> core.evaluate('1/3', mode='exact')
+    Fraction(1, 3)
+    >>> core.preview('tab-1', '2^10 + 1')      # then '2^10 + 12' parses only '12'
+    1025
+    >>> x_values, y_values = core.sample_function('sin(x)', -10, 10)
+    >>> png = core.render_plot('sin(x)', -10, 10)
+    >>> x_values, y_values, z = core.sample_surface('sin(x)cos(y)', -3, 3, -3, 3)
+    >>> svg = core.render_polar('1 + cos(theta)', output_format='svg')
+    >>> core.solve('x^2 = 9').roots
+    [-3.0, 3.0]
+
+Nothing here imports Flask or Tk.  NumPy and matplotlib are only imported
+by the functions that sample, plot or solve, and figures are drawn on a
+bare matplotlib Figure, so no display or GUI backend is ever needed.
+"""
+import io
+import math
+import time
+
+import telemetry
+from expression import (
+    DEFAULT_PRECISION, MAX_PRECISION, CompiledExpression, ExpressionCache, ExpressionError, normalize,
+    to_source,
+)
+from plot_cache import make_key
+from preview import PreviewSessions
+
+# Compiled expressions, shared by everything in the process
+expression_cache = ExpressionCache(512)
+
+# Parse state of live keypad previews, by client session
+preview_sessions = PreviewSessions()
+
+# Time spent in each stage: parse, eval, preview, overlays, figure, savefig, raster,
+# svg, points, base64 and solve
+STAGE_SECONDS = telemetry.REGISTRY.histogram(
+    'calculator_stage_seconds', 'Time spent in each stage of evaluating and rendering', ('stage',))
+
+# Curves and grids with at least this many points are evaluated by a
+# VectorProgram: in cache-sized chunks, into reused buffers, across threads.
+# From about one chunk (vector_program.CHUNK_SIZE) up it beats evaluating
+# whole arrays, so dense web curves and default surfaces take this path.
+# Each such evaluation reports the bytes it held at its peak.
+CHUNKED_MIN_POINTS = 1 << 14
+EVAL_PEAK_BYTES = telemetry.REGISTRY.histogram(
+    'calculator_eval_peak_bytes', 'Peak output and scratch memory of chunked evaluations', ('kind',),
+    buckets=tuple(2.0 ** n for n in range(16, 32, 2)))
+
+# 'float' is math floats and ints, 'decimal' is decimal.Decimal at a chosen
+# precision and 'exact' keeps integers and fractions exact
+NUMERIC_MODES = ('float', 'decimal', 'exact')
+
+
+def evaluation_mode(mode='float', precision=None):
+    """Validate a numeric mode and precision and return the expression engine mode"""
+    if mode not in NUMERIC_MODES:
+        raise ValueError(f"Unknown mode '{mode}' (expected one of {', '.join(NUMERIC_MODES)})")
+    if mode == 'float':
+        return 'scalar'
+    if mode == 'exact':
+        return 'exact'
+    if precision is None:
+        precision = DEFAULT_PRECISION
+    try:
+        precision = int(precision)
+    except (TypeError, ValueError):
+        raise ValueError("Precision must be an integer")
+    if not 1 <= precision <= MAX_PRECISION:
+        raise ValueError(f"Precision must be between 1 and {MAX_PRECISION}")
+    return f'decimal:{precision}'
+
+
+def evaluate(expression, mode='float', precision=None):
+    """Evaluate a keypad expression such as '2sin(pi/4)' and return the number"""
+    engine_mode = evaluation_mode(mode, precision)
+    # Constant subexpressions are folded while compiling, so 'parse' includes them
+    with STAGE_SECONDS.time(stage='parse'):
+        compiled = expression_cache.compile_expression(expression, mode=engine_mode)
+    with STAGE_SECONDS.time(stage='eval'):
+        return compiled()
+
+
+def preview(session, expression, mode='float', precision=None):
+    """Evaluate keypad text as evaluate() does, reusing the session's last parse
+
+    Meant for text that differs a little from the session's previous text,
+    such as a live preview after each keystroke: only the tokens from the
+    first change on are parsed and evaluated again.
+    """
+    engine_mode = evaluation_mode(mode, precision)
+    with STAGE_SECONDS.time(stage='preview'):
+        return preview_sessions.preview(session, expression, engine_mode)
+
+
+def compile_plot_function(function):
+    """Compile the text of f(x) for plotting; compiled functions pass through"""
+    if isinstance(function, CompiledExpression):
+        return function
+    with STAGE_SECONDS.time(stage='parse'):
+        return expression_cache.compile_function(function, mode='vector')
+
+
+# Everything besides the function and range that changes a rendered plot.
+# Caches of rendered plots should key on it, so bump the version when the
+# styling changes.
+PLOT_SETTINGS = {
+    'samples': 1000,
+    'pixel_width': 800,
+    'pixel_height': 600,
+    'tolerance': 0.5,
+    'max_evaluations': 4000,
+    'figsize': (8, 6),
+    'dpi': 100,
+    'style': 'ggplot',
+    'curve_samples': 2000,
+    'grid_resolution': 200,
+    'version': 2,
+}
+
+# Plot types: y = f(x), a parametric curve (x(t), y(t)), a polar curve
+# r(theta) and a surface z = f(x, y) drawn as a heatmap with contours
+PLOT_KINDS = ('function', 'parametric', 'polar', 'surface')
+
+# The variables each kind of plot is written in; polar angles may be t too
+PLOT_VARIABLES = {
+    'function': ('x',),
+    'parametric': ('t',),
+    'polar': ('theta', 't'),
+    'surface': ('x', 'y'),
+}
+
+# Hard caps on the points of a parametric or polar curve and on each side of
+# a surface grid.  A surface evaluates resolution^2 points and holds a few
+# arrays that size, so 1000 is about 8 MB per array.
+MAX_CURVE_SAMPLES = 100000
+MAX_GRID_RESOLUTION = 1000
+
+# 'png' is an image, 'svg' is vector markup and 'points' is the raw sample
+# series as JSON
+PLOT_FORMATS = ('png', 'svg', 'points')
+
+# 'matplotlib' draws the full styled figure; 'raster' draws straight into a
+# NumPy pixel buffer, which is much faster
+RENDERERS = ('matplotlib', 'raster')
+
+# 'adaptive' refines where the curve needs it; 'uniform' is a fixed grid
+SAMPLINGS = ('adaptive', 'uniform')
+
+
+def plot_key(function, x_min, x_max, output_format='png', renderer='matplotlib', sampling='adaptive',
+             overlays=(), tangent_at=None):
+    """The plot cache key of a render_plot() call; the web server keys on it too"""
+    # Only PNG output goes through a rasterizer
+    renderer = renderer if output_format == 'png' else None
+    parts = (output_format, renderer, sampling, normalize(function), x_min, x_max, PLOT_SETTINGS)
+    if overlays:
+        # Plots without overlays keep the keys they always had
+        parts += (tuple(overlays), tangent_at)
+    return make_key(*parts)
+
+
+def sample_function(function, x_min=-10.0, x_max=10.0, sampling='adaptive',
+                    pixel_width=None, pixel_height=None):
+    """Evaluate f(x), given as text or compiled, over [x_min, x_max]
+
+    Adaptive sampling aims at a plot of pixel_width by pixel_height pixels.
+    Returns (x_values, y_values) with NaN wherever f is undefined.
+    """
+    from sampling import adaptive_sample, uniform_sample
+
+    function = compile_plot_function(function)
+    f = lambda x_values: function(x=x_values)
+    with STAGE_SECONDS.time(stage='eval'):
+        if sampling == 'uniform':
+            return uniform_sample(f, x_min, x_max, PLOT_SETTINGS['samples'])
+        # Refine where the curve bends and break it at discontinuities
+        return adaptive_sample(
+            f, x_min, x_max,
+            pixel_width=pixel_width or PLOT_SETTINGS['pixel_width'],
+            pixel_height=pixel_height or PLOT_SETTINGS['pixel_height'],
+            tolerance=PLOT_SETTINGS['tolerance'],
+            max_evaluations=PLOT_SETTINGS['max_evaluations'],
+        )
+
+
+def sample_stages(function, x_min=-10.0, x_max=10.0, sampling='adaptive',
+                  pixel_width=None, pixel_height=None):
+    """Like sample_function(), but yield a coarse set of samples first and refine it
+
+    The last pair yielded is exactly what sample_function() returns.  Stop
+    iterating to abandon the remaining work.
+    """
+    from sampling import adaptive_refinements, uniform_sample
+
+    function = compile_plot_function(function)
+    f = lambda x_values: function(x=x_values)
+    if sampling == 'uniform':
+        yield uniform_sample(f, x_min, x_max, PLOT_SETTINGS['samples'] // 16)
+        yield uniform_sample(f, x_min, x_max, PLOT_SETTINGS['samples'])
+        return
+    yield from adaptive_refinements(
+        f, x_min, x_max,
+        pixel_width=pixel_width or PLOT_SETTINGS['pixel_width'],
+        pixel_height=pixel_height or PLOT_SETTINGS['pixel_height'],
+        tolerance=PLOT_SETTINGS['tolerance'],
+        max_evaluations=PLOT_SETTINGS['max_evaluations'],
+    )
+
+
+def draw_figure(series, title, labels=None, equal_aspect=False):
+    """Draw (x, y) curves onto one matplotlib figure and return PNG bytes"""
+    import matplotlib.style
+    from matplotlib.figure import Figure
+
+    import plot_formats
+
+    start = time.perf_counter()
+    # Create the figure with a more attractive style
+    matplotlib.style.use(PLOT_SETTINGS['style'])
+    fig = Figure(figsize=PLOT_SETTINGS['figsize'], dpi=PLOT_SETTINGS['dpi'])
+    ax = fig.add_subplot(111)
+
+    # Plot with a more visible line and better styling
+    for i, (x_values, y_values) in enumerate(series):
+        color = plot_formats.series_color(i)
+        label = labels[i] if labels else None
+        ax.plot(x_values, y_values, linewidth=2.5, color=color, label=label)
+    if labels:
+        ax.legend(loc='upper right')
+
+    # Set grid and labels with better styling
+    ax.grid(True, linestyle='--', alpha=0.7)
+    ax.axhline(y=0, color='#616161', linestyle='-', alpha=0.5, linewidth=1)
+    ax.axvline(x=0, color='#616161', linestyle='-', alpha=0.5, linewidth=1)
+    ax.set_xlabel('x', fontsize=12)
+    ax.set_ylabel('y', fontsize=12)
+    ax.set_title(title, fontsize=14, fontweight='bold')
+    if equal_aspect:
+        # Circles should look like circles
+        ax.set_aspect('equal', adjustable='datalim')
+
+    # Better styling for the figure
+    fig.patch.set_facecolor('#f5f5f5')
+    ax.set_facecolor('#f9f9f9')
+    ax.spines['top'].set_visible(False)
+    ax.spines['right'].set_visible(False)
+
+    STAGE_SECONDS.observe(time.perf_counter() - start, stage='figure')
+    return _save_figure(fig)
+
+
+def draw_surface(x_values, y_values, z, title):
+    """Draw z = f(x, y) as a heatmap with contour lines and return PNG bytes"""
+    import matplotlib.style
+    import numpy as np
+    from matplotlib.figure import Figure
+
+    start = time.perf_counter()
+    matplotlib.style.use(PLOT_SETTINGS['style'])
+    fig = Figure(figsize=PLOT_SETTINGS['figsize'], dpi=PLOT_SETTINGS['dpi'])
+    ax = fig.add_subplot(111)
+
+    z = np.ma.masked_invalid(z)
+    extent = (x_values[0], x_values[-1], y_values[0], y_values[-1])
+    image = ax.imshow(z, origin='lower', extent=extent, aspect='auto', cmap='viridis',
+                      interpolation='bilinear')
+    if z.count() and z.min() < z.max():
+        contours = ax.contour(x_values, y_values, z, levels=10, colors='white', linewidths=0.8, alpha=0.7)
+        ax.clabel(contours, fontsize=8, fmt='%.3g')
+    fig.colorbar(image, ax=ax)
+
+    ax.grid(False)
+    ax.set_xlabel('x', fontsize=12)
+    ax.set_ylabel('y', fontsize=12)
+    ax.set_title(title, fontsize=14, fontweight='bold')
+    fig.patch.set_facecolor('#f5f5f5')
+
+    STAGE_SECONDS.observe(time.perf_counter() - start, stage='figure')
+    return _save_figure(fig)
+
+
+def _save_figure(fig):
+    # Save the figure to a buffer
+    buf = io.BytesIO()
+    with STAGE_SECONDS.time(stage='savefig'):
+        fig.savefig(buf, format='png', bbox_inches='tight')
+    return buf.getvalue()
+
+
+def _check_options(output_format, renderer, sampling):
+    if output_format not in PLOT_FORMATS:
+        raise ValueError(f"Unknown format '{output_format}'")
+    if output_format == 'png' and renderer not in RENDERERS:
+        raise ValueError(f"Unknown renderer '{renderer}'")
+    if sampling not in SAMPLINGS:
+        raise ValueError(f"Unknown sampling '{sampling}'")
+
+
+def render_plot(function, x_min=-10.0, x_max=10.0, output_format='png', renderer='matplotlib',
+                sampling='adaptive', title=None, overlays=(), tangent_at=None):
+    """Plot f(x), given as text or compiled, and return the bytes of the output
+
+    png is an image from the chosen renderer, svg is UTF-8 markup and points
+    is a JSON array of [x, y] pairs.  The title defaults to 'f(x) = ...'.
+    overlays adds curves from OVERLAYS to the same axes; see sample_overlays().
+    """
+    _check_options(output_format, renderer, sampling)
+    function = compile_plot_function(function)
+    if title is None:
+        title = f'f(x) = {function.text}'
+    x_values, y_values = sample_function(function, x_min, x_max, sampling)
+    if overlays:
+        extra = sample_overlays(function, x_values, y_values, overlays, tangent_at)
+        return _render_overlays(x_values, y_values, extra, title, output_format, renderer)
+    return _render_curve(x_values, y_values, title, output_format, renderer)
+
+
+def _render_curve(x_values, y_values, title, output_format, renderer, equal_aspect=False):
+    import plot_formats
+    import raster
+
+    if output_format == 'png' and renderer == 'matplotlib':
+        return draw_figure([(x_values, y_values)], title, equal_aspect=equal_aspect)
+    stage = 'raster' if output_format == 'png' else output_format
+    with STAGE_SECONDS.time(stage=stage):
+        if output_format == 'png':
+            return raster.render_png(x_values, y_values)
+        if output_format == 'svg':
+            return plot_formats.render_svg(x_values, y_values, title).encode('utf-8')
+        return plot_formats.encode_points(x_values, y_values).encode('utf-8')
+
+
+def _render_overlays(x_values, y_values, overlays, title, output_format, renderer):
+    import plot_formats
+    import raster
+
+    series = [(x_values, y_values)] + [(x_values, values) for label, values in overlays]
+    labels = ['f(x)'] + [label for label, values in overlays]
+    if output_format == 'png' and renderer == 'matplotlib':
+        return draw_figure(series, title, labels)
+    stage = 'raster' if output_format == 'png' else output_format
+    with STAGE_SECONDS.time(stage=stage):
+        if output_format == 'png':
+            return raster.render_series(series)
+        if output_format == 'svg':
+            return plot_formats.render_svg_series(series, title, labels).encode('utf-8')
+        return plot_formats.encode_overlays(x_values, y_values, overlays).encode('utf-8')
+
+
+# Curves that can be drawn over f(x): its derivative, its integral from the
+# left end of the range, and its tangent line at one point
+OVERLAYS = ('derivative', 'integral', 'tangent')
+
+
+def derivative_function(function):
+    """Return (f', text) for f given as text or compiled
+
+    f' is differentiated symbolically, simplified and compiled like any plot
+    function, so it is exact and vectorized.  If f uses something with no
+    rule it is a central difference instead, and text is None.
+    """
+    from calculus import derivative
+    from sampling import central_difference
+
+    function = compile_plot_function(function)
+    try:
+        tree = derivative(function.tree)
+    except ExpressionError:
+        return (lambda x: central_difference(lambda x: function(x=x), x)), None
+    text = to_source(tree)
+    return CompiledExpression(text, tree, 'vector'), text
+
+
+def sample_overlays(function, x_values, y_values, overlays, tangent_at=None):
+    """Evaluate overlays of f on the x values f was sampled at
+
+    The integral is a running trapezoid sum over the samples, in one pass.
+    The tangent touches f at tangent_at, by default the middle of the range.
+    Returns [(label, values)] in the order of OVERLAYS.
+    """
+    from sampling import cumulative_integral, sample_at
+
+    unknown = set(overlays).difference(OVERLAYS)
+    if unknown:
+        raise ValueError(f"Unknown overlay '{sorted(unknown)[0]}' (expected one of {', '.join(OVERLAYS)})")
+    function = compile_plot_function(function)
+    results = []
+    with STAGE_SECONDS.time(stage='overlays'):
+        if 'derivative' in overlays or 'tangent' in overlays:
+            df, text = derivative_function(function)
+        if 'derivative' in overlays:
+            label = f"f'(x) = {text}" if text else "f'(x), numeric"
+            results.append((label, sample_at(lambda x: df(x=x), x_values)))
+        if 'integral' in overlays:
+            results.append((f'∫f dx from {x_values[0]:g}', cumulative_integral(x_values, y_values)))
+        if 'tangent' in overlays:
+            x0 = (x_values[0] + x_values[-1]) / 2 if tangent_at is None else tangent_at
+            y0 = sample_at(lambda x: function(x=x), [x0])[0]
+            slope = sample_at(lambda x: df(x=x), [x0])[0]
+            if not (math.isfinite(y0) and math.isfinite(slope)):
+                raise ValueError(f"f has no tangent at x = {x0:g}")
+            results.append((f'tangent at x = {x0:g}', y0 + slope * (x_values - x0)))
+    return results
+
+
+def render_series(functions, output_format='png', renderer='matplotlib', sampling='adaptive'):
+    """Plot several (function, x_min, x_max) onto one figure with a legend
+
+    Only png and svg can hold more than one curve.  The raster renderer has
+    no text, so its figure comes without a legend.
+    """
+    import plot_formats
+    import raster
+
+    _check_options(output_format, renderer, sampling)
+    if output_format == 'points':
+        raise ValueError("Shared figures need png or svg output")
+    compiled = [(compile_plot_function(function), x_min, x_max) for function, x_min, x_max in functions]
+    series = [sample_function(function, x_min, x_max, sampling) for function, x_min, x_max in compiled]
+    labels = [f'f(x) = {function.text}' for function, x_min, x_max in compiled]
+    if output_format == 'svg':
+        with STAGE_SECONDS.time(stage='svg'):
+            return plot_formats.render_svg_series(series, '', labels).encode('utf-8')
+    if renderer == 'raster':
+        with STAGE_SECONDS.time(stage='raster'):
+            return raster.render_series(series)
+    return draw_figure(series, '', labels)
+
+
+def compile_plot_expression(expression, variables):
+    """Compile the text of an expression in the given variables for plotting"""
+    if isinstance(expression, CompiledExpression):
+        return expression
+    with STAGE_SECONDS.time(stage='parse'):
+        return expression_cache.compile_expression(expression, mode='vector', variables=variables)
+
+
+def vector_function(function, points, kind):
+    """Call a compiled plot expression directly, or chunked once points is large
+
+    Either way the result takes the variables as keyword arguments.
+    """
+    if points < CHUNKED_MIN_POINTS:
+        return function
+    from vector_program import VectorProgram
+
+    program = VectorProgram(function.tree)
+
+    def evaluate(**scope):
+        values = program(**scope)
+        EVAL_PEAK_BYTES.observe(program.stats['peak_bytes'], kind=kind)
+        return values
+    return evaluate
+
+
+def check_samples(samples, limit=MAX_CURVE_SAMPLES, name='Samples'):
+    """Validate a number of curve samples or a grid resolution and return it"""
+    try:
+        samples = int(samples)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be an integer")
+    if not 2 <= samples <= limit:
+        raise ValueError(f"{name} must be between 2 and {limit}")
+    return samples
+
+
+def sample_parametric(x_function, y_function, t_min=0.0, t_max=2 * math.pi, samples=None):
+    """Evaluate x(t) and y(t), given as text or compiled, at evenly spaced t"""
+    from sampling import parametric_sample
+
+    samples = check_samples(samples or PLOT_SETTINGS['curve_samples'])
+    fx = vector_function(compile_plot_expression(x_function, PLOT_VARIABLES['parametric']),
+                         samples, 'parametric')
+    fy = vector_function(compile_plot_expression(y_function, PLOT_VARIABLES['parametric']),
+                         samples, 'parametric')
+    with STAGE_SECONDS.time(stage='eval'):
+        return parametric_sample(lambda t: fx(t=t), lambda t: fy(t=t), t_min, t_max, samples)
+
+
+def sample_polar(r_function, theta_min=0.0, theta_max=2 * math.pi, samples=None):
+    """Evaluate r(theta) at evenly spaced angles and return Cartesian (x, y)
+
+    The angle may be written as theta or t.
+    """
+    from sampling import polar_sample
+
+    samples = check_samples(samples or PLOT_SETTINGS['curve_samples'])
+    fr = vector_function(compile_plot_expression(r_function, PLOT_VARIABLES['polar']), samples, 'polar')
+    with STAGE_SECONDS.time(stage='eval'):
+        return polar_sample(lambda theta: fr(theta=theta, t=theta), theta_min, theta_max, samples)
+
+
+def sample_surface(function, x_min=-10.0, x_max=10.0, y_min=-10.0, y_max=10.0, resolution=None):
+    """Evaluate f(x, y) over a resolution x resolution grid in one NumPy pass
+
+    Returns (x_values, y_values, z) with z[i, j] = f(x_values[j], y_values[i]).
+    """
+    from sampling import grid_sample
+
+    resolution = check_samples(resolution or PLOT_SETTINGS['grid_resolution'],
+                               MAX_GRID_RESOLUTION, 'Resolution')
+    f = vector_function(compile_plot_expression(function, PLOT_VARIABLES['surface']),
+                        resolution * resolution, 'surface')
+    with STAGE_SECONDS.time(stage='eval'):
+        return grid_sample(lambda x, y: f(x=x, y=y), x_min, x_max, y_min, y_max, resolution)
+
+
+def render_parametric(x_function, y_function, t_min=0.0, t_max=2 * math.pi, output_format='png',
+                      renderer='matplotlib', samples=None, title=None):
+    """Plot the curve (x(t), y(t)) and return the bytes of the output, like render_plot()"""
+    _check_options(output_format, renderer, 'uniform')
+    fx = compile_plot_expression(x_function, PLOT_VARIABLES['parametric'])
+    fy = compile_plot_expression(y_function, PLOT_VARIABLES['parametric'])
+    if title is None:
+        title = f'(x, y) = ({fx.text}, {fy.text})'
+    x_values, y_values = sample_parametric(fx, fy, t_min, t_max, samples)
+    return _render_curve(x_values, y_values, title, output_format, renderer, equal_aspect=True)
+
+
+def render_polar(r_function, theta_min=0.0, theta_max=2 * math.pi, output_format='png',
+                 renderer='matplotlib', samples=None, title=None):
+    """Plot the polar curve r(theta) and return the bytes of the output, like render_plot()"""
+    _check_options(output_format, renderer, 'uniform')
+    fr = compile_plot_expression(r_function, PLOT_VARIABLES['polar'])
+    if title is None:
+        title = f'r = {fr.text}'
+    x_values, y_values = sample_polar(fr, theta_min, theta_max, samples)
+    return _render_curve(x_values, y_values, title, output_format, renderer, equal_aspect=True)
+
+
+def render_surface(function, x_min=-10.0, x_max=10.0, y_min=-10.0, y_max=10.0, output_format='png',
+                   renderer='matplotlib', resolution=None, title=None):
+    """Plot z = f(x, y) as a heatmap with contours and return the bytes of the output
+
+    points gives the grid as JSON: {"x": [...], "y": [...], "z": [[...], ...]}.
+    """
+    import plot_formats
+    import raster
+
+    _check_options(output_format, renderer, 'uniform')
+    f = compile_plot_expression(function, PLOT_VARIABLES['surface'])
+    if title is None:
+        title = f'z = {f.text}'
+    x_values, y_values, z = sample_surface(f, x_min, x_max, y_min, y_max, resolution)
+    if output_format == 'png' and renderer == 'matplotlib':
+        return draw_surface(x_values, y_values, z, title)
+    stage = 'raster' if output_format == 'png' else output_format
+    with STAGE_SECONDS.time(stage=stage):
+        if output_format == 'png':
+            return raster.render_heatmap(x_values, y_values, z)
+        if output_format == 'svg':
+            return plot_formats.render_svg_heatmap(x_values, y_values, z, title).encode('utf-8')
+        return plot_formats.encode_grid(x_values, y_values, z).encode('utf-8')
+
+
+def solve(equation, x_min=-100.0, x_max=100.0):
+    """Solve an equation in x such as 'x^2 = 9'; see solver.solve"""
+    import solver
+
+    with STAGE_SECONDS.time(stage='solve'):
+        return solver.solve(equation, x_min, x_max, compiler=expression_cache.compile_function)
+
+
+def warm_up(draw=True):
+    """Import the plotting stack, and draw throwaway plots, ahead of real work
+
+    Worker processes run this as soon as they start.  Pre-fork servers can
+    call it before forking so every child starts with it already loaded.
+    """
+    import plot_formats
+    import raster
+    import sampling
+    import solver
+
+    if draw:
+        # The first figure pays for fonts, styles and the Agg canvas
+        render_plot('x', -1, 1, sampling='uniform')
+        render_plot('x', -1, 1, renderer='raster', sampling='uniform')
@@ -0,0 +1,1009 @@
+import decimal
+import functools
+import math
+import operator
+import re
+import threading
+from collections import OrderedDict
+from fractions import Fraction
+
+
+class ExpressionError(ValueError):
+    """Raised when an expression cannot be parsed or compiled"""
+
+
+# Functions and constants that expressions are allowed to use.  Each mode maps
+# the same names onto a different implementation: 'scalar' evaluates plain
+# Python numbers (keypad), 'vector' evaluates NumPy arrays (plotting),
+# 'decimal' evaluates decimal.Decimal at a fixed precision ('decimal:50' for
+# 50 digits) and 'exact' keeps integers and fractions exact.  Each function
+# takes a fixed number of arguments, checked when parsing; log takes an
+# optional base as its second.
+FUNCTION_ARGUMENTS = {
+    'sin': (1, 1), 'cos': (1, 1), 'tan': (1, 1), 'exp': (1, 1), 'sqrt': (1, 1),
+    'log10': (1, 1), 'log': (1, 2), 'ln': (1, 1), 'abs': (1, 1), 'factorial': (1, 1),
+    'nthroot': (2, 2),
+}
+FUNCTION_NAMES = tuple(FUNCTION_ARGUMENTS)
+CONSTANT_NAMES = ('pi', 'e')
+
+# Groups are number, name and operator; anything else that is not whitespace
+# lands in the last group and is reported as an error
+_TOKEN_RE = re.compile(r'''
+    ((?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+  | ([A-Za-z_][A-Za-z_0-9]*)
+  | (\*\*|[-+*/^%(),])
+  | (\S)
+''', re.VERBOSE)
+
+
+def _check_arguments(name, count):
+    low, high = FUNCTION_ARGUMENTS[name]
+    if not low <= count <= high:
+        expected = f"{low} or {high}" if low != high else f"{low}"
+        plural = '' if high == 1 else 's'
+        raise ExpressionError(f"Function '{name}' takes {expected} argument{plural}, not {count}")
+
+
+def _nthroot(value, n):
+    # Real n-th root, so nthroot(-8, 3) gives -2 instead of a complex number;
+    # other roots of negatives are undefined, as in the decimal backend
+    if value < 0:
+        if n % 2 != 1:
+            raise ValueError("math domain error")
+        return -((-value) ** (1.0 / n))
+    return value ** (1.0 / n)
+
+
+# Cost limits.  Integer and fraction results grow without bound, so the size
+# of every power, product and factorial is estimated before it is computed
+# and anything past these limits is rejected instead of evaluated.
+MAX_DIGITS = 4000
+MAX_EXPONENT = 100000
+MAX_FACTORIAL = 1000
+MAX_PRECISION = 1000
+DEFAULT_PRECISION = 28
+
+# Decimal sin and cos reduce their argument with the precision plus one
+# digit per power of ten of the argument; the series costs about the square
+# of that working precision, which is kept below this many digits
+MAX_TRIG_DIGITS = 1200
+
+
+def _is_exact(value):
+    return isinstance(value, (int, Fraction)) and not isinstance(value, bool)
+
+
+def _log10_size(value):
+    """Decimal digits spent on an int, or on a fraction's numerator and denominator"""
+    if isinstance(value, Fraction):
+        return _log10_size(value.numerator) + _log10_size(value.denominator)
+    return math.log10(abs(value)) if value else 0.0
+
+
+def _check_digits(digits):
+    if digits > MAX_DIGITS:
+        raise ExpressionError(f"Result would have about {digits:,.0f} digits (limit {MAX_DIGITS:,})")
+
+
+def _checked_mul(left, right):
+    if _is_exact(left) and _is_exact(right):
+        _check_digits(_log10_size(left) + _log10_size(right))
+    return left * right
+
+
+def _checked_pow(base, exponent):
+    if isinstance(exponent, Fraction) and exponent.denominator == 1:
+        exponent = exponent.numerator
+    # A negative power of an int is a float; fractions stay exact either way
+    if _is_exact(base) and isinstance(exponent, int) and (exponent >= 0 or isinstance(base, Fraction)):
+        if abs(base) not in (0, 1):
+            if abs(exponent) > MAX_EXPONENT:
+                raise ExpressionError(f"Exponent {exponent:,} is too large (limit {MAX_EXPONENT:,})")
+            _check_digits(abs(exponent) * _log10_size(base))
+    return base ** exponent
+
+
+def _real_pow(base, exponent):
+    # A negative base to a fractional power is complex; like math.pow and the
+    # decimal backend, report it (nthroot gives the real odd roots)
+    result = _checked_pow(base, exponent)
+    if isinstance(result, complex):
+        raise ValueError("math domain error")
+    return result
+
+
+def _checked_factorial(n):
+    if isinstance(n, Fraction) and n.denominator == 1:
+        n = n.numerator
+    if isinstance(n, int) and n > MAX_FACTORIAL:
+        raise ExpressionError(f"factorial({n:,}) is too large (limit {MAX_FACTORIAL:,})")
+    if isinstance(n, int) and n > 1:
+        _check_digits(math.lgamma(n + 1) / math.log(10))
+    return math.factorial(n)
+
+
+def _scalar_backend():
+    return {
+        'mul': _checked_mul,
+        'pow': _real_pow,
+        'sin': math.sin,
+        'cos': math.cos,
+        'tan': math.tan,
+        'exp': math.exp,
+        'sqrt': math.sqrt,
+        'log10': math.log10,
+        'log': math.log,
+        'ln': math.log,
+        'abs': abs,
+        'factorial': _checked_factorial,
+        'nthroot': _nthroot,
+        'pi': math.pi,
+        'e': math.e,
+    }
+
+
+def _vector_backend():
+    import numpy as np
+
+    def nthroot(value, n):
+        # The scalar rule, with NaN for the roots that are undefined there
+        root = np.sign(value) * np.abs(value) ** (1.0 / n)
+        undefined = np.less(value, 0) & (np.remainder(n, 2) != 1)
+        if np.ndim(root) == 0:
+            return np.nan if undefined else root
+        np.copyto(root, np.nan, where=undefined)
+        return root
+
+    return {
+        # Arrays pass straight through; the checks only see folded constants
+        'mul': _checked_mul,
+        'pow': _checked_pow,
+        'sin': np.sin,
+        'cos': np.cos,
+        'tan': np.tan,
+        'exp': np.exp,
+        'sqrt': np.sqrt,
+        'log10': np.log10,
+        'log': lambda value, base=None: np.log(value) if base is None else np.log(value) / np.log(base),
+        'ln': np.log,
+        'abs': np.abs,
+        'nthroot': nthroot,
+        'pi': np.pi,
+        'e': np.e,
+    }
+
+
+def _to_fraction(value):
+    # repr gives the shortest text for a float, so 0.1 becomes exactly 1/10
+    return Fraction(value) if isinstance(value, int) else Fraction(repr(value))
+
+
+def _exact_sqrt(value):
+    # Perfect squares like 9/4 keep an exact root; anything else is a float
+    if isinstance(value, Fraction) and value >= 0:
+        numerator = math.isqrt(value.numerator)
+        denominator = math.isqrt(value.denominator)
+        if numerator * numerator == value.numerator and denominator * denominator == value.denominator:
+            return Fraction(numerator, denominator)
+    return math.sqrt(value)
+
+
+# Sums and quotients of operands within MAX_DIGITS are cheap to compute, but
+# their reduced size is only known afterwards (1/3 + 1/6 is 1/2), so these
+# check the result rather than estimate it
+def _checked_result(value):
+    if _is_exact(value):
+        _check_digits(_log10_size(value))
+    return value
+
+
+def _checked_add(left, right):
+    return _checked_result(left + right)
+
+
+def _checked_sub(left, right):
+    return _checked_result(left - right)
+
+
+def _exact_div(left, right):
+    if right == 0:
+        raise ZeroDivisionError("division by zero")
+    if not (_is_exact(left) and _is_exact(right)):
+        return left / right
+    # int / int stays exact too, as an int when it divides evenly
+    quotient = Fraction(left) / Fraction(right)
+    return _checked_result(quotient.numerator if quotient.denominator == 1 else quotient)
+
+
+def _exact_backend():
+    # Numbers become Fractions; functions without an exact answer fall back
+    # to floats and the rest of the expression continues in floating point
+    return {
+        **_scalar_backend(),
+        'num': _to_fraction,
+        'add': _checked_add,
+        'sub': _checked_sub,
+        'div': _exact_div,
+        'sqrt': _exact_sqrt,
+    }
+
+
+@functools.lru_cache(maxsize=32)
+def _decimal_pi(precision):
+    # The series from the recipes in the decimal module documentation
+    with decimal.localcontext() as ctx:
+        ctx.prec = precision + 2
+        three = decimal.Decimal(3)
+        lasts, t, s, n, na, d, da = 0, three, 3, 1, 0, 0, 24
+        while s != lasts:
+            lasts = s
+            n, na = n + na, na + 8
+            d, da = d + da, da + 32
+            t = (t * n) / d
+            s += t
+        ctx.prec = precision
+        return +s
+
+
+def _decimal_trig(ctx, cosine):
+    def trig(x):
+        digits = ctx.prec + max(0, x.adjusted()) + 4
+        if digits > MAX_TRIG_DIGITS:
+            raise ExpressionError(f"Argument is too large for {'cos' if cosine else 'sin'} at "
+                                  f"{ctx.prec} digits (needs {digits:,} working digits, limit {MAX_TRIG_DIGITS:,})")
+        with decimal.localcontext(ctx) as local:
+            # Reduce into [-pi, pi] with enough digits to survive large x.
+            # pi is computed to a multiple of 100 digits, so nearby working
+            # precisions share one cached value.
+            local.prec = digits
+            x = x.remainder_near(2 * _decimal_pi(-(-digits // 100) * 100))
+            i, lasts, s, fact, num, sign = (0, 0, 1, 1, 1, 1) if cosine else (1, 0, x, 1, x, 1)
+            while s != lasts:
+                lasts = s
+                i += 2
+                fact *= i * (i - 1)
+                num *= x * x
+                sign *= -1
+                s += num / fact * sign
+        return ctx.plus(s)
+    return trig
+
+
+def _decimal_backend(precision=DEFAULT_PRECISION):
+    if not 1 <= precision <= MAX_PRECISION:
+        raise ExpressionError(f"Precision must be between 1 and {MAX_PRECISION}")
+    # Every operation rounds to `precision` digits, and the exponent range
+    # turns huge powers into an Overflow error instead of a giant number
+    ctx = decimal.Context(prec=precision, Emax=MAX_DIGITS, Emin=-MAX_DIGITS, traps=[
+        decimal.Overflow, decimal.DivisionByZero, decimal.InvalidOperation])
+    sin = _decimal_trig(ctx, cosine=False)
+    cos = _decimal_trig(ctx, cosine=True)
+
+    def number(value):
+        return ctx.create_decimal(value if isinstance(value, int) else repr(value))
+
+    def power(base, exponent):
+        if exponent == exponent.to_integral_value() and abs(exponent) > MAX_EXPONENT and abs(base) != 1:
+            raise ExpressionError(f"Exponent {exponent:,} is too large (limit {MAX_EXPONENT:,})")
+        return ctx.power(base, exponent)
+
+    def factorial(n):
+        if n != n.to_integral_value():
+            raise ValueError("factorial() only accepts integral values")
+        return ctx.create_decimal(_checked_factorial(int(n)))
+
+    def nthroot(value, n):
+        root = ctx.divide(1, n)
+        if value < 0 and n % 2 == 1:
+            return ctx.minus(ctx.power(ctx.minus(value), root))
+        return ctx.power(value, root)
+
+    def log(x, base=None):
+        if base is None:
+            return ctx.ln(x)
+        # A few guard digits, so log(8, 2) rounds to exactly 3
+        with decimal.localcontext(ctx) as local:
+            local.prec += 5
+            quotient = local.divide(local.ln(x), local.ln(base))
+        return ctx.plus(quotient)
+
+    return {
+        'num': number,
+        'neg': ctx.minus,
+        'add': ctx.add,
+        'sub': ctx.subtract,
+        'mul': ctx.multiply,
+        'div': ctx.divide,
+        'pow': power,
+        'sin': sin,
+        'cos': cos,
+        'tan': lambda x: ctx.divide(sin(x), cos(x)),
+        'exp': ctx.exp,
+        'sqrt': ctx.sqrt,
+        'log10': ctx.log10,
+        'log': log,
+        'ln': ctx.ln,
+        'abs': ctx.abs,
+        'factorial': factorial,
+        'nthroot': nthroot,
+        'pi': ctx.plus(_decimal_pi(precision)),
+        'e': ctx.exp(1),
+    }
+
+
+_BACKEND_FACTORIES = {
+    'scalar': _scalar_backend,
+    'vector': _vector_backend,
+    'decimal': _decimal_backend,
+    'exact': _exact_backend,
+}
+_backends = {}
+
+
+def get_backend(mode):
+    """Return the name -> implementation table for the given mode
+
+    A mode may carry an argument after a colon, such as 'decimal:50'.
+    """
+    backend = _backends.get(mode)
+    if backend is None:
+        name, _, argument = mode.partition(':')
+        try:
+            factory = _BACKEND_FACTORIES[name]
+        except KeyError:
+            raise ExpressionError(f"Unknown evaluation mode '{mode}'")
+        if argument:
+            try:
+                argument = int(argument)
+            except ValueError:
+                raise ExpressionError(f"Invalid argument in evaluation mode '{mode}'")
+            backend = factory(argument)
+        else:
+            backend = factory()
+        _backends[mode] = backend
+    return backend
+
+
+def _split_name(name, pos, known):
+    """Split a run of letters like 'xsin' or 'pix' into known names"""
+    tokens = []
+    i = 0
+    while i < len(name):
+        if name[i].isdigit():
+            j = i
+            while j < len(name) and name[j].isdigit():
+                j += 1
+            tokens.append(('number', name[i:j], pos + i))
+            i = j
+            continue
+        for j in range(len(name), i, -1):
+            if name[i:j] in known:
+                tokens.append(('name', name[i:j], pos + i))
+                i = j
+                break
+        else:
+            raise ExpressionError(f"Unknown name '{name}'")
+    return tokens
+
+
+_known_names = {}
+
+
+def _known(variables):
+    known = _known_names.get(variables)
+    if known is None:
+        known = _known_names[variables] = (
+            frozenset(FUNCTION_NAMES) | frozenset(CONSTANT_NAMES) | frozenset(variables))
+    return known
+
+
+def tokenize(text, variables=()):
+    """Split an expression into (kind, value, position) tokens"""
+    known = _known(variables)
+    tokens = []
+    append = tokens.append
+    for match in _TOKEN_RE.finditer(text):
+        group = match.lastindex
+        if group == 3:
+            append(('op', match.group(), match.start()))
+        elif group == 1:
+            append(('number', match.group(), match.start()))
+        elif group == 2:
+            name = match.group()
+            if name in known:
+                append(('name', name, match.start()))
+            else:
+                tokens.extend(_split_name(name, match.start(), known))
+        else:
+            raise ExpressionError(f"Unexpected character '{match.group()}' at position {match.start()}")
+    return tokens
+
+
+# Characters past the end of a token that tokenizing may read before ending
+# it: '2e+5' is one number, but '2e+x' is 2, e, + and x
+TOKEN_LOOKAHEAD = 3
+
+_GROUP_KINDS = (None, 'number', 'name', 'op')
+
+
+def token_groups(text, start=0):
+    """Tokenize keypad text from start, yielding (end, tokens) per match
+
+    A match is one token, or several for a run of letters like 'pie'.  The
+    tokens before end depend only on text[:end + TOKEN_LOOKAHEAD], so an
+    edit after that point can resume tokenizing at end.
+    """
+    known = _known(())
+    for match in _TOKEN_RE.finditer(text, start):
+        group = match.lastindex
+        if group == 4:
+            raise ExpressionError(f"Unexpected character '{match.group()}' at position {match.start()}")
+        if group == 2 and match.group() not in known:
+            yield match.end(), _split_name(match.group(), match.start(), known)
+        else:
+            yield match.end(), [(_GROUP_KINDS[group], match.group(), match.start())]
+
+
+# Binding power of infix operators.  Unary minus sits between '*' and '^' so
+# that -x^2 means -(x^2), and '^' is right associative.
+_INFIX = {
+    '+': (1, 'add'),
+    '-': (1, 'sub'),
+    '*': (2, 'mul'),
+    '/': (2, 'div'),
+    '^': (4, 'pow'),
+    '**': (4, 'pow'),
+}
+_UNARY_PRECEDENCE = 3
+_END = (None, None, None)
+
+
+class _Parser:
+    """Precedence climbing parser producing a tuple based AST
+
+    Nodes are ('num', value), ('const', name), ('var', name), ('neg', node),
+    (op, left, right) for op in add/sub/mul/div/pow and ('call', name, args).
+    """
+
+    def __init__(self, tokens, variables):
+        # The trailing sentinel saves a bounds check on every lookahead
+        self.tokens = tokens + [_END]
+        self.variables = variables
+        self.index = 0
+
+    def parse(self):
+        if len(self.tokens) == 1:
+            raise ExpressionError("Empty expression")
+        node = self.expression(0)
+        kind, value, pos = self.tokens[self.index]
+        if kind is not None:
+            raise ExpressionError(f"Unexpected '{value}' at position {pos}")
+        return node
+
+    def expression(self, min_precedence):
+        tokens = self.tokens
+        kind, value, pos = tokens[self.index]
+        if kind is None:
+            raise ExpressionError("Unexpected end of expression")
+        self.index += 1
+        if value == '-':
+            node = ('neg', self.expression(_UNARY_PRECEDENCE))
+        elif value == '+':
+            node = self.expression(_UNARY_PRECEDENCE)
+        else:
+            node = self.primary(kind, value, pos)
+        
+        while True:
+            kind, value, pos = tokens[self.index]
+            if value == '%':
+                # Postfix percent binds tightest: 50% -> 50/100
+                self.index += 1
+                node = ('div', node, ('num', 100))
+            elif kind == 'op' and value in _INFIX:
+                precedence, op = _INFIX[value]
+                if precedence < min_precedence:
+                    return node
+                self.index += 1
+                if op == 'pow':
+                    node = ('pow', node, self.expression(_UNARY_PRECEDENCE))
+                else:
+                    node = (op, node, self.expression(precedence + 1))
+            elif kind == 'number' or kind == 'name' or value == '(':
+                # Implicit multiplication: 2x, 2(x+1), (x+1)(x-1), x sin(x)
+                if min_precedence > 2:
+                    return node
+                node = ('mul', node, self.expression(_UNARY_PRECEDENCE))
+            else:
+                return node
+
+    def primary(self, kind, value, pos):
+        if kind == 'number':
+            if value.isdigit():
+                return ('num', int(value))
+            return ('num', float(value))
+        if kind == 'name':
+            if value in FUNCTION_NAMES:
+                if self.tokens[self.index][1] != '(':
+                    raise ExpressionError(f"Function '{value}' must be followed by '('")
+                self.index += 1
+                args = [self.expression(0)]
+                while self.tokens[self.index][1] == ',':
+                    self.index += 1
+                    args.append(self.expression(0))
+                self.expect(')')
+                _check_arguments(value, len(args))
+                return ('call', value, tuple(args))
+            if value in self.variables:
+                return ('var', value)
+            return ('const', value)
+        if value == '(':
+            node = self.expression(0)
+            self.expect(')')
+            return node
+        raise ExpressionError(f"Unexpected '{value}' at position {pos}")
+
+    def expect(self, value):
+        kind, found, pos = self.tokens[self.index]
+        self.index += 1
+        if found != value:
+            where = f"at position {pos}" if pos is not None else "at end of expression"
+            raise ExpressionError(f"Expected '{value}' {where}")
+
+
+def parse(text, variables=()):
+    """Parse an expression into an AST, allowing the given variable names"""
+    return _Parser(tokenize(text, variables), tuple(variables)).parse()
+
+
+_PERCENT = ('num', 100)
+
+
+class ParseState:
+    """The keypad parser frozen after some prefix of the tokens
+
+    This is the shift-reduce equivalent of _Parser, for text that changes a
+    few characters at a time.  Both stacks are immutable linked lists, so
+    feed() returns a new state and every earlier state stays valid: callers
+    keep one per token and resume from any of them after an edit.  Each
+    subtree is evaluated once, when it is reduced, so finish() only does the
+    reductions still pending.  Trees, values and errors are those of parse()
+    and compile_ast() on the whole text; expressions have no variables.
+
+    Operands are (node, value, error) entries.  Operators are ('op', kind,
+    precedence), and open parentheses are ('(',) or ('call', name, args).
+    """
+
+    __slots__ = ('backend', 'operands', 'operators', 'expect_operand', 'function', 'error', 'empty')
+
+    def __init__(self, backend, operands=None, operators=None, expect_operand=True, function=None,
+                 error=None, empty=True):
+        self.backend = backend
+        self.operands = operands
+        self.operators = operators
+        self.expect_operand = expect_operand
+        self.function = function
+        self.error = error
+        self.empty = empty
+
+    def _next(self, operands, operators, expect_operand, function=None):
+        return ParseState(self.backend, operands, operators, expect_operand, function, empty=False)
+
+    def _fail(self, message):
+        return ParseState(self.backend, error=ExpressionError(message), empty=False)
+
+    def feed(self, token):
+        """Return the state after one more (kind, value, position) token"""
+        if self.error is not None:
+            return self
+        kind, value, pos = token
+        operands, operators = self.operands, self.operators
+        if self.function is not None:
+            if value != '(':
+                return self._fail(f"Function '{self.function}' must be followed by '('")
+            return self._next(operands, (('call', self.function, ()), operators), True)
+
+        if self.expect_operand:
+            if kind == 'number':
+                node = ('num', int(value) if value.isdigit() else float(value))
+            elif kind == 'name':
+                if value in FUNCTION_NAMES:
+                    return self._next(operands, operators, True, function=value)
+                node = ('const', value)
+            elif value == '-':
+                return self._next(operands, (('op', 'neg', _UNARY_PRECEDENCE), operators), True)
+            elif value == '+':
+                return self._next(operands, operators, True)
+            elif value == '(':
+                return self._next(operands, (('(',), operators), True)
+            else:
+                return self._fail(f"Unexpected '{value}' at position {pos}")
+            return self._next((self._evaluate(node, ()), operands), operators, False)
+
+        if value == '%':
+            # Postfix percent binds tightest: 50% -> 50/100
+            entry, operands = operands
+            percent = self._evaluate(('div', entry[0], _PERCENT), (entry, self._evaluate(_PERCENT, ())))
+            return self._next((percent, operands), operators, False)
+        if kind == 'op' and value in _INFIX:
+            precedence, op = _INFIX[value]
+            # '^' is right associative, so an earlier '^' waits for this one
+            operands, operators = self._reduce(operands, operators, precedence + (op == 'pow'))
+            return self._next(operands, (('op', op, precedence), operators), True)
+        if kind == 'number' or kind == 'name' or value == '(':
+            # Implicit multiplication: 2pi, 2(1+3), (1+2)(3+4), 2 sin(1)
+            operands, operators = self._reduce(operands, operators, 2)
+            return self._next(operands, (('op', 'mul', 2), operators), True).feed(token)
+
+        # ')' or ',' closes everything back to the innermost open parenthesis
+        operands, operators = self._reduce(operands, operators, 0)
+        if operators is None:
+            return self._fail(f"Unexpected '{value}' at position {pos}")
+        opener, operators = operators
+        if opener[0] == '(':
+            if value == ',':
+                return self._fail(f"Expected ')' at position {pos}")
+            return self._next(operands, operators, False)
+        entry, operands = operands
+        args = opener[2] + (entry,)
+        if value == ',':
+            return self._next(operands, (('call', opener[1], args), operators), True)
+        try:
+            _check_arguments(opener[1], len(args))
+        except ExpressionError as e:
+            return self._fail(str(e))
+        node = ('call', opener[1], tuple(arg[0] for arg in args))
+        return self._next((self._evaluate(node, args), operands), operators, False)
+
+    def _reduce(self, operands, operators, min_precedence):
+        # Apply stacked operators that bind at least as tightly as min_precedence
+        while operators is not None:
+            top, rest = operators
+            if top[0] != 'op' or top[2] < min_precedence:
+                break
+            if top[1] == 'neg':
+                entry, operands = operands
+                entries = (entry,)
+            else:
+                right, (left, operands) = operands
+                entries = (left, right)
+            node = (top[1],) + tuple(entry[0] for entry in entries)
+            operands = (self._evaluate(node, entries), operands)
+            operators = rest
+        return operands, operators
+
+    def _evaluate(self, node, entries):
+        # Give node its (node, value, error) entry from those of its children.
+        # Errors are kept rather than raised: a parse error later in the text
+        # takes precedence, as it does when the whole text is compiled.
+        backend = self.backend
+        kind = node[0]
+        try:
+            if kind in ('num', 'const'):
+                return node, _compile(node, backend)[1], None
+            if kind == 'call':
+                func = backend.get(node[1])
+                if func is None:
+                    raise ExpressionError(f"Function '{node[1]}' is not supported here")
+            for entry in entries:
+                if entry[2] is not None:
+                    return node, None, entry[2]
+            if kind == 'call':
+                value = func(*[entry[1] for entry in entries])
+            elif kind == 'neg':
+                value = backend.get('neg', operator.neg)(entries[0][1])
+            else:
+                value = (backend.get(kind) or _OPERATORS[kind])(entries[0][1], entries[1][1])
+        except decimal.DecimalException as e:
+            return node, None, _decimal_error(e)
+        except Exception as e:
+            return node, None, e
+        return node, value, None
+
+    def finish(self):
+        """Return (tree, value) for the tokens so far
+
+        Raises what parsing and evaluating the text as a whole would.
+        """
+        if self.error is not None:
+            raise self.error.with_traceback(None)
+        if self.empty:
+            raise ExpressionError("Empty expression")
+        if self.function is not None:
+            raise ExpressionError(f"Function '{self.function}' must be followed by '('")
+        if self.expect_operand:
+            raise ExpressionError("Unexpected end of expression")
+        operands, operators = self._reduce(self.operands, self.operators, 0)
+        if operators is not None:
+            raise ExpressionError("Expected ')' at end of expression")
+        node, value, error = operands[0]
+        if error is not None:
+            raise error.with_traceback(None)
+        return node, value
+
+
+def substitute(node, mapping):
+    """Return a copy of the AST with variables renamed according to mapping"""
+    kind = node[0]
+    if kind == 'var':
+        return ('var', mapping.get(node[1], node[1]))
+    if kind in ('num', 'const'):
+        return node
+    if kind == 'neg':
+        return ('neg', substitute(node[1], mapping))
+    if kind == 'call':
+        return ('call', node[1], tuple(substitute(arg, mapping) for arg in node[2]))
+    return (kind, substitute(node[1], mapping), substitute(node[2], mapping))
+
+
+def variables_of(node):
+    """Return the set of variable names used by the AST"""
+    kind = node[0]
+    if kind == 'var':
+        return {node[1]}
+    if kind in ('num', 'const'):
+        return set()
+    if kind == 'neg':
+        return variables_of(node[1])
+    if kind == 'call':
+        names = set()
+        for arg in node[2]:
+            names |= variables_of(arg)
+        return names
+    return variables_of(node[1]) | variables_of(node[2])
+
+
+def fold_constants(node, backend):
+    """Return a copy of the AST with every variable-free subtree evaluated
+
+    Folded subtrees become ('num', value) nodes holding the backend's value,
+    so the result is only meant for evaluation in that backend.
+    """
+    kind = node[0]
+    if kind == 'var':
+        return node
+    if kind in ('num', 'const'):
+        return ('num', _compile(node, backend)[1])
+    if kind == 'neg':
+        children = (fold_constants(node[1], backend),)
+        folded = ('neg',) + children
+    elif kind == 'call':
+        children = tuple(fold_constants(arg, backend) for arg in node[2])
+        folded = ('call', node[1], children)
+    else:
+        children = (fold_constants(node[1], backend), fold_constants(node[2], backend))
+        folded = (kind,) + children
+    if all(child[0] == 'num' for child in children):
+        return ('num', _compile(folded, backend)[1])
+    return folded
+
+
+_SOURCE_OPS = {'add': '+', 'sub': '-', 'mul': '*', 'div': '/', 'pow': '^'}
+_PRECEDENCE = {'add': 1, 'sub': 1, 'mul': 2, 'div': 2, 'neg': 3, 'pow': 4}
+
+
+def to_source(node, parent=0):
+    """Render an AST back to canonical expression text"""
+    kind = node[0]
+    if kind == 'num':
+        return repr(node[1])
+    if kind in ('var', 'const'):
+        return node[1]
+    if kind == 'call':
+        return f"{node[1]}({', '.join(to_source(arg) for arg in node[2])})"
+    precedence = _PRECEDENCE[kind]
+    if kind == 'neg':
+        text = '-' + to_source(node[1], precedence)
+    elif kind == 'pow':
+        text = f"{to_source(node[1], precedence + 1)}^{to_source(node[2], precedence)}"
+    else:
+        # Left associative: the right operand needs parentheses at equal precedence
+        text = (f"{to_source(node[1], precedence)} {_SOURCE_OPS[kind]} "
+                f"{to_source(node[2], precedence + 1)}")
+    if precedence < parent:
+        return f"({text})"
+    return text
+
+
+_OPERATORS = {
+    'add': operator.add,
+    'sub': operator.sub,
+    'mul': operator.mul,
+    'div': operator.truediv,
+    'pow': operator.pow,
+}
+
+
+def _compile(node, backend):
+    """Return (True, value) for constant subtrees, else (False, closure)
+
+    A backend may override the arithmetic operators by kind ('add', 'neg',
+    ...) and convert number literals with a 'num' entry.
+    """
+    kind = node[0]
+    if kind == 'num':
+        number = backend.get('num')
+        return True, number(node[1]) if number else node[1]
+    if kind == 'const':
+        return True, backend[node[1]]
+    if kind == 'var':
+        name = node[1]
+        return False, lambda scope: scope[name]
+    if kind == 'neg':
+        negate = backend.get('neg', operator.neg)
+        constant, operand = _compile(node[1], backend)
+        if constant:
+            return True, negate(operand)
+        return False, lambda scope: negate(operand(scope))
+    if kind == 'call':
+        try:
+            func = backend[node[1]]
+        except KeyError:
+            raise ExpressionError(f"Function '{node[1]}' is not supported here")
+        compiled = [_compile(arg, backend) for arg in node[2]]
+        if all(constant for constant, _ in compiled):
+            return True, func(*[value for _, value in compiled])
+        args = [_constant_closure(value) if constant else value for constant, value in compiled]
+        if len(args) == 1:
+            arg = args[0]
+            return False, lambda scope: func(arg(scope))
+        return False, lambda scope: func(*[arg(scope) for arg in args])
+    op = backend.get(kind) or _OPERATORS[kind]
+    left_constant, left = _compile(node[1], backend)
+    right_constant, right = _compile(node[2], backend)
+    if left_constant and right_constant:
+        return True, op(left, right)
+    if left_constant:
+        return False, lambda scope: op(left, right(scope))
+    if right_constant:
+        return False, lambda scope: op(left(scope), right)
+    return False, lambda scope: op(left(scope), right(scope))
+
+
+def _constant_closure(value):
+    return lambda scope: value
+
+
+def compile_ast(node, backend):
+    """Turn an AST into a tree of closures taking a variable scope dict
+
+    Subtrees without variables are folded to their value at compile time.
+    """
+    constant, value = _compile(node, backend)
+    if constant:
+        return _constant_closure(value)
+    return value
+
+
+# Decimal signals carry no message of their own; report them like math does
+_DECIMAL_ERRORS = (
+    (decimal.DivisionByZero, ZeroDivisionError, "division by zero"),
+    (decimal.Overflow, OverflowError, "Result is too large"),
+    (decimal.InvalidOperation, ValueError, "math domain error"),
+)
+
+
+def _decimal_error(error):
+    for signal, exception, message in _DECIMAL_ERRORS:
+        if isinstance(error, signal):
+            return exception(message)
+    return ArithmeticError(type(error).__name__)
+
+
+class CompiledExpression:
+    """A parsed expression compiled into a reusable evaluator"""
+
+    def __init__(self, text, tree, mode):
+        self.text = text
+        self.tree = tree
+        self.mode = mode
+        self.variables = variables_of(tree)
+        try:
+            self._evaluate = compile_ast(tree, get_backend(mode))
+        except decimal.DecimalException as e:
+            raise _decimal_error(e) from None
+
+    def __call__(self, **scope):
+        if self.variables and not self.variables.issubset(scope):
+            missing = self.variables.difference(scope)
+            raise ExpressionError(f"Missing value for {', '.join(sorted(missing))}")
+        try:
+            return self._evaluate(scope)
+        except decimal.DecimalException as e:
+            raise _decimal_error(e) from None
+
+    def __repr__(self):
+        return f"CompiledExpression({to_source(self.tree)!r}, mode={self.mode!r})"
+
+
+def compile_expression(text, mode='scalar', variables=()):
+    """Parse and compile an expression for repeated evaluation"""
+    return CompiledExpression(text, parse(text, variables), mode)
+
+
+def compile_function(text, mode='vector'):
+    """Compile a plottable f(x), treating a lone 'y' as the variable"""
+    tree = parse(text, ('x', 'y'))
+    used = variables_of(tree)
+    if 'y' in used:
+        if 'x' in used:
+            raise ExpressionError("Functions may only use the variable 'x'")
+        tree = substitute(tree, {'y': 'x'})
+    return CompiledExpression(text, tree, mode)
+
+
+def normalize(text):
+    """Collapse whitespace so trivially different spellings share a cache entry"""
+    return ' '.join(text.split())
+
+
+class ExpressionCache:
+    """Bounded, thread-safe LRU cache of compiled expressions
+
+    Entries are keyed by the kind of compile, the evaluation mode, any
+    variables and the normalized expression text.  A maxsize of 0 disables
+    caching.
+    """
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def compile_expression(self, text, mode='scalar', variables=()):
+        text = normalize(text)
+        variables = tuple(variables)
+        return self._get(('expression', mode, variables, text),
+                         lambda: compile_expression(text, mode, variables))
+
+    def compile_function(self, text, mode='vector'):
+        text = normalize(text)
+        return self._get(('function', mode, text), lambda: compile_function(text, mode))
+
+    def _get(self, key, compile):
+        with self._lock:
+            compiled = self._entries.get(key)
+            if compiled is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return compiled
+            self.misses += 1
+        
+        # Compile outside the lock so a slow expression does not block others
+        compiled = compile()
+        
+        with self._lock:
+            if self.maxsize > 0:
+                self._entries[key] = compiled
+                self._entries.move_to_end(key)
+                self._evict()
+        return compiled
+
+    def _evict(self):
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def resize(self, maxsize):
+        """Change the capacity, evicting least recently used entries if needed"""
+        with self._lock:
+            self.maxsize = maxsize
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Return a snapshot of the cache counters"""
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
@@ -0,0 +1,144 @@
+"""Columnar periodic-table store with prebuilt indexes
+
+The element data is read once from data/elements.json into one array per
+field.  Lookups by symbol, atomic number, name prefix, category and numeric
+ranges go through indexes built at load time, so a query touches only the
+elements it returns, and records are assembled with just the fields a
+client asked for.
+"""
+import bisect
+import json
+import math
+import os
+from array import array
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'elements.json')
+
+# Column types: 'i' and 'd' columns are packed arrays, None means a tuple of str
+COLUMN_TYPES = {
+    'number': 'i', 'symbol': None, 'name': None, 'category': None, 'mass': 'd',
+    'electron': None, 'state': None, 'melting': 'd', 'boiling': 'd', 'row': 'i', 'col': 'i',
+}
+FIELDS = tuple(COLUMN_TYPES)
+
+# Fields that /elements/search can bound with <field>_min and <field>_max
+RANGE_FIELDS = ('number', 'mass', 'melting', 'boiling')
+
+
+class ElementTable:
+    """The periodic table as columns, indexed for the queries the page makes
+
+    Element positions are row indexes into every column, in atomic number
+    order.  Missing numeric values (an unknown boiling point, say) are NaN
+    in the columns, None in records, and never match a range.
+    """
+
+    def __init__(self, fields, rows):
+        rows = sorted(rows, key=lambda row: row[fields.index('number')])
+        self.columns = {}
+        for field, typecode in COLUMN_TYPES.items():
+            values = [row[fields.index(field)] for row in rows]
+            if typecode == 'd':
+                self.columns[field] = array('d', [math.nan if v is None else v for v in values])
+            elif typecode == 'i':
+                self.columns[field] = array('i', values)
+            else:
+                self.columns[field] = tuple(values)
+        self.size = len(rows)
+
+        self.by_symbol = {symbol.lower(): i for i, symbol in enumerate(self.columns['symbol'])}
+        self.by_number = {number: i for i, number in enumerate(self.columns['number'])}
+        self.by_category = {}
+        for i, category in enumerate(self.columns['category']):
+            self.by_category.setdefault(category, []).append(i)
+        # Names sorted for prefix search: a prefix is one contiguous slice
+        self._names = sorted((name.lower(), i) for i, name in enumerate(self.columns['name']))
+        self._name_keys = [name for name, _ in self._names]
+        # Each range field sorted by value, NaN left out
+        self._ranges = {}
+        for field in RANGE_FIELDS:
+            ordered = sorted((v, i) for i, v in enumerate(self.columns[field]) if not math.isnan(v))
+            self._ranges[field] = ([v for v, _ in ordered], [i for _, i in ordered])
+
+    @classmethod
+    def load(cls, path=DATA_PATH):
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data['fields'], data['rows'])
+
+    @property
+    def categories(self):
+        return sorted(self.by_category)
+
+    def name_prefix(self, prefix):
+        """Positions of the elements whose name starts with prefix"""
+        prefix = prefix.lower()
+        start = bisect.bisect_left(self._name_keys, prefix)
+        stop = bisect.bisect_left(self._name_keys, prefix + '\uffff')
+        return [i for _, i in self._names[start:stop]]
+
+    def in_range(self, field, low=-math.inf, high=math.inf):
+        """Positions of the elements with low <= field <= high"""
+        values, positions = self._ranges[field]
+        return positions[bisect.bisect_left(values, low):bisect.bisect_right(values, high)]
+
+    def search(self, symbol=None, name=None, number=None, category=None, ranges=None):
+        """Positions matching every given criterion, in atomic number order
+
+        ranges maps a field in RANGE_FIELDS to a (low, high) pair.
+        """
+        candidates = []
+        if symbol is not None:
+            i = self.by_symbol.get(symbol.lower())
+            candidates.append(() if i is None else (i,))
+        if number is not None:
+            i = self.by_number.get(number)
+            candidates.append(() if i is None else (i,))
+        if category is not None:
+            candidates.append(self.by_category.get(category, ()))
+        if name is not None:
+            candidates.append(self.name_prefix(name))
+        for field, (low, high) in (ranges or {}).items():
+            candidates.append(self.in_range(field, low, high))
+        if not candidates:
+            return list(range(self.size))
+        # Start from the smallest index and filter it by the others
+        candidates.sort(key=len)
+        matches = set(candidates[0])
+        for other in candidates[1:]:
+            matches.intersection_update(other)
+        return sorted(matches)
+
+    def records(self, positions, fields=FIELDS):
+        """Build {field: value} dicts for the given positions"""
+        columns = [(field, self.columns[field]) for field in fields]
+        records = []
+        for i in positions:
+            record = {}
+            for field, column in columns:
+                value = column[i]
+                record[field] = None if isinstance(value, float) and math.isnan(value) else value
+            records.append(record)
+        return records
+
+
+_table = None
+
+
+def table():
+    """The shared ElementTable, loaded on first use"""
+    global _table
+    if _table is None:
+        _table = ElementTable.load()
+    return _table
+
+
+def parse_fields(text):
+    """Turn a comma-separated field list into a tuple; empty means every field"""
+    if not text:
+        return FIELDS
+    fields = tuple(field.strip() for field in text.split(',') if field.strip())
+    unknown = [field for field in fields if field not in COLUMN_TYPES]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}. Choose from {', '.join(FIELDS)}")
+    return fields
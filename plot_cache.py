@@ -0,0 +1,144 @@
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+def make_key(*parts):
+    """Content-address a render: the same inputs always give the same key"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(repr(part).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class PlotCache:
+    """Memory- and size-bounded LRU cache of rendered plot output
+
+    Values are opaque bytes (PNG, SVG or encoded points).  Entries are
+    evicted once either max_entries or max_bytes is exceeded.  If spill_dir is
+    set, evicted entries are written there instead of being dropped, and
+    looked up again on a memory miss.  The directory is pruned (oldest first)
+    to stay under max_disk_bytes.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, max_entries=1024,
+                 spill_dir=None, max_disk_bytes=512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.spill_dir = spill_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    def get(self, key):
+        """Return the cached bytes for key, or None"""
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return data
+
+        data = self._read_spilled(key)
+        with self._lock:
+            if data is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+
+        # Promote back into memory
+        self.put(key, data)
+        return data
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._entries[key] = data
+            self._bytes += len(data)
+            evicted = []
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                old_key, old_data = self._entries.popitem(last=False)
+                self._bytes -= len(old_data)
+                self.evictions += 1
+                evicted.append((old_key, old_data))
+
+        # Disk writes happen outside the lock
+        for old_key, old_data in evicted:
+            self._spill(old_key, old_data)
+
+    def _path(self, key):
+        return os.path.join(self.spill_dir, key + '.bin')
+
+    def _read_spilled(self, key):
+        if not self.spill_dir:
+            return None
+        try:
+            with open(self._path(key), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _spill(self, key, data):
+        if not self.spill_dir:
+            return
+        try:
+            # Write to a temporary file first so readers never see partial output
+            fd, tmp_path = tempfile.mkstemp(dir=self.spill_dir, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(key))
+            self._prune_disk()
+        except OSError:
+            pass
+
+    def _prune_disk(self):
+        files = []
+        total = 0
+        for entry in os.scandir(self.spill_dir):
+            if entry.name.endswith('.bin'):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        files.sort()
+        for mtime, size, path in files:
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Return a snapshot of the cache counters"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
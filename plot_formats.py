@@ -0,0 +1,175 @@
+import base64
+import json
+import math
+from xml.sax.saxutils import escape
+
+import numpy as np
+
+from raster import AXES_BG, AXIS_COLOR, FIGURE_BG, GRID_COLOR, SERIES_COLORS, TEXT_COLOR
+from raster import encode_png, format_tick, heatmap_pixels, nice_ticks, series_limits
+
+
+def _hex(color):
+    return '#%02x%02x%02x' % color
+
+
+def series_color(index):
+    """CSS colour of the index-th curve on a shared figure"""
+    return _hex(SERIES_COLORS[index % len(SERIES_COLORS)])
+
+
+def _runs(valid):
+    """Yield (start, stop) index ranges of consecutive True values"""
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], valid.astype(np.int8), [0]))))
+    return zip(edges[::2], edges[1::2])
+
+
+def render_svg(x_values, y_values, title, width=800, height=600):
+    """Render a function plot as SVG text, with no rasterization at all"""
+    return render_svg_series([(x_values, y_values)], title, width=width, height=height)
+
+
+def render_svg_series(series, title, labels=None, width=800, height=600):
+    """Render several (x, y) curves on shared axes, with an optional legend"""
+    series = [(np.asarray(x, dtype=float), np.asarray(y, dtype=float)) for x, y in series]
+    clip = _clip(width, height)
+    top, bottom, left, right = clip
+    parts = _svg_open(width, height, clip)
+    to_px, to_py = _svg_axes(parts, clip, *series_limits(series))
+
+    # The curves, split wherever a point is not finite
+    for i, (x_values, y_values) in enumerate(series):
+        color = series_color(i)
+        px = to_px(x_values)
+        py = np.clip(to_py(y_values), top - 1000, bottom + 1000)
+        valid = np.isfinite(x_values) & np.isfinite(y_values)
+        for start, stop in _runs(valid):
+            coords = ' '.join(f'{x:.1f},{y:.1f}' for x, y in zip(px[start:stop], py[start:stop]))
+            parts.append(f'<polyline points="{coords}" fill="none" stroke="{color}" '
+                         f'stroke-width="3.5" stroke-linejoin="round" clip-path="url(#axes)"/>')
+
+    if labels:
+        for i, label in enumerate(labels):
+            color = series_color(i)
+            y = top + 18 + i * 18
+            parts.append(f'<line x1="{right - 170}" y1="{y - 4}" x2="{right - 150}" y2="{y - 4}" '
+                         f'stroke="{color}" stroke-width="3.5"/>')
+            parts.append(f'<text x="{right - 144}" y="{y}" font-size="12" '
+                         f'fill="{_hex(TEXT_COLOR)}">{escape(label)}</text>')
+
+    return _svg_close(parts, clip, width, height, title)
+
+
+def render_svg_heatmap(x_values, y_values, z, title, width=800, height=600):
+    """Render z = f(x, y) as a heatmap image with contour lines inside SVG axes"""
+    clip = _clip(width, height)
+    top, bottom, left, right = clip
+    parts = _svg_open(width, height, clip)
+    pixels = heatmap_pixels(z, right - left, bottom - top)
+    encoded = base64.b64encode(encode_png(pixels)).decode('ascii')
+    parts.append(f'<image x="{left}" y="{top}" width="{right - left}" height="{bottom - top}" '
+                 f'preserveAspectRatio="none" href="data:image/png;base64,{encoded}"/>')
+    x_lo, x_hi = float(x_values[0]), float(x_values[-1])
+    y_lo, y_hi = float(y_values[0]), float(y_values[-1])
+    _svg_axes(parts, clip, x_lo, x_hi if x_hi > x_lo else x_lo + 1.0,
+              y_lo, y_hi if y_hi > y_lo else y_lo + 1.0)
+    return _svg_close(parts, clip, width, height, title)
+
+
+def _clip(width, height):
+    """The (top, bottom, left, right) bounds of the axes, leaving room for a title"""
+    return 40, height - 50, 70, width - 20
+
+
+def _svg_open(width, height, clip):
+    top, bottom, left, right = clip
+    return [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+        f'viewBox="0 0 {width} {height}" font-family="sans-serif">',
+        f'<defs><clipPath id="axes"><rect x="{left}" y="{top}" width="{right - left}" '
+        f'height="{bottom - top}"/></clipPath></defs>',
+        f'<rect width="{width}" height="{height}" fill="{_hex(FIGURE_BG)}"/>',
+        f'<rect x="{left}" y="{top}" width="{right - left}" height="{bottom - top}" '
+        f'fill="{_hex(AXES_BG)}"/>',
+    ]
+
+
+def _svg_axes(parts, clip, x_lo, x_hi, y_lo, y_hi):
+    """Append the grid, ticks, axes and spines; return the data to pixel mappings"""
+    top, bottom, left, right = clip
+
+    def to_px(x):
+        return left + (x - x_lo) / (x_hi - x_lo) * (right - left)
+
+    def to_py(y):
+        return top + (y_hi - y) / (y_hi - y_lo) * (bottom - top)
+
+    # Dashed grid with tick labels
+    grid = f'stroke="{_hex(GRID_COLOR)}" stroke-dasharray="4 3"'
+    x_ticks, x_step = nice_ticks(x_lo, x_hi)
+    for tick in x_ticks:
+        px = to_px(tick)
+        parts.append(f'<line x1="{px:.1f}" y1="{top}" x2="{px:.1f}" y2="{bottom}" {grid}/>')
+        parts.append(f'<text x="{px:.1f}" y="{bottom + 20}" font-size="12" text-anchor="middle" '
+                     f'fill="{_hex(TEXT_COLOR)}">{format_tick(tick, x_step)}</text>')
+    y_ticks, y_step = nice_ticks(y_lo, y_hi)
+    for tick in y_ticks:
+        py = to_py(tick)
+        parts.append(f'<line x1="{left}" y1="{py:.1f}" x2="{right}" y2="{py:.1f}" {grid}/>')
+        parts.append(f'<text x="{left - 8}" y="{py + 4:.1f}" font-size="12" text-anchor="end" '
+                     f'fill="{_hex(TEXT_COLOR)}">{format_tick(tick, y_step)}</text>')
+
+    # Axes through the origin, then the left and bottom spines
+    axis = f'stroke="{_hex(AXIS_COLOR)}" stroke-opacity="0.5"'
+    if y_lo <= 0 <= y_hi:
+        parts.append(f'<line x1="{left}" y1="{to_py(0):.1f}" x2="{right}" y2="{to_py(0):.1f}" {axis}/>')
+    if x_lo <= 0 <= x_hi:
+        parts.append(f'<line x1="{to_px(0):.1f}" y1="{top}" x2="{to_px(0):.1f}" y2="{bottom}" {axis}/>')
+    parts.append(f'<polyline points="{left},{top} {left},{bottom} {right},{bottom}" fill="none" '
+                 f'stroke="{_hex(AXIS_COLOR)}"/>')
+    return to_px, to_py
+
+
+def _svg_close(parts, clip, width, height, title):
+    top, bottom, left, right = clip
+    parts.append(f'<text x="{(left + right) / 2}" y="{height - 12}" font-size="16" '
+                 f'text-anchor="middle" fill="{_hex(TEXT_COLOR)}">x</text>')
+    parts.append(f'<text x="20" y="{(top + bottom) / 2}" font-size="16" '
+                 f'fill="{_hex(TEXT_COLOR)}">y</text>')
+    parts.append(f'<text x="{(left + right) / 2}" y="26" font-size="18" font-weight="bold" '
+                 f'text-anchor="middle">{escape(title)}</text>')
+    parts.append('</svg>')
+    return '\n'.join(parts)
+
+
+def _format_number(value):
+    if math.isfinite(value):
+        return f'{value:.7g}'
+    return 'null'
+
+
+def encode_points(x_values, y_values):
+    """Encode samples as compact JSON, with null marking gaps in the curve"""
+    x_values = np.asarray(x_values, dtype=float)
+    y_values = np.asarray(y_values, dtype=float)
+    xs = ','.join(map(_format_number, x_values.tolist()))
+    ys = ','.join(map(_format_number, y_values.tolist()))
+    return f'{{"x":[{xs}],"y":[{ys}]}}'
+
+
+def encode_overlays(x_values, y_values, overlays):
+    """encode_points() plus an "overlays" array of {"label", "y"} sharing its x"""
+    parts = []
+    for label, values in overlays:
+        ys = ','.join(map(_format_number, np.asarray(values, dtype=float).tolist()))
+        parts.append(f'{{"label":{json.dumps(label)},"y":[{ys}]}}')
+    return encode_points(x_values, y_values)[:-1] + ',"overlays":[' + ','.join(parts) + ']}'
+
+
+def encode_grid(x_values, y_values, z):
+    """Encode a sampled surface as JSON: z[i][j] is the value at (x[j], y[i])"""
+    xs = ','.join(map(_format_number, np.asarray(x_values, dtype=float).tolist()))
+    ys = ','.join(map(_format_number, np.asarray(y_values, dtype=float).tolist()))
+    rows = ','.join('[' + ','.join(map(_format_number, row)) + ']'
+                    for row in np.asarray(z, dtype=float).tolist())
+    return f'{{"x":[{xs}],"y":[{ys}],"z":[{rows}]}}'
@@ -0,0 +1,160 @@
+"""Live previews of keypad input that re-parse only what changed
+
+The page asks for a preview as the user types, sending the whole text each
+time.  A session keeps the ParseState after every token of the text it saw
+last; the next text resumes from the last state before the first changed
+character, so typing or deleting at the end of a long expression parses and
+evaluates a token or two instead of the whole thing.
+
+    sessions = PreviewSessions()
+    sessions.preview('tab-1', '2^10 + 1', 'scalar')    # 1025
+    sessions.preview('tab-1', '2^10 + 12', 'scalar')   # resumes after '+'
+"""
+import bisect
+import threading
+import time
+from collections import OrderedDict
+
+from expression import TOKEN_LOOKAHEAD, ParseState, get_backend, token_groups
+
+# Longest text a session previews.  Every operation of a preview is cheap,
+# but their number grows with the text.
+DEFAULT_MAX_LENGTH = 500
+
+
+def common_prefix_length(a, b):
+    """Length of the longest common prefix of two strings"""
+    if b.startswith(a):
+        return len(a)
+    if a.startswith(b):
+        return len(b)
+    # Binary search on slice comparisons, which run in C
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[:middle] == b[:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+class PreviewSession:
+    """One client's last text, with the parser state after each of its tokens
+
+    ends[i] is where the i-th token match ends and states[i] the state after
+    it; ends[0] = 0 holds the initial state.  Texts longer than max_length
+    are refused, which also bounds the states kept to max_length + 1.
+    """
+
+    def __init__(self, mode, max_length=DEFAULT_MAX_LENGTH):
+        self.mode = mode
+        self.max_length = max_length
+        self.text = ''
+        self.ends = [0]
+        self.states = [ParseState(get_backend(mode))]
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+        self.reused = 0
+        self.parsed = 0
+
+    def update(self, text):
+        """Return the value of text, or raise what evaluating it in full would
+
+        reused and parsed count the token matches taken from the previous
+        text and the ones parsed this time.
+        """
+        if len(text) > self.max_length:
+            raise ValueError(f"Preview is limited to {self.max_length} characters")
+        # Keep the states whose tokens cannot have read a changed character
+        unchanged = common_prefix_length(self.text, text) - TOKEN_LOOKAHEAD
+        keep = max(1, bisect.bisect_right(self.ends, unchanged))
+        del self.ends[keep:]
+        del self.states[keep:]
+        self.text = text
+        self.reused = keep - 1
+        self.parsed = 0
+        state = self.states[-1]
+        # A bad character raises here; the states before it stay good
+        for end, tokens in token_groups(text, self.ends[-1]):
+            for token in tokens:
+                state = state.feed(token)
+            self.ends.append(end)
+            self.states.append(state)
+            self.parsed += 1
+        return state.finish()[1]
+
+
+class PreviewSessions:
+    """Bounded, thread-safe LRU of PreviewSession by client-chosen id
+
+    Sessions idle for more than max_age seconds are dropped as well.  A
+    client whose session was dropped just starts over with a full parse.
+    """
+
+    def __init__(self, maxsize=1024, max_age=600, max_length=DEFAULT_MAX_LENGTH):
+        self.maxsize = maxsize
+        self.max_age = max_age
+        self.max_length = max_length
+        self.updates = 0
+        self.tokens_reused = 0
+        self.tokens_parsed = 0
+        self.evictions = 0
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def preview(self, session_id, text, mode):
+        """Evaluate text in the expression engine mode, reusing the session's last parse"""
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None or session.mode != mode or session.max_length != self.max_length:
+                session = self._sessions[session_id] = PreviewSession(mode, self.max_length)
+            self._sessions.move_to_end(session_id)
+            session.last_used = now
+            self._evict(now)
+
+        # Requests of one session take turns; other sessions are not held up
+        with session.lock:
+            try:
+                return session.update(text)
+            finally:
+                with self._lock:
+                    self.updates += 1
+                    self.tokens_reused += session.reused
+                    self.tokens_parsed += session.parsed
+
+    def _evict(self, now):
+        while self._sessions:
+            session_id, oldest = next(iter(self._sessions.items()))
+            if len(self._sessions) <= self.maxsize and now - oldest.last_used <= self.max_age:
+                break
+            del self._sessions[session_id]
+            self.evictions += 1
+
+    def configure(self, maxsize=None, max_age=None, max_length=None):
+        """Change the limits, dropping sessions beyond them"""
+        with self._lock:
+            if maxsize is not None:
+                self.maxsize = maxsize
+            if max_age is not None:
+                self.max_age = max_age
+            if max_length is not None:
+                self.max_length = max_length
+            self._evict(time.monotonic())
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+
+    def stats(self):
+        """Return a snapshot of the session counters"""
+        with self._lock:
+            return {
+                'sessions': len(self._sessions),
+                'maxsize': self.maxsize,
+                'updates': self.updates,
+                'tokens_reused': self.tokens_reused,
+                'tokens_parsed': self.tokens_parsed,
+                'evictions': self.evictions,
+            }
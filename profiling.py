@@ -0,0 +1,193 @@
+"""Capture cProfile data for slow or sampled requests and keep the latest few
+
+Each capture is stored as a .pstats file (load it with pstats or snakeviz)
+and a .collapsed file of folded stacks for flamegraph.pl or speedscope,
+next to an index.json describing the request it came from.
+"""
+import contextvars
+import cProfile
+import json
+import os
+import pstats
+import threading
+import time
+import uuid
+
+_current = contextvars.ContextVar('profile_capture', default=None)
+
+
+class _Snapshot:
+    # pstats.Stats.add() accepts anything with create_stats() and a stats dict
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+def profiled(func, *args, **kwargs):
+    """Run func under cProfile and return (result, raw stats)
+
+    Meant to run in a worker process; pass the raw stats to
+    ProfileCapture.add() in the process that is capturing the request.
+    """
+    profile = cProfile.Profile()
+    result = profile.runcall(func, *args, **kwargs)
+    profile.create_stats()
+    return result, profile.stats
+
+
+class ProfileCapture:
+    """A profiler running for the current request, plus stats gathered elsewhere"""
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+        self.extra = []
+        self.started = None
+        self.elapsed = None
+        self._token = None
+
+    def begin(self):
+        """Start profiling the current thread and make this the current capture"""
+        self.started = time.perf_counter()
+        self._token = _current.set(self)
+        self.profile.enable()
+        return self
+
+    def __enter__(self):
+        return self.begin()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def stop(self):
+        if self.elapsed is None:
+            self.profile.disable()
+            self.elapsed = time.perf_counter() - self.started
+            _current.reset(self._token)
+        return self.elapsed
+
+    def add(self, stats):
+        """Merge raw stats from profiled(), e.g. a job run in a worker process"""
+        self.extra.append(stats)
+
+    def stats(self):
+        combined = pstats.Stats(self.profile)
+        for stats in self.extra:
+            combined.add(_Snapshot(stats))
+        return combined
+
+
+def current():
+    """Return the capture for the request being handled, if it is being profiled"""
+    return _current.get()
+
+
+def _frame_label(func):
+    filename, lineno, name = func
+    if filename == '~':
+        return name
+    return f'{os.path.basename(filename)}:{lineno}({name})'
+
+
+def collapsed_stacks(stats, min_share=0.001, max_depth=100):
+    """Approximate folded stacks ('outer;inner 1234', in microseconds)
+
+    cProfile records caller -> callee edges, not whole stacks, so time is
+    pushed down from the root functions in proportion to how much of each
+    callee's time was spent on behalf of that caller.  Paths carrying less
+    than min_share of the total are dropped.
+    """
+    raw = stats.stats
+    callees = {}
+    for func, (cc, nc, tt, ct, callers) in raw.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, []).append((func, edge[3]))
+
+    roots = [func for func, value in raw.items() if not set(value[4]) - {func}]
+    total = sum(raw[func][3] for func in roots)
+    cutoff = total * min_share
+    folded = {}
+
+    def walk(func, stack, weight):
+        if weight <= cutoff or len(stack) >= max_depth:
+            return
+        cc, nc, tt, ct, callers = raw[func]
+        stack = stack + [_frame_label(func)]
+        if ct > 0:
+            key = ';'.join(stack)
+            folded[key] = folded.get(key, 0.0) + weight * tt / ct
+        for callee, edge_time in callees.get(func, ()):
+            if callee == func or _frame_label(callee) in stack:
+                continue
+            callee_time = raw[callee][3]
+            if ct > 0 and callee_time > 0:
+                walk(callee, stack, weight * edge_time / ct)
+
+    for root in roots:
+        walk(root, [], raw[root][3])
+    lines = [f'{key} {round(seconds * 1e6)}' for key, seconds in sorted(folded.items())
+             if round(seconds * 1e6) > 0]
+    return '\n'.join(lines) + '\n' if lines else ''
+
+
+class ProfileStore:
+    """A directory holding the most recent `max_entries` captures and their index"""
+
+    KINDS = {'pstats': '.pstats', 'collapsed': '.collapsed'}
+
+    def __init__(self, directory, max_entries=50):
+        self.directory = directory
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._index_path = os.path.join(directory, 'index.json')
+        os.makedirs(directory, exist_ok=True)
+        try:
+            with open(self._index_path) as f:
+                self._entries = json.load(f)
+        except (OSError, ValueError):
+            self._entries = []
+
+    def save(self, capture, metadata):
+        """Write a finished capture to disk and return its index entry"""
+        profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        stats = capture.stats()
+        stats.dump_stats(self.path(profile_id, 'pstats'))
+        with open(self.path(profile_id, 'collapsed'), 'w') as f:
+            f.write(collapsed_stacks(stats))
+
+        entry = {'id': profile_id, 'time': time.time(), 'seconds': capture.elapsed, **metadata}
+        with self._lock:
+            self._entries.append(entry)
+            expired = self._entries[:-self.max_entries] if self.max_entries > 0 else list(self._entries)
+            self._entries = self._entries[len(expired):]
+            self._write_index()
+        for old in expired:
+            for kind in self.KINDS:
+                try:
+                    os.remove(self.path(old['id'], kind))
+                except OSError:
+                    pass
+        return entry
+
+    def _write_index(self):
+        # Write then rename, so a crash never leaves a half-written index
+        temp_path = self._index_path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(self._entries, f)
+        os.replace(temp_path, self._index_path)
+
+    def path(self, profile_id, kind):
+        return os.path.join(self.directory, profile_id + self.KINDS[kind])
+
+    def entries(self):
+        """Index entries, newest first"""
+        with self._lock:
+            return list(reversed(self._entries))
+
+    def get(self, profile_id):
+        with self._lock:
+            for entry in self._entries:
+                if entry['id'] == profile_id:
+                    return entry
+        return None
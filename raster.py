@@ -0,0 +1,352 @@
+import functools
+import math
+import struct
+import zlib
+
+import numpy as np
+
+# Colours mirror the matplotlib styling used by web_calculator.render_png
+FIGURE_BG = (0xf5, 0xf5, 0xf5)
+AXES_BG = (0xf9, 0xf9, 0xf9)
+GRID_COLOR = (0xd6, 0xd6, 0xd6)
+AXIS_COLOR = (0x61, 0x61, 0x61)
+LINE_COLOR = (0x21, 0x96, 0xf3)
+TEXT_COLOR = (0x55, 0x55, 0x55)
+
+# Line colours for figures with several functions, the first being LINE_COLOR
+SERIES_COLORS = (
+    LINE_COLOR,
+    (0xf4, 0x43, 0x36),
+    (0x4c, 0xaf, 0x50),
+    (0xff, 0x98, 0x00),
+    (0x9c, 0x27, 0xb0),
+    (0x00, 0xbc, 0xd4),
+)
+
+# Heatmap colours from the lowest to the highest value, a coarse viridis
+HEATMAP_COLORS = np.array([
+    (0x44, 0x01, 0x54),
+    (0x3b, 0x52, 0x8b),
+    (0x21, 0x90, 0x8d),
+    (0x5d, 0xc8, 0x63),
+    (0xfd, 0xe7, 0x25),
+], dtype=float)
+
+# 3x5 bitmap glyphs for tick and axis labels
+_GLYPHS = {
+    '0': ('111', '101', '101', '101', '111'),
+    '1': ('010', '110', '010', '010', '111'),
+    '2': ('111', '001', '111', '100', '111'),
+    '3': ('111', '001', '111', '001', '111'),
+    '4': ('101', '101', '111', '001', '001'),
+    '5': ('111', '100', '111', '001', '111'),
+    '6': ('111', '100', '111', '101', '111'),
+    '7': ('111', '001', '001', '001', '001'),
+    '8': ('111', '101', '111', '101', '111'),
+    '9': ('111', '101', '111', '001', '111'),
+    '-': ('000', '000', '111', '000', '000'),
+    '+': ('000', '010', '111', '010', '000'),
+    '.': ('000', '000', '000', '000', '010'),
+    'e': ('000', '111', '111', '100', '111'),
+    'x': ('000', '101', '010', '101', '000'),
+    'y': ('101', '101', '111', '001', '111'),
+    ' ': ('000', '000', '000', '000', '000'),
+}
+_GLYPH_MASKS = {
+    char: np.array([[bit == '1' for bit in row] for row in rows])
+    for char, rows in _GLYPHS.items()
+}
+
+
+def nice_ticks(lo, hi, target=8):
+    """Return tick positions on a 1-2-5 step inside [lo, hi], and the step"""
+    span = hi - lo
+    raw = span / target
+    magnitude = 10 ** math.floor(math.log10(raw))
+    for multiple in (1, 2, 5, 10):
+        step = multiple * magnitude
+        if raw <= step:
+            break
+    start = math.ceil(lo / step) * step
+    ticks = np.arange(start, hi + step * 1e-9, step)
+    return ticks, step
+
+
+def format_tick(value, step):
+    decimals = max(0, -math.floor(math.log10(step)))
+    if abs(value) >= 1e6 or (value != 0 and abs(value) < 1e-4):
+        return f"{value:.1e}"
+    text = f"{value:.{decimals}f}"
+    return '0' if text in ('-0', '-0.0') or float(text) == 0 else text
+
+
+def data_limits(y_values):
+    """Pick y limits with a 5% margin, like matplotlib's autoscaling"""
+    finite = y_values[np.isfinite(y_values)]
+    if finite.size == 0:
+        return -1.0, 1.0
+    y_lo = float(finite.min())
+    y_hi = float(finite.max())
+    if y_hi - y_lo < 1e-12 * max(1.0, abs(y_hi)):
+        return y_lo - 1.0, y_hi + 1.0
+    margin = (y_hi - y_lo) * 0.05
+    return y_lo - margin, y_hi + margin
+
+
+def _blend(image, rows, cols, color, alpha):
+    if alpha >= 1.0:
+        image[rows, cols] = color
+        return
+    pixels = image[rows, cols].astype(np.float32)
+    blended = pixels * (1.0 - alpha) + np.asarray(color, dtype=np.float32) * alpha + 0.5
+    image[rows, cols] = blended.astype(np.uint8)
+
+
+def _dashed(length, on=4, off=3):
+    return (np.arange(length) % (on + off)) < on
+
+
+def _draw_text(image, x, y, text, scale=2, color=TEXT_COLOR, align='left'):
+    """Draw text with its top-left (or top-right) corner at x, y"""
+    width = len(text) * 4 * scale - scale
+    if align == 'right':
+        x -= width
+    elif align == 'center':
+        x -= width // 2
+    height, image_width = image.shape[:2]
+    for i, char in enumerate(text):
+        glyph = _GLYPH_MASKS.get(char)
+        if glyph is None:
+            continue
+        rows, cols = np.nonzero(np.kron(glyph, np.ones((scale, scale), dtype=bool)))
+        rows = rows + y
+        cols = cols + x + i * 4 * scale
+        keep = (rows >= 0) & (rows < height) & (cols >= 0) & (cols < image_width)
+        _blend(image, rows[keep], cols[keep], color, 1.0)
+
+
+def _stroke_pixels(px, py, clip):
+    """Rasterize a polyline into unique (row, col) centre pixels
+
+    Points that are not finite break the line, so asymptotes and domain
+    gaps are not joined.
+    """
+    top, bottom, left, right = clip
+    valid = np.isfinite(px) & np.isfinite(py)
+    # Keep far-away points from generating huge segments
+    py = np.clip(py, top - 10, bottom + 10)
+
+    connected = valid[:-1] & valid[1:]
+    x0 = px[:-1][connected]
+    y0 = py[:-1][connected]
+    dx = px[1:][connected] - x0
+    dy = py[1:][connected] - y0
+    steps = np.ceil(np.hypot(dx, dy) * 2).astype(np.int64) + 1
+    owner = np.repeat(np.arange(steps.size), steps)
+    offsets = np.arange(owner.size) - np.repeat(np.cumsum(steps) - steps, steps)
+    t = offsets / np.repeat(np.maximum(steps - 1, 1), steps)
+    xs = np.concatenate([x0[owner] + dx[owner] * t, px[valid]])
+    ys = np.concatenate([y0[owner] + dy[owner] * t, py[valid]])
+
+    cols = np.rint(xs).astype(np.int64)
+    rows = np.rint(ys).astype(np.int64)
+    inside = (rows >= top) & (rows <= bottom) & (cols >= left) & (cols <= right)
+    width = right + 1
+    flat = np.unique(rows[inside] * width + cols[inside])
+    return flat // width, flat % width
+
+
+def _disc(radius):
+    span = int(math.ceil(radius))
+    return [(dy, dx) for dy in range(-span, span + 1) for dx in range(-span, span + 1)
+            if dy * dy + dx * dx <= radius * radius]
+
+
+def _stamp(shape, rows, cols, radius, clip):
+    top, bottom, left, right = clip
+    mask = np.zeros(shape, dtype=bool)
+    for dy, dx in _disc(radius):
+        r = np.clip(rows + dy, top, bottom)
+        c = np.clip(cols + dx, left, right)
+        mask[r, c] = True
+    return mask
+
+
+@functools.lru_cache(maxsize=8)
+def _background(width, height, clip):
+    """Blank figure with the axes area filled in; copied for every render"""
+    top, bottom, left, right = clip
+    image = np.empty((height, width, 3), dtype=np.uint8)
+    image[:] = FIGURE_BG
+    image[top:bottom + 1, left:right + 1] = AXES_BG
+    image.flags.writeable = False
+    return image
+
+
+def encode_png(image):
+    """Encode an (H, W, 3) uint8 array as a PNG using only zlib"""
+    height, width = image.shape[:2]
+    rows = image.reshape(height, width * 3)
+    # 'Up' filter on every row: flat backgrounds compress to almost nothing,
+    # even at the fastest zlib level
+    filtered = np.empty((height, width * 3 + 1), dtype=np.uint8)
+    filtered[:, 0] = 2
+    filtered[0, 1:] = rows[0]
+    filtered[1:, 1:] = rows[1:] - rows[:-1]
+
+    def chunk(tag, data):
+        return (struct.pack('>I', len(data)) + tag + data
+                + struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff))
+
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n'
+            + chunk(b'IHDR', header)
+            + chunk(b'IDAT', zlib.compress(filtered.tobytes(), 1))
+            + chunk(b'IEND', b''))
+
+
+def series_limits(series):
+    """Return the x range and padded y limits covering every (x, y) series"""
+    x_all = np.concatenate([np.asarray(x, dtype=float) for x, y in series])
+    x_finite = x_all[np.isfinite(x_all)]
+    if x_finite.size == 0:
+        x_lo, x_hi = -1.0, 1.0
+    else:
+        # Parametric and polar curves do not run left to right
+        x_lo, x_hi = float(x_finite.min()), float(x_finite.max())
+    if x_hi <= x_lo:
+        x_hi = x_lo + 1.0
+    y_lo, y_hi = data_limits(np.concatenate([np.asarray(y, dtype=float) for x, y in series]))
+    return x_lo, x_hi, y_lo, y_hi
+
+
+def render_png(x_values, y_values, width=800, height=600):
+    """Draw a function plot straight into a pixel buffer and encode it
+
+    This skips matplotlib entirely: no Figure, text layout or tight bbox.
+    """
+    return render_series([(x_values, y_values)], width, height)
+
+
+def render_series(series, width=800, height=600):
+    """Draw several (x, y) curves onto one set of axes and encode it as PNG
+
+    Curves take their colours from SERIES_COLORS in order.
+    """
+    clip = _clip(width, height)
+    image = _background(width, height, clip).copy()
+    to_px, to_py = _draw_axes(image, clip, *series_limits(series))
+
+    # The curves: a solid core plus a faint halo as cheap anti-aliasing
+    pixels = image.reshape(-1, 3)
+    for i, (x_values, y_values) in enumerate(series):
+        color = SERIES_COLORS[i % len(SERIES_COLORS)]
+        line_rows, line_cols = _stroke_pixels(to_px(x_values), to_py(y_values), clip)
+        if line_rows.size:
+            halo = _stamp(image.shape[:2], line_rows, line_cols, 2.4, clip)
+            core = _stamp(image.shape[:2], line_rows, line_cols, 1.6, clip)
+            # Flat indices are much cheaper than 2-D boolean masks on an RGB image
+            _blend(pixels, np.flatnonzero(halo & ~core), slice(None), color, 0.35)
+            _blend(pixels, np.flatnonzero(core), slice(None), color, 1.0)
+
+    return encode_png(image)
+
+
+def _clip(width, height):
+    """The (top, bottom, left, right) pixel bounds of the axes area"""
+    return 20, height - 50, 70, width - 20
+
+
+def _draw_axes(image, clip, x_lo, x_hi, y_lo, y_hi):
+    """Draw the grid, ticks, axes and spines; return the data to pixel mappings"""
+    top, bottom, left, right = clip
+    height = image.shape[0]
+
+    def to_px(x):
+        return left + (np.asarray(x, dtype=float) - x_lo) / (x_hi - x_lo) * (right - left)
+
+    def to_py(y):
+        return top + (y_hi - np.asarray(y, dtype=float)) / (y_hi - y_lo) * (bottom - top)
+
+    # Dashed grid with tick labels
+    x_ticks, x_step = nice_ticks(x_lo, x_hi)
+    rows = np.arange(top, bottom + 1)[_dashed(bottom - top + 1)]
+    for tick in x_ticks:
+        col = int(round(float(to_px(tick))))
+        _blend(image, rows, np.full(rows.size, col), GRID_COLOR, 0.7)
+        _draw_text(image, col, bottom + 8, format_tick(tick, x_step), align='center')
+
+    y_ticks, y_step = nice_ticks(y_lo, y_hi)
+    cols = np.arange(left, right + 1)[_dashed(right - left + 1)]
+    for tick in y_ticks:
+        row = int(round(float(to_py(tick))))
+        _blend(image, np.full(cols.size, row), cols, GRID_COLOR, 0.7)
+        _draw_text(image, left - 8, row - 5, format_tick(tick, y_step), align='right')
+
+    # Axes through the origin
+    if y_lo <= 0 <= y_hi:
+        row = int(round(float(to_py(0))))
+        _blend(image, row, slice(left, right + 1), AXIS_COLOR, 0.5)
+    if x_lo <= 0 <= x_hi:
+        col = int(round(float(to_px(0))))
+        _blend(image, slice(top, bottom + 1), col, AXIS_COLOR, 0.5)
+
+    # Left and bottom spines, like the matplotlib version with top/right hidden
+    _blend(image, slice(top, bottom + 1), left, AXIS_COLOR, 0.8)
+    _blend(image, bottom, slice(left, right + 1), AXIS_COLOR, 0.8)
+
+    _draw_text(image, (left + right) // 2, height - 22, 'x', scale=3, align='center')
+    _draw_text(image, 8, (top + bottom) // 2 - 7, 'y', scale=3)
+    return to_px, to_py
+
+
+def heatmap_pixels(z, width, height, levels=10):
+    """Colour a grid of values (row 0 at the bottom) as a width x height image
+
+    Values map onto HEATMAP_COLORS from their minimum to their maximum, NaN
+    shows the axes background, and a light line is drawn wherever the value
+    crosses one of `levels` evenly spaced contour levels.
+    """
+    z = np.asarray(z, dtype=float)
+    # Nearest grid cell for every pixel, flipped so larger y is higher up
+    rows = np.minimum((np.arange(height)[::-1] + 0.5) * z.shape[0] // height, z.shape[0] - 1).astype(np.int64)
+    cols = np.minimum((np.arange(width) + 0.5) * z.shape[1] // width, z.shape[1] - 1).astype(np.int64)
+    values = z[rows[:, None], cols[None, :]]
+
+    image = np.empty((height, width, 3), dtype=np.uint8)
+    image[:] = AXES_BG
+    finite = np.isfinite(values)
+    if not finite.any():
+        return image
+    lo = float(values[finite].min())
+    hi = float(values[finite].max())
+    scaled = np.zeros(values.shape)
+    if hi > lo:
+        scaled[finite] = (values[finite] - lo) / (hi - lo)
+
+    anchors = np.arange(len(HEATMAP_COLORS))
+    positions = scaled[finite] * (len(HEATMAP_COLORS) - 1)
+    for channel in range(3):
+        image[..., channel][finite] = np.interp(positions, anchors, HEATMAP_COLORS[:, channel]) + 0.5
+
+    if hi > lo and levels > 1:
+        band = np.where(finite, np.minimum(scaled * levels, levels - 1).astype(np.int64), -1)
+        edge = np.zeros(band.shape, dtype=bool)
+        edge[:, 1:] |= band[:, 1:] != band[:, :-1]
+        edge[1:, :] |= band[1:, :] != band[:-1, :]
+        edge &= finite
+        _blend(image, edge, slice(None), (0xff, 0xff, 0xff), 0.6)
+    return image
+
+
+def render_heatmap(x_values, y_values, z, width=800, height=600):
+    """Draw z = f(x, y), sampled on the x_values by y_values grid, as a heatmap PNG"""
+    clip = _clip(width, height)
+    top, bottom, left, right = clip
+    image = _background(width, height, clip).copy()
+    image[top:bottom + 1, left:right + 1] = heatmap_pixels(z, right - left + 1, bottom - top + 1)
+    x_lo, x_hi = float(x_values[0]), float(x_values[-1])
+    y_lo, y_hi = float(y_values[0]), float(y_values[-1])
+    _draw_axes(image, clip, x_lo, x_hi if x_hi > x_lo else x_lo + 1.0,
+               y_lo, y_hi if y_hi > y_lo else y_lo + 1.0)
+    return encode_png(image)
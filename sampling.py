@@ -0,0 +1,212 @@
+import numpy as np
+
+
+def uniform_sample(f, x_min, x_max, samples=1000):
+    """Evaluate f on a fixed, evenly spaced grid"""
+    x_values = np.linspace(x_min, x_max, samples)
+    return x_values, _evaluate(f, x_values)
+
+
+def _evaluate(f, x_values):
+    with np.errstate(all='ignore'):
+        y_values = _owned(f(x_values), x_values.shape, (x_values,))
+    # Infinities would be joined to their neighbours; NaN breaks the line instead
+    y_values[~np.isfinite(y_values)] = np.nan
+    return y_values
+
+
+def _owned(values, shape, inputs):
+    """values as a float array of the given shape that is safe to modify
+
+    A fresh full-size result is used as it is.  Scalars, broadcasts and the
+    inputs themselves are copied.  Complex values, such as a folded
+    (-8)^(1/3), are undefined on a real plot and become NaN.
+    """
+    if (isinstance(values, np.ndarray) and values.shape == shape and values.dtype == np.float64
+            and values.base is None and values.flags.writeable
+            and not any(values is array for array in inputs)):
+        return values
+    if np.iscomplexobj(values):
+        values = np.where(np.imag(values) == 0, np.real(values), np.nan)
+    return np.broadcast_to(values, shape).astype(float)
+
+
+def _pixel_scale(y_values, pixel_height):
+    finite = y_values[np.isfinite(y_values)]
+    if finite.size < 2:
+        return 0.0
+    span = float(finite.max() - finite.min())
+    if span <= 0:
+        return 0.0
+    return pixel_height / span
+
+
+def _midpoint_error(y_left, y_mid, y_right, scale):
+    """Distance in pixels between f(mid) and the straight segment"""
+    with np.errstate(invalid='ignore'):
+        error = np.abs(y_mid - (y_left + y_right) / 2) * scale
+    finite = np.isfinite(y_left) & np.isfinite(y_mid) & np.isfinite(y_right)
+    none_finite = ~(np.isfinite(y_left) | np.isfinite(y_mid) | np.isfinite(y_right))
+    # A segment crossing a domain boundary keeps refining to locate the edge
+    error[~finite] = np.inf
+    error[none_finite] = 0.0
+    return error
+
+
+def adaptive_sample(f, x_min, x_max, pixel_width=800, pixel_height=600,
+                    tolerance=0.5, max_evaluations=4000, initial=None):
+    """Sample f densely where it bends or jumps and sparsely where it is straight
+
+    Starting from a coarse uniform grid, every segment whose midpoint lies more
+    than `tolerance` pixels off the straight line is split, one whole level at
+    a time.  Splitting stops at a quarter pixel width or once
+    `max_evaluations` points have been evaluated.  Segments that still fail at
+    the finest width are probed once more: if halving them does not shrink the
+    jump, it is a discontinuity (an asymptote, say) and a NaN is inserted so
+    it is not drawn as a near-vertical line.
+
+    Returns (x_values, y_values) sorted by x, with NaN marking gaps.
+    """
+    for x_values, y_values in adaptive_refinements(f, x_min, x_max, pixel_width, pixel_height,
+                                                   tolerance, max_evaluations, initial):
+        pass
+    return x_values, y_values
+
+
+def adaptive_refinements(f, x_min, x_max, pixel_width=800, pixel_height=600,
+                         tolerance=0.5, max_evaluations=4000, initial=None):
+    """Run adaptive_sample step by step, yielding (x_values, y_values) as it goes
+
+    The coarse grid comes first, then the samples after each refinement
+    level; the last pair is exactly what adaptive_sample returns.  Closing
+    the generator early abandons the remaining work.
+    """
+    if initial is None:
+        initial = max(16, pixel_width // 8)
+    initial = min(initial, max_evaluations)
+    min_width = (x_max - x_min) / (pixel_width * 4)
+
+    x_values = np.linspace(x_min, x_max, initial + 1)
+    y_values = _evaluate(f, x_values)
+    evaluations = x_values.size
+    active = np.ones(x_values.size - 1, dtype=bool)
+    # Keep a slice of the budget for the discontinuity probe at the end
+    refine_budget = int(max_evaluations * 0.9)
+    yield x_values, y_values
+
+    while evaluations < refine_budget:
+        widths = np.diff(x_values)
+        candidates = np.flatnonzero(active & (widths > min_width))
+        if candidates.size == 0:
+            break
+        remaining = refine_budget - evaluations
+        if candidates.size > remaining:
+            # Spend what is left on the segments with the biggest jumps
+            jumps = np.abs(y_values[candidates + 1] - y_values[candidates])
+            jumps[~np.isfinite(jumps)] = np.inf
+            candidates = np.sort(candidates[np.argsort(-jumps, kind='stable')[:remaining]])
+
+        x_mid = (x_values[candidates] + x_values[candidates + 1]) / 2
+        y_mid = _evaluate(f, x_mid)
+        evaluations += x_mid.size
+
+        scale = _pixel_scale(np.concatenate([y_values, y_mid]), pixel_height)
+        split = _midpoint_error(y_values[candidates], y_mid, y_values[candidates + 1], scale) > tolerance
+
+        # Both halves of a split segment stay active; accepted ones are done
+        active[candidates] = split
+        x_values = np.insert(x_values, candidates + 1, x_mid)
+        y_values = np.insert(y_values, candidates + 1, y_mid)
+        active = np.insert(active, candidates + 1, split)
+        yield x_values, y_values
+
+    yield _break_discontinuities(f, x_values, y_values, active, pixel_height,
+                                 tolerance, max_evaluations - evaluations)
+
+
+def _break_discontinuities(f, x_values, y_values, active, pixel_height, tolerance, budget):
+    scale = _pixel_scale(y_values, pixel_height)
+    y_left = y_values[:-1]
+    y_right = y_values[1:]
+    with np.errstate(invalid='ignore'):
+        jump = np.abs(y_right - y_left) * scale
+    suspects = np.flatnonzero(active & np.isfinite(jump) & (jump > 4 * tolerance))[:max(budget, 0)]
+    if suspects.size == 0:
+        return x_values, y_values
+
+    x_mid = (x_values[suspects] + x_values[suspects + 1]) / 2
+    y_mid = _evaluate(f, x_mid)
+    whole = np.abs(y_values[suspects + 1] - y_values[suspects])
+    halves = np.maximum(np.abs(y_mid - y_values[suspects]), np.abs(y_values[suspects + 1] - y_mid))
+    # A continuous function roughly halves its jump; a discontinuity keeps it
+    broken = ~np.isfinite(y_mid) | (halves > 0.8 * whole)
+
+    y_mid[broken] = np.nan
+    x_values = np.insert(x_values, suspects + 1, x_mid)
+    y_values = np.insert(y_values, suspects + 1, y_mid)
+    return x_values, y_values
+
+
+def parametric_sample(fx, fy, t_min, t_max, samples=2000):
+    """Evaluate a parametric curve (x(t), y(t)) on an evenly spaced t grid
+
+    Returns (x_values, y_values), both NaN wherever either one is undefined.
+    """
+    t_values = np.linspace(t_min, t_max, samples)
+    x_values = _evaluate(fx, t_values)
+    y_values = _evaluate(fy, t_values)
+    gaps = np.isnan(x_values) | np.isnan(y_values)
+    x_values[gaps] = np.nan
+    y_values[gaps] = np.nan
+    return x_values, y_values
+
+
+def polar_sample(fr, theta_min, theta_max, samples=2000):
+    """Evaluate r(theta) on an evenly spaced grid and return Cartesian (x, y)"""
+    theta = np.linspace(theta_min, theta_max, samples)
+    r_values = _evaluate(fr, theta)
+    return r_values * np.cos(theta), r_values * np.sin(theta)
+
+
+def grid_sample(f, x_min, x_max, y_min, y_max, resolution=200):
+    """Evaluate f(x, y) over a resolution x resolution grid in one broadcast pass
+
+    f receives a row of x values and a column of y values, so NumPy
+    broadcasts them against each other without materializing a meshgrid.
+    Returns (x_values, y_values, z) with z[i, j] = f(x_values[j], y_values[i])
+    and NaN wherever f is undefined.
+    """
+    x_values = np.linspace(x_min, x_max, resolution)
+    y_values = np.linspace(y_min, y_max, resolution)
+    x_grid, y_grid = np.meshgrid(x_values, y_values, sparse=True)
+    with np.errstate(all='ignore'):
+        z = _owned(f(x_grid, y_grid), (resolution, resolution), (x_grid, y_grid))
+    z[~np.isfinite(z)] = np.nan
+    return x_values, y_values, z
+
+
+def sample_at(f, x_values):
+    """Evaluate f at the given points, with NaN wherever it is undefined"""
+    return _evaluate(f, np.asarray(x_values, dtype=float))
+
+
+def central_difference(f, x_values):
+    """Numeric f'(x) at every point, for functions with no symbolic derivative"""
+    x_values = np.asarray(x_values, dtype=float)
+    # cbrt(eps) balances truncation against rounding error for a central difference
+    step = np.cbrt(np.finfo(float).eps) * np.maximum(1.0, np.abs(x_values))
+    return (_evaluate(f, x_values + step) - _evaluate(f, x_values - step)) / (2 * step)
+
+
+def cumulative_integral(x_values, y_values):
+    """The integral of the samples from the first x to each x, by the trapezoid rule
+
+    One vectorized pass: trapezoid areas, then a running sum.  Segments with
+    an undefined end add nothing, and the integral is NaN wherever f is.
+    """
+    with np.errstate(invalid='ignore'):
+        areas = np.diff(x_values) * (y_values[1:] + y_values[:-1]) / 2
+    areas[~np.isfinite(areas)] = 0.0
+    integral = np.concatenate(([0.0], np.cumsum(areas)))
+    integral[~np.isfinite(y_values)] = np.nan
+    return integral
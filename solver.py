@@ -0,0 +1,298 @@
+import math
+from collections import namedtuple
+
+import numpy as np
+
+from expression import ExpressionError, compile_ast, compile_function, get_backend, variables_of
+
+# Polynomials up to this degree are solved exactly via their companion matrix
+MAX_DEGREE = 64
+
+# roots: sorted real solutions
+# complex_roots: non-real solutions, only known for polynomials
+# method: 'polynomial', 'numeric' or 'identity' (every x is a solution)
+Solution = namedtuple('Solution', ['roots', 'complex_roots', 'method'])
+
+
+def equation_to_function(equation):
+    """Rewrite 'left = right' as the text of left - right, whose zeros are the solutions"""
+    if equation.count('=') > 1:
+        raise ExpressionError("An equation may contain only one '='")
+    if '=' in equation:
+        left, right = equation.split('=')
+        if not left.strip() or not right.strip():
+            raise ExpressionError("Both sides of the equation need an expression")
+        return f"({left})-({right})"
+    return equation
+
+
+def _constant_value(node):
+    value = compile_ast(node, get_backend('scalar'))({})
+    if isinstance(value, complex) or not math.isfinite(value):
+        raise ValueError("not a finite real constant")
+    return float(value)
+
+
+def polynomial_coefficients(node):
+    """Return the coefficients of a polynomial AST, lowest power first
+
+    Returns None if the expression is not a polynomial in x of degree at
+    most MAX_DEGREE, for example when x appears inside a function or a
+    denominator.
+    """
+    try:
+        coefficients = _polynomial(node)
+    except (ValueError, ArithmeticError):
+        return None
+    if coefficients is None or coefficients.size - 1 > MAX_DEGREE:
+        return None
+    return coefficients
+
+
+def _polynomial(node):
+    kind = node[0]
+    if not variables_of(node):
+        return np.array([_constant_value(node)])
+    if kind == 'var':
+        return np.array([0.0, 1.0])
+    if kind == 'neg':
+        inner = _polynomial(node[1])
+        return None if inner is None else -inner
+    if kind in ('add', 'sub'):
+        left = _polynomial(node[1])
+        right = _polynomial(node[2])
+        if left is None or right is None:
+            return None
+        if kind == 'sub':
+            right = -right
+        return _cancel(np.polynomial.polynomial.polyadd(left, right),
+                       np.polynomial.polynomial.polyadd(np.abs(left), np.abs(right)))
+    if kind == 'mul':
+        left = _polynomial(node[1])
+        right = _polynomial(node[2])
+        if left is None or right is None or left.size + right.size - 2 > MAX_DEGREE:
+            return None
+        return _cancel(np.polynomial.polynomial.polymul(left, right),
+                       np.polynomial.polynomial.polymul(np.abs(left), np.abs(right)))
+    if kind == 'div':
+        # Only division by a constant keeps it a polynomial
+        if variables_of(node[2]):
+            return None
+        numerator = _polynomial(node[1])
+        denominator = _constant_value(node[2])
+        if numerator is None or denominator == 0:
+            return None
+        return numerator / denominator
+    if kind == 'pow':
+        if variables_of(node[2]):
+            return None
+        exponent = _constant_value(node[2])
+        base = _polynomial(node[1])
+        if base is None or exponent != int(exponent) or exponent < 0:
+            return None
+        if (base.size - 1) * exponent > MAX_DEGREE:
+            return None
+        return _cancel(np.polynomial.polynomial.polypow(base, int(exponent)),
+                       np.polynomial.polynomial.polypow(np.abs(base), int(exponent)))
+    # x inside a function call
+    return None
+
+
+def _cancel(coefficients, magnitudes):
+    """Zero the coefficients that cancelled down to rounding noise
+
+    magnitudes is the same sum or product over absolute values, so it
+    bounds the size of the terms that went into each coefficient.  What is
+    left of 0.1 * 3 - 0.3 is noise; 1e-20 on its own is a real coefficient.
+    """
+    noise = np.abs(coefficients) <= (MAX_DEGREE * np.finfo(float).eps) * magnitudes
+    return np.where(noise, 0.0, coefficients)
+
+
+def _trim(coefficients):
+    """Drop leading (highest power) coefficients that are exactly zero"""
+    nonzero = np.flatnonzero(coefficients)
+    if nonzero.size == 0:
+        return np.zeros(1)
+    return coefficients[:nonzero[-1] + 1]
+
+
+def solve_polynomial(coefficients):
+    """Solve a polynomial, lowest power first, via the companion matrix"""
+    coefficients = _trim(np.asarray(coefficients, dtype=float))
+    if coefficients.size == 1:
+        method = 'identity' if coefficients[0] == 0 else 'polynomial'
+        return Solution([], [], method)
+
+    # np.roots takes the highest power first and finds the eigenvalues of
+    # the companion matrix
+    highest_first = coefficients[::-1]
+    found = _merge_multiple(highest_first, np.roots(highest_first))
+    is_real = np.abs(found.imag) <= 1e-9 * np.maximum(1.0, np.abs(found.real))
+    real = _newton_polish(highest_first, found.real[is_real])
+
+    roots = _unique(np.sort(real))
+    complex_roots = sorted((complex(root) for root in found[~is_real]),
+                           key=lambda root: (root.real, root.imag))
+    return Solution([float(root) for root in roots], complex_roots, 'polynomial')
+
+
+def _merge_multiple(highest_first, found):
+    """Collapse the ring of eigenvalues a multiple root splits into
+
+    An m-fold root comes back as m eigenvalues scattered around it by about
+    eps**(1/m), some of them complex; their mean is accurate to nearly full
+    precision.  Starting from each remaining root, the largest group of its
+    nearest neighbours that fits inside that radius, and whose mean really
+    is a zero of the polynomial, is merged.
+    """
+    magnitudes = np.abs(highest_first)
+    eps = np.finfo(float).eps
+    remaining = np.array(sorted(found, key=lambda root: (root.real, root.imag)), dtype=complex)
+    merged = []
+    while remaining.size:
+        order = np.argsort(np.abs(remaining - remaining[0]), kind='stable')
+        neighbours = remaining[order]
+        # Mean and spread of the nearest m roots, for every m at once
+        sizes = np.arange(1, neighbours.size + 1)
+        centers = np.cumsum(neighbours) / sizes
+        distances = np.abs(neighbours[None, :] - centers[:, None])
+        distances[np.arange(neighbours.size)[None, :] >= sizes[:, None]] = 0
+        spreads = distances.max(axis=1)
+        fits = spreads <= 8 * eps ** (1 / sizes) * np.maximum(1.0, np.abs(centers))
+
+        # A ring of distinct roots (x^n - 1) has a mean that is no root at all
+        residuals = np.abs(np.polyval(highest_first, centers))
+        is_root = residuals <= 1e-8 * np.polyval(magnitudes, np.abs(centers))
+        m = sizes[fits & (is_root | (sizes == 1))].max()
+        merged.append(centers[m - 1])
+        remaining = np.delete(remaining, order[:m])
+    return np.array(merged, dtype=complex)
+
+
+def _newton_polish(highest_first, roots, steps=3):
+    # Eigenvalues lose a few digits; a couple of Newton steps win them back
+    derivative = np.polyder(highest_first)
+    for _ in range(steps):
+        slope = np.polyval(derivative, roots)
+        step = np.divide(np.polyval(highest_first, roots), slope,
+                         out=np.zeros_like(roots), where=slope != 0)
+        polished = roots - step
+        # Keep the eigenvalue where Newton wanders off (multiple roots)
+        better = np.abs(np.polyval(highest_first, polished)) <= np.abs(np.polyval(highest_first, roots))
+        roots = np.where(better, polished, roots)
+    return roots
+
+
+def _unique(roots, rel_tol=1e-9, abs_tol=1e-12):
+    if roots.size == 0:
+        return roots
+    gaps = np.diff(roots)
+    distinct = gaps > rel_tol * np.maximum(1.0, np.abs(roots[1:])) + abs_tol
+    return roots[np.concatenate(([True], distinct))]
+
+
+def _evaluate(f, x_values):
+    with np.errstate(all='ignore'):
+        y_values = np.broadcast_to(f(x_values), np.shape(x_values)).astype(float)
+    y_values[~np.isfinite(y_values)] = np.nan
+    return y_values
+
+
+def _bisect(f, lo, hi, f_lo, iterations=80):
+    """Refine every [lo, hi] bracket with a sign change at once"""
+    for _ in range(iterations):
+        mid = (lo + hi) / 2
+        f_mid = _evaluate(f, mid)
+        left = np.sign(f_mid) == np.sign(f_lo)
+        lo = np.where(left, mid, lo)
+        f_lo = np.where(left, f_mid, f_lo)
+        hi = np.where(left, hi, mid)
+        if np.all(hi - lo <= 4 * np.finfo(float).eps * np.maximum(1.0, np.abs(lo))):
+            break
+    return (lo + hi) / 2
+
+
+def _golden_min(g, lo, hi, iterations=80):
+    """Minimize g on every [lo, hi] interval at once by golden-section search"""
+    ratio = (math.sqrt(5) - 1) / 2
+    c = hi - ratio * (hi - lo)
+    d = lo + ratio * (hi - lo)
+    g_c = g(c)
+    g_d = g(d)
+    for _ in range(iterations):
+        # The minimum lies in [lo, d] or [c, hi]; either way one old probe is reused
+        left = g_c < g_d
+        lo, hi = np.where(left, lo, c), np.where(left, d, hi)
+        new_c = np.where(left, hi - ratio * (hi - lo), d)
+        new_d = np.where(left, c, lo + ratio * (hi - lo))
+        g_probe = g(np.where(left, new_c, new_d))
+        g_c, g_d = np.where(left, g_probe, g_d), np.where(left, g_c, g_probe)
+        c, d = new_c, new_d
+        if np.all(hi - lo <= 1e-12 * np.maximum(1.0, np.abs(lo))):
+            break
+    return (lo + hi) / 2
+
+
+def solve_numeric(f, x_min=-100.0, x_max=100.0, samples=20001, max_roots=100):
+    """Find the real zeros of a vectorized f on [x_min, x_max]
+
+    f is sampled on a dense grid.  Every sign change is refined by batched
+    bisection; poles (tan, 1/x) also change sign, so a candidate is dropped
+    if f is larger there than at the grid points around it.  Zeros that only
+    touch the axis, like x^2, show up as a local minimum of |f| and are
+    located by golden-section search instead.
+    """
+    if not x_min < x_max:
+        raise ValueError("x_min must be less than x_max")
+    x_values = np.linspace(x_min, x_max, samples)
+    y_values = _evaluate(f, x_values)
+    finite = np.isfinite(y_values)
+
+    candidates = [x_values[y_values == 0]]
+
+    # Sign changes between neighbouring grid points
+    sign = np.sign(y_values)
+    crossing = np.flatnonzero(finite[:-1] & finite[1:] & (sign[:-1] * sign[1:] < 0))
+    if crossing.size:
+        lo = x_values[crossing]
+        hi = x_values[crossing + 1]
+        roots = _bisect(f, lo, hi, y_values[crossing])
+        f_roots = np.abs(_evaluate(f, roots))
+        bound = np.maximum(np.abs(y_values[crossing]), np.abs(y_values[crossing + 1]))
+        candidates.append(roots[f_roots <= bound])
+
+    # Local minima of |f| that stay on one side of the axis
+    magnitude = np.abs(y_values)
+    inner = np.arange(1, samples - 1)
+    dip = inner[finite[:-2] & finite[1:-1] & finite[2:]
+                & (magnitude[1:-1] < magnitude[:-2]) & (magnitude[1:-1] <= magnitude[2:])
+                & (sign[:-2] == sign[2:]) & (sign[1:-1] != 0)]
+    if dip.size:
+        g = lambda x: np.abs(_evaluate(f, x))
+        lowest = _golden_min(g, x_values[dip - 1], x_values[dip + 1])
+        # Only a true touch gets this close to zero relative to its neighbours
+        around = np.maximum(magnitude[dip - 1], magnitude[dip + 1])
+        touching = g(lowest) <= 1e-10 * np.maximum(1.0, around)
+        candidates.append(lowest[touching])
+
+    roots = np.sort(np.concatenate(candidates))
+    spacing = (x_max - x_min) / (samples - 1)
+    roots = _unique(roots, rel_tol=1e-9, abs_tol=spacing * 1e-6)
+    return Solution([float(root) for root in roots[:max_roots]], [], 'numeric')
+
+
+def solve(equation, x_min=-100.0, x_max=100.0, samples=20001, max_roots=100,
+          compiler=compile_function):
+    """Solve an equation in x, such as 'x^2 = 9' or 'sin(x) - x/3'
+
+    Polynomials are solved exactly, over all real numbers, with their
+    complex roots alongside.  Anything else is solved numerically on
+    [x_min, x_max].  compiler turns the function text into a vectorized
+    CompiledExpression, e.g. ExpressionCache.compile_function.
+    """
+    function = compiler(equation_to_function(equation), mode='vector')
+    coefficients = polynomial_coefficients(function.tree)
+    if coefficients is not None:
+        return solve_polynomial(coefficients)
+    return solve_numeric(lambda x: function(x=x), x_min, x_max, samples, max_roots)
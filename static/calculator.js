@@ -0,0 +1,705 @@
+// Update the DOMContentLoaded function to initialize everything correctly:
+document.addEventListener('DOMContentLoaded', function() {
+    console.log("Page loaded, initializing app...");
+    
+    // Set initial display states
+    const calculatorContainer = document.querySelector('.calculator-container');
+    const graphPanel = document.querySelector('.graph-panel');
+    const periodicPanel = document.querySelector('.periodic-panel');
+    
+    if (!calculatorContainer) console.error("Calculator container not found");
+    if (!graphPanel) console.error("Graph panel not found");
+    if (!periodicPanel) console.error("Periodic panel not found");
+    
+    // Make sure panels exist before setting display
+    if (calculatorContainer) calculatorContainer.style.display = 'block';
+    if (graphPanel) graphPanel.style.display = 'none';
+    if (periodicPanel) periodicPanel.style.display = 'none';
+    
+    // Add calculator functionality
+    setupCalculator();
+    
+    // Add graphing functionality
+    setupGraphing();
+    
+    // Add event listeners for the tabs
+    const tabs = document.querySelectorAll('.tab');
+    console.log(`Found ${tabs.length} tabs`);
+    
+    tabs.forEach(tab => {
+        tab.addEventListener('click', function() {
+            const tabType = this.dataset.tab;
+            console.log("Tab clicked:", tabType);
+            
+            // Update active tab styling
+            tabs.forEach(t => t.classList.remove('active'));
+            this.classList.add('active');
+            
+            // Show/hide panels based on the selected tab
+            if (calculatorContainer) 
+                calculatorContainer.style.display = tabType === 'calculator' ? 'block' : 'none';
+            if (graphPanel)
+                graphPanel.style.display = tabType === 'graph' ? 'block' : 'none';
+            if (periodicPanel)
+                periodicPanel.style.display = tabType === 'periodic' ? 'block' : 'none';
+            
+            // Generate the periodic table when that tab is selected
+            if (tabType === 'periodic') {
+                console.log("Calling generatePeriodicTable()");
+                generatePeriodicTable();
+            }
+        });
+    });
+    
+    // Close element details when clicking the X
+    const closeButton = document.querySelector('.element-details-close');
+    if (closeButton) {
+        closeButton.addEventListener('click', () => {
+            const detailsElement = document.querySelector('.element-details');
+            if (detailsElement) {
+                detailsElement.style.display = 'none';
+            }
+        });
+    }
+});
+
+// Live result preview under the display.  Keystrokes less than
+// PREVIEW_DELAY_MS apart coalesce into one request, text that was already
+// previewed is not sent again, and a request made stale by newer input is
+// aborted.  The whole text is sent each time and the server works out what
+// changed, so an aborted or reordered request cannot confuse its parse state.
+const PREVIEW_DELAY_MS = 150;
+
+function createPreview(output) {
+    const session = window.crypto && crypto.randomUUID
+        ? crypto.randomUUID()
+        : Date.now().toString(36) + Math.random().toString(36).slice(2);
+    let timer = null;
+    let pendingText = null;
+    let inFlight = null;
+    let lastText = null;
+    let lastResult = '';
+    
+    function show(text, result) {
+        lastText = text;
+        lastResult = result;
+        output.textContent = result;
+        output.classList.remove('stale');
+    }
+    
+    function send() {
+        timer = null;
+        const text = pendingText;
+        pendingText = null;
+        if (inFlight && inFlight.text !== text) {
+            inFlight.controller.abort();
+            inFlight = null;
+        }
+        if (text === lastText) {
+            show(text, lastResult);
+            return;
+        }
+        if (inFlight) return;
+        const request = { text, controller: new AbortController() };
+        inFlight = request;
+        fetch('/calculate/preview', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/x-www-form-urlencoded',
+            },
+            body: `session=${encodeURIComponent(session)}&expression=${encodeURIComponent(text)}`,
+            signal: request.controller.signal
+        })
+        .then(response => response.json())
+        .then(data => {
+            // Unfinished input ('2+', 'sin(') has no value yet; show nothing
+            if (inFlight === request) show(text, data.error ? '' : `= ${data.result}`);
+        })
+        .catch(error => {
+            if (error.name !== 'AbortError') console.error('Preview error:', error);
+        })
+        .finally(() => {
+            if (inFlight === request) inFlight = null;
+        });
+    }
+    
+    return {
+        update(text) {
+            // A bare number previews as itself
+            if (text === '' || /^[\d.]+$/.test(text)) {
+                this.cancel();
+                return;
+            }
+            output.classList.toggle('stale', text !== lastText);
+            pendingText = text;
+            clearTimeout(timer);
+            timer = setTimeout(send, PREVIEW_DELAY_MS);
+        },
+        
+        cancel() {
+            clearTimeout(timer);
+            timer = null;
+            pendingText = null;
+            if (inFlight) {
+                inFlight.controller.abort();
+                inFlight = null;
+            }
+            show(null, '');
+        }
+    };
+}
+
+// Add these functions after the element details functions
+function setupCalculator() {
+    const buttons = document.querySelectorAll('.button');
+    const current = document.getElementById('current');
+    const history = document.getElementById('history');
+    const preview = createPreview(document.getElementById('preview'));
+    
+    let currentInput = '';
+    let currentCalculation = '';
+    
+    buttons.forEach(button => {
+        button.addEventListener('click', function() {
+            // Add click animation
+            this.classList.add('clicked');
+            setTimeout(() => {
+                this.classList.remove('clicked');
+            }, 100);
+            
+            const action = this.dataset.action;
+            const number = this.dataset.number;
+            
+            if (number) {
+                if (currentInput === '0' && number !== '.') {
+                    currentInput = number;
+                } else {
+                    currentInput += number;
+                }
+                current.textContent = currentInput;
+            }
+            
+            if (action === 'calculate') {
+                try {
+                    // If we have a partial calculation waiting
+                    if (currentCalculation !== '' && currentInput !== '') {
+                        const fullExpression = currentCalculation + currentInput;
+                        history.textContent = fullExpression + ' =';
+                        
+                        // Send to server for calculation
+                        fetch('/calculate', {
+                            method: 'POST',
+                            headers: {
+                                'Content-Type': 'application/x-www-form-urlencoded',
+                            },
+                            body: `expression=${encodeURIComponent(fullExpression)}`
+                        })
+                        .then(response => response.json())
+                        .then(data => {
+                            if (data.error) {
+                                current.textContent = 'Error';
+                                console.error('Calculation error:', data.error);
+                            } else {
+                                currentInput = data.result;
+                                currentCalculation = '';
+                                current.textContent = currentInput;
+                            }
+                        })
+                        .catch(error => {
+                            current.textContent = 'Error';
+                            console.error('Fetch error:', error);
+                        });
+                    } else {
+                        // Just calculate the current input alone
+                        history.textContent = currentInput + ' =';
+                        
+                        // Send to server for calculation
+                        fetch('/calculate', {
+                            method: 'POST',
+                            headers: {
+                                'Content-Type': 'application/x-www-form-urlencoded',
+                            },
+                            body: `expression=${encodeURIComponent(currentInput)}`
+                        })
+                        .then(response => response.json())
+                        .then(data => {
+                            if (data.error) {
+                                current.textContent = 'Error';
+                                console.error('Calculation error:', data.error);
+                            } else {
+                                currentInput = data.result;
+                                current.textContent = currentInput;
+                            }
+                        })
+                        .catch(error => {
+                            current.textContent = 'Error';
+                            console.error('Fetch error:', error);
+                        });
+                    }
+                } catch (e) {
+                    current.textContent = 'Error';
+                    console.error('Calculation error:', e);
+                }
+            }
+            
+            if (action === 'clear') {
+                currentInput = '0';
+                currentCalculation = '';
+                history.textContent = '';
+                current.textContent = currentInput;
+            }
+            
+            if (action === 'add' || action === 'subtract' || action === 'multiply' || action === 'divide' || 
+                action === 'percent' || action === 'delete' || action === 'brackets') {
+                
+                // Handle operators
+                if (action === 'add') {
+                    currentCalculation = currentInput + '+';
+                    history.textContent = currentCalculation;
+                    currentInput = '';
+                }
+                
+                if (action === 'subtract') {
+                    currentCalculation = currentInput + '-';
+                    history.textContent = currentCalculation;
+                    currentInput = '';
+                }
+                
+                if (action === 'multiply') {
+                    currentCalculation = currentInput + '*';
+                    history.textContent = currentCalculation;
+                    currentInput = '';
+                }
+                
+                if (action === 'divide') {
+                    currentCalculation = currentInput + '/';
+                    history.textContent = currentCalculation;
+                    currentInput = '';
+                }
+                
+                if (action === 'percent') {
+                    currentInput = (parseFloat(currentInput) / 100).toString();
+                    current.textContent = currentInput;
+                }
+                
+                if (action === 'delete') {
+                    if (currentInput.length > 0) {
+                        currentInput = currentInput.slice(0, -1);
+                        if (currentInput === '') currentInput = '0';
+                        current.textContent = currentInput;
+                    }
+                }
+                
+                if (action === 'brackets') {
+                    // Count open and closed brackets
+                    let openCount = (currentInput.match(/\(/g) || []).length;
+                    let closeCount = (currentInput.match(/\)/g) || []).length;
+                    
+                    if (openCount > closeCount) {
+                        currentInput += ')';
+                    } else {
+                        currentInput += '(';
+                    }
+                    current.textContent = currentInput;
+                }
+            }
+            
+            // Add this code to handle the function buttons
+            if (action === 'sin' || action === 'cos' || action === 'tan' || 
+                action === 'log' || action === 'ln' || action === 'sqrt' || 
+                action === 'power' || action === 'factorial') {
+                
+                if (action === 'sin') {
+                    currentInput += 'sin(';
+                } else if (action === 'cos') {
+                    currentInput += 'cos(';
+                } else if (action === 'tan') {
+                    currentInput += 'tan(';
+                } else if (action === 'log') {
+                    currentInput += 'log10(';
+                } else if (action === 'ln') {
+                    currentInput += 'log(';
+                } else if (action === 'sqrt') {
+                    currentInput += 'sqrt(';
+                } else if (action === 'power') {
+                    currentInput += '^';
+                } else if (action === 'factorial') {
+                    currentInput += 'factorial(';
+                }
+                
+                current.textContent = currentInput;
+            }
+            
+            if (action === 'calculate' || action === 'clear') {
+                preview.cancel();
+            } else {
+                preview.update(currentCalculation + currentInput);
+            }
+        });
+    });
+}
+
+function setupGraphing() {
+    const plotButton = document.getElementById('plot-button');
+    const clearGraphButton = document.getElementById('clear-graph');
+    const functionInput = document.getElementById('function-input');
+    const xMinInput = document.getElementById('x-min');
+    const xMaxInput = document.getElementById('x-max');
+    const graphImage = document.getElementById('graph-image');
+    const graphCanvas = document.getElementById('graph-canvas');
+    const formatSelect = document.getElementById('plot-format');
+    const emptyGraphPlaceholder = document.getElementById('empty-graph-placeholder');
+    let activeStream = null;
+    
+    if (!plotButton || !clearGraphButton) {
+        console.error('Graph buttons not found');
+        return;
+    }
+    
+    // Plot the graph
+    plotButton.addEventListener('click', function() {
+        const functionValue = functionInput.value;
+        const xMin = xMinInput.value;
+        const xMax = xMaxInput.value;
+        
+        // Check if inputs are valid
+        if (!functionValue || !xMin || !xMax) {
+            alert('Please enter a function and x-range values.');
+            return;
+        }
+        
+        const format = formatSelect ? formatSelect.value : 'png';
+        const title = `f(x) = ${functionValue}`;
+        
+        // Stream the plot: coarse samples are painted on the canvas right
+        // away and refined in place, then the finished image replaces them.
+        // Closing a superseded stream lets the server stop working on it.
+        if (activeStream) {
+            activeStream.close();
+        }
+        // Derivative, integral and tangent overlays come with the final
+        // image, or with the last points event when plotting points
+        const overlays = Array.from(document.querySelectorAll('input[name="overlay"]:checked'), box => box.value);
+        const tangentAt = document.getElementById('tangent-at');
+        let query = `function=${encodeURIComponent(functionValue)}&x_min=${encodeURIComponent(xMin)}&x_max=${encodeURIComponent(xMax)}&format=${format}`;
+        if (overlays.length) {
+            query += `&overlays=${overlays.join(',')}`;
+        }
+        if (overlays.includes('tangent') && tangentAt && tangentAt.value) {
+            query += `&tangent_at=${encodeURIComponent(tangentAt.value)}`;
+        }
+        const stream = new EventSource(`/plot/stream?${query}`);
+        activeStream = stream;
+        
+        stream.addEventListener('points', event => {
+            const data = JSON.parse(event.data);
+            drawPoints(graphCanvas, data.points, title);
+            graphImage.style.display = 'none';
+            graphCanvas.style.display = 'block';
+            emptyGraphPlaceholder.style.display = 'none';
+        });
+        
+        stream.addEventListener('image', event => {
+            const data = JSON.parse(event.data);
+            if (format === 'svg') {
+                graphImage.src = 'data:image/svg+xml;charset=utf-8,' + encodeURIComponent(data.svg);
+            } else {
+                graphImage.src = `data:image/png;base64,${data.image}`;
+            }
+            graphCanvas.style.display = 'none';
+            graphImage.style.display = 'block';
+        });
+        
+        stream.addEventListener('done', () => {
+            stream.close();
+        });
+        
+        stream.addEventListener('plot-error', event => {
+            stream.close();
+            alert('Error: ' + JSON.parse(event.data).error);
+        });
+        
+        stream.onerror = error => {
+            // EventSource would reconnect and start the plot over
+            stream.close();
+            alert('Error plotting graph. Please try again.');
+            console.error('Graphing error:', error);
+        };
+    });
+    
+    // Clear the graph
+    clearGraphButton.addEventListener('click', function() {
+        if (activeStream) {
+            activeStream.close();
+            activeStream = null;
+        }
+        graphImage.src = '';
+        graphImage.style.display = 'none';
+        graphCanvas.style.display = 'none';
+        emptyGraphPlaceholder.style.display = 'block';
+        functionInput.value = 'sin(x)';
+        xMinInput.value = '-10';
+        xMaxInput.value = '10';
+    });
+}
+
+// Pick tick positions on a 1-2-5 step, like the server-side renderers
+function niceTicks(lo, hi) {
+    const raw = (hi - lo) / 8;
+    const magnitude = Math.pow(10, Math.floor(Math.log10(raw)));
+    const step = [1, 2, 5, 10].map(m => m * magnitude).find(s => raw <= s);
+    const ticks = [];
+    for (let v = Math.ceil(lo / step) * step; v <= hi + step * 1e-9; v += step) {
+        ticks.push(Math.abs(v) < step * 1e-9 ? 0 : v);
+    }
+    return {ticks, step};
+}
+
+// Draw a point series from /plot?format=points; null y values are gaps
+// Colors of the overlay series, after the blue of f: raster.SERIES_COLORS
+const OVERLAY_COLORS = ['#f44336', '#4caf50', '#ff9800'];
+
+function drawPoints(canvas, points, title) {
+    const ctx = canvas.getContext('2d');
+    const width = canvas.width;
+    const height = canvas.height;
+    const left = 70, right = width - 20, top = 40, bottom = height - 50;
+    const xs = points.x;
+    const ys = points.y;
+    // Derivative, integral and tangent series share the x values of f
+    const overlays = points.overlays || [];
+    
+    const finite = [ys, ...overlays.map(overlay => overlay.y)].flat().filter(y => y !== null);
+    let yLo = finite.length ? Math.min(...finite) : -1;
+    let yHi = finite.length ? Math.max(...finite) : 1;
+    if (yHi - yLo < 1e-12 * Math.max(1, Math.abs(yHi))) {
+        yLo -= 1;
+        yHi += 1;
+    } else {
+        const margin = (yHi - yLo) * 0.05;
+        yLo -= margin;
+        yHi += margin;
+    }
+    let xLo = xs[0];
+    let xHi = xs[xs.length - 1];
+    if (xHi <= xLo) xHi = xLo + 1;
+    
+    const toPx = x => left + (x - xLo) / (xHi - xLo) * (right - left);
+    const toPy = y => top + (yHi - y) / (yHi - yLo) * (bottom - top);
+    const decimals = step => Math.max(0, -Math.floor(Math.log10(step)));
+    
+    ctx.fillStyle = '#f5f5f5';
+    ctx.fillRect(0, 0, width, height);
+    ctx.fillStyle = '#f9f9f9';
+    ctx.fillRect(left, top, right - left, bottom - top);
+    
+    // Dashed grid with tick labels
+    ctx.strokeStyle = '#d6d6d6';
+    ctx.fillStyle = '#555555';
+    ctx.lineWidth = 1;
+    ctx.font = '12px sans-serif';
+    ctx.setLineDash([4, 3]);
+    const xTicks = niceTicks(xLo, xHi);
+    ctx.textAlign = 'center';
+    xTicks.ticks.forEach(tick => {
+        ctx.beginPath();
+        ctx.moveTo(toPx(tick), top);
+        ctx.lineTo(toPx(tick), bottom);
+        ctx.stroke();
+        ctx.fillText(tick.toFixed(decimals(xTicks.step)), toPx(tick), bottom + 20);
+    });
+    const yTicks = niceTicks(yLo, yHi);
+    ctx.textAlign = 'right';
+    yTicks.ticks.forEach(tick => {
+        ctx.beginPath();
+        ctx.moveTo(left, toPy(tick));
+        ctx.lineTo(right, toPy(tick));
+        ctx.stroke();
+        ctx.fillText(tick.toFixed(decimals(yTicks.step)), left - 8, toPy(tick) + 4);
+    });
+    ctx.setLineDash([]);
+    
+    // Axes through the origin and the left/bottom spines
+    ctx.strokeStyle = 'rgba(97, 97, 97, 0.5)';
+    ctx.beginPath();
+    if (yLo <= 0 && 0 <= yHi) {
+        ctx.moveTo(left, toPy(0));
+        ctx.lineTo(right, toPy(0));
+    }
+    if (xLo <= 0 && 0 <= xHi) {
+        ctx.moveTo(toPx(0), top);
+        ctx.lineTo(toPx(0), bottom);
+    }
+    ctx.stroke();
+    ctx.strokeStyle = '#616161';
+    ctx.beginPath();
+    ctx.moveTo(left, top);
+    ctx.lineTo(left, bottom);
+    ctx.lineTo(right, bottom);
+    ctx.stroke();
+    
+    // The curves, lifting the pen at every gap; overlays are dashed
+    const series = [{ y: ys, color: '#2196f3', width: 3.5, dash: [] }].concat(overlays.map((overlay, i) => (
+        { y: overlay.y, label: overlay.label, color: OVERLAY_COLORS[i % OVERLAY_COLORS.length], width: 2, dash: [8, 4] }
+    )));
+    ctx.save();
+    ctx.beginPath();
+    ctx.rect(left, top, right - left, bottom - top);
+    ctx.clip();
+    ctx.lineJoin = 'round';
+    series.forEach(line => {
+        ctx.strokeStyle = line.color;
+        ctx.lineWidth = line.width;
+        ctx.setLineDash(line.dash);
+        ctx.beginPath();
+        let penDown = false;
+        for (let i = 0; i < xs.length; i++) {
+            if (line.y[i] === null) {
+                penDown = false;
+                continue;
+            }
+            const py = Math.max(top - 1000, Math.min(bottom + 1000, toPy(line.y[i])));
+            if (penDown) {
+                ctx.lineTo(toPx(xs[i]), py);
+            } else {
+                ctx.moveTo(toPx(xs[i]), py);
+                penDown = true;
+            }
+        }
+        ctx.stroke();
+    });
+    ctx.restore();
+    
+    // Legend for the overlays, top left inside the plot
+    ctx.font = '12px sans-serif';
+    ctx.textAlign = 'left';
+    series.slice(1).forEach((line, i) => {
+        const y = top + 16 + i * 16;
+        ctx.strokeStyle = line.color;
+        ctx.lineWidth = 2;
+        ctx.setLineDash(line.dash);
+        ctx.beginPath();
+        ctx.moveTo(left + 10, y - 4);
+        ctx.lineTo(left + 34, y - 4);
+        ctx.stroke();
+        ctx.fillStyle = '#212121';
+        ctx.fillText(line.label, left + 40, y);
+    });
+    ctx.setLineDash([]);
+    
+    // Labels and title
+    ctx.fillStyle = '#555555';
+    ctx.textAlign = 'center';
+    ctx.font = '16px sans-serif';
+    ctx.fillText('x', (left + right) / 2, height - 12);
+    ctx.fillText('y', 20, (top + bottom) / 2);
+    ctx.fillStyle = '#212121';
+    ctx.font = 'bold 18px sans-serif';
+    ctx.fillText(title, (left + right) / 2, 26);
+}
+
+// Fields the grid draws; details are fetched per element when clicked
+const TABLE_FIELDS = 'number,symbol,name,category,row,col';
+let periodicTableBuilt = null;
+
+// Fetch every page of /elements, following "next" until the last one
+async function fetchElements(fields) {
+    const elements = [];
+    let offset = 0;
+    while (offset !== null) {
+        const response = await fetch(`/elements?fields=${fields}&limit=200&offset=${offset}`);
+        const page = await response.json();
+        if (page.error) {
+            throw new Error(page.error);
+        }
+        elements.push(...page.elements);
+        offset = page.next;
+    }
+    return elements;
+}
+
+// Generate the periodic table from /elements; the grid is built only once
+function generatePeriodicTable() {
+    if (!periodicTableBuilt) {
+        periodicTableBuilt = buildPeriodicTable().catch(e => {
+            periodicTableBuilt = null;
+            throw e;
+        });
+    }
+    return periodicTableBuilt;
+}
+
+async function buildPeriodicTable() {
+    console.log("Generating periodic table");
+    const periodicTable = document.querySelector('.periodic-table');
+    if (!periodicTable) {
+        console.error("Periodic table container not found");
+        return;
+    }
+    
+    let elements;
+    try {
+        elements = await fetchElements(TABLE_FIELDS);
+    } catch (e) {
+        console.error("Could not load elements:", e);
+        periodicTable.innerHTML = '<div class="error">Periodic table data not available</div>';
+        throw e;
+    }
+    
+    console.log(`Found ${elements.length} elements to display`);
+    
+    // Build the grid off-document and attach it in one go
+    const fragment = document.createDocumentFragment();
+    elements.forEach(element => {
+        const elementDiv = document.createElement('div');
+        elementDiv.className = `element ${element.category}`;
+        elementDiv.style.gridRow = element.row;
+        elementDiv.style.gridColumn = element.col;
+        elementDiv.innerHTML = `
+            <div class="number">${element.number}</div>
+            <div class="symbol">${element.symbol}</div>
+            <div class="name">${element.name}</div>
+        `;
+        
+        // Add click event to show details
+        elementDiv.addEventListener('click', () => {
+            showElementDetails(element.number);
+        });
+        
+        fragment.appendChild(elementDiv);
+    });
+    periodicTable.replaceChildren(fragment);
+}
+
+// Show element details, fetched with every field from /elements/search
+async function showElementDetails(number) {
+    const detailsElement = document.querySelector('.element-details');
+    if (!detailsElement) {
+        console.error("Element details container not found");
+        return;
+    }
+    
+    try {
+        const response = await fetch(`/elements/search?number=${number}`);
+        const result = await response.json();
+        if (result.error || !result.elements.length) {
+            throw new Error(result.error || `No element ${number}`);
+        }
+        const element = result.elements[0];
+        console.log("Showing details for:", element.name);
+        detailsElement.querySelector('.element-details-symbol').textContent = element.symbol;
+        detailsElement.querySelector('.element-details-symbol').className = `element-details-symbol ${element.category}`;
+        detailsElement.querySelector('.element-details-title').childNodes[1].textContent = element.name;
+        detailsElement.querySelector('.element-details-atomic-number').textContent = element.number;
+        detailsElement.querySelector('.element-details-atomic-mass').textContent = `${element.mass} u`;
+        detailsElement.querySelector('.element-details-electron-config').textContent = element.electron;
+        detailsElement.querySelector('.element-details-category').textContent = element.category.replace('-', ' ').replace(/\b\w/g, l => l.toUpperCase());
+        detailsElement.querySelector('.element-details-state').textContent = element.state;
+        detailsElement.querySelector('.element-details-melting').textContent = element.melting !== null ? `${element.melting} °C` : 'Unknown';
+        detailsElement.querySelector('.element-details-boiling').textContent = element.boiling !== null ? `${element.boiling} °C` : 'Unknown';
+        
+        detailsElement.style.display = 'block';
+    } catch (e) {
+        console.error("Error displaying element details:", e);
+    }
+}
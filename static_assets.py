@@ -0,0 +1,124 @@
+"""Fingerprinted, precompressed static assets
+
+Every file in static/ is read once at startup and served at
+/assets/<name>.<hash><ext>, the hash being of its content, so a URL never
+changes meaning and browsers may cache it forever.  gzip variants (and
+brotli, when the module is installed) are built up front, and a request
+just picks the smallest variant its Accept-Encoding allows.
+"""
+import gzip
+import hashlib
+import os
+
+try:
+    import brotli
+except ImportError:  # Optional; without it only gzip variants are built
+    brotli = None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+
+# Fingerprinted URLs change whenever their content does
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+# Bodies smaller than this gain nothing from compression
+MIN_COMPRESS_BYTES = 256
+
+CONTENT_TYPES = {
+    '.css': 'text/css; charset=utf-8',
+    '.html': 'text/html; charset=utf-8',
+    '.js': 'text/javascript; charset=utf-8',
+    '.json': 'application/json',
+    '.svg': 'image/svg+xml',
+}
+
+
+def accepted_encodings(header):
+    """The content codings an Accept-Encoding header allows, as a set"""
+    accepted = {'identity'}
+    for item in header.split(','):
+        coding, _, params = item.strip().lower().partition(';')
+        if not coding:
+            continue
+        q = params.strip()
+        if q.startswith('q='):
+            try:
+                if float(q[2:]) == 0:
+                    accepted.discard(coding)
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding)
+    if '*' in accepted:
+        accepted.update(('gzip', 'br'))
+    return accepted
+
+
+class Asset:
+    """A response body with its precompressed variants and ETag"""
+
+    def __init__(self, body, content_type, cache_control=IMMUTABLE):
+        self.content_type = content_type
+        self.cache_control = cache_control
+        self.etag = hashlib.sha256(body).hexdigest()[:16]
+        self.variants = {'identity': body}
+        if len(body) >= MIN_COMPRESS_BYTES:
+            self._add_variant('gzip', gzip.compress(body, compresslevel=9, mtime=0))
+            if brotli is not None:
+                self._add_variant('br', brotli.compress(body, quality=11))
+
+    def _add_variant(self, encoding, data):
+        if len(data) < len(self.variants['identity']):
+            self.variants[encoding] = data
+
+    def negotiate(self, accept_encoding):
+        """Return (encoding, body): the smallest variant the client accepts"""
+        accepted = accepted_encodings(accept_encoding or '')
+        encoding = min((e for e in self.variants if e in accepted),
+                       key=lambda e: len(self.variants[e]), default='identity')
+        return encoding, self.variants[encoding]
+
+    def headers(self, encoding='identity'):
+        """Response headers for one variant; each encoding has its own ETag"""
+        headers = {
+            'ETag': f'"{self.etag}"' if encoding == 'identity' else f'"{self.etag}-{encoding}"',
+            'Cache-Control': self.cache_control,
+            'Vary': 'Accept-Encoding',
+        }
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+        return headers
+
+    def matches(self, if_none_match):
+        """True if an If-None-Match header names any variant of this asset"""
+        for tag in (if_none_match or '').split(','):
+            tag = tag.strip().removeprefix('W/').strip('"')
+            if tag == '*' or tag.partition('-')[0] == self.etag:
+                return True
+        return False
+
+
+class StaticAssets:
+    """Every file in a directory, fingerprinted and compressed once"""
+
+    def __init__(self, directory=STATIC_DIR, prefix='/assets/'):
+        self.prefix = prefix
+        self._assets = {}
+        self._urls = {}
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if not os.path.isfile(path):
+                continue
+            stem, extension = os.path.splitext(name)
+            with open(path, 'rb') as f:
+                asset = Asset(f.read(), CONTENT_TYPES.get(extension, 'application/octet-stream'))
+            fingerprinted = f'{stem}.{asset.etag[:12]}{extension}'
+            self._assets[fingerprinted] = asset
+            self._urls[name] = prefix + fingerprinted
+
+    def url(self, name):
+        """The fingerprinted URL of a file in the directory, for templates"""
+        return self._urls[name]
+
+    def get(self, fingerprinted):
+        """The Asset served under a fingerprinted name, or None"""
+        return self._assets.get(fingerprinted)
@@ -0,0 +1,270 @@
+"""Process-local metrics in the Prometheus text format, and structured logging
+
+Metrics are counters, gauges and histograms keyed by label values.  Worker
+processes record into their own copy of the registry; drain() takes what
+they recorded since the last call and merge() adds it to the parent's, so
+one /metrics scrape covers every process.
+"""
+import bisect
+import contextlib
+import json
+import logging
+import random
+import threading
+import time
+
+# Latency buckets in seconds, from sub-millisecond parses to slow renders
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _label_key(labelnames, labels):
+    if set(labels) != set(labelnames):
+        raise ValueError(f"Expected labels {', '.join(labelnames)}")
+    return tuple(str(labels[name]) for name in labelnames)
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (value.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def header(self):
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(_Metric):
+    """A monotonically increasing count per label combination"""
+
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def drain(self):
+        with self._lock:
+            values, self._values = self._values, {}
+        return values
+
+    def merge(self, values):
+        with self._lock:
+            for key, amount in values.items():
+                self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+                    for key, value in sorted(self._values.items())]
+
+
+class Gauge(_Metric):
+    """A value that is set rather than accumulated; never drained"""
+
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = value
+
+    def drain(self):
+        return {}
+
+    def merge(self, values):
+        pass
+
+    samples = Counter.samples
+
+
+class Histogram(_Metric):
+    """Observations counted into cumulative buckets, with their sum"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _empty(self):
+        # One count per bucket plus +Inf, then the sum of the observations
+        return [0] * (len(self.buckets) + 1) + [0.0]
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = self._empty()
+            state[index] += 1
+            state[-1] += value
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        """Observe the seconds spent inside the with block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def drain(self):
+        with self._lock:
+            values, self._values = self._values, {}
+        return values
+
+    def merge(self, values):
+        with self._lock:
+            for key, other in values.items():
+                state = self._values.get(key)
+                if state is None:
+                    state = self._values[key] = self._empty()
+                for i, value in enumerate(other):
+                    state[i] += value
+
+    def samples(self):
+        lines = []
+        with self._lock:
+            items = sorted((key, list(state)) for key, state in self._values.items())
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), state):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, [('le', _format_value(bound))])
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(state[-1])}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class Registry:
+    """A named collection of metrics"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _add(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric '{metric.name}' is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._add(Counter(name, help_text, labelnames))
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self._add(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help_text, labelnames, buckets))
+
+    def drain(self):
+        """Take everything recorded since the last drain, leaving the metrics empty
+
+        The result is picklable and meant to be passed to merge() in another
+        process.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: values for metric in metrics if (values := metric.drain())}
+
+    def merge(self, snapshot):
+        """Add a drained snapshot into these metrics"""
+        with self._lock:
+            metrics = dict(self._metrics)
+        for name, values in snapshot.items():
+            if name in metrics:
+                metrics[name].merge(values)
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.header())
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with any fields passed as extra={'fields': {...}}"""
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SampleFilter(logging.Filter):
+    """Let through a random fraction of records below WARNING, and every other record"""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or random.random() < self.rate
+
+
+def configure_logging(name, level='WARNING', sample_rate=1.0, stream=None):
+    """Set up a logger that writes sampled JSON lines, or nothing at all
+
+    level is a logging level name, or 'OFF' to disable the logger entirely.
+    """
+    logger = logging.getLogger(name)
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    logger.propagate = False
+    if level.upper() == 'OFF':
+        logger.disabled = True
+        return logger
+
+    logger.disabled = False
+    logger.setLevel(level.upper())
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(JsonFormatter())
+    if sample_rate < 1:
+        handler.addFilter(SampleFilter(sample_rate))
+    logger.addHandler(handler)
+    return logger
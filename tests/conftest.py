@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The modules live at the top of the repository rather than in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Run web jobs inline; test_worker_pool.py starts its own pools
+os.environ.setdefault('WORKER_PROCESSES', '0')
@@ -0,0 +1,90 @@
+import asyncio
+import json
+from urllib.parse import urlencode
+
+import asgi_calculator
+import profiling
+import web_calculator
+
+
+def fetch(method, path, fields):
+    """Send one request through the ASGI app and return (status, headers, body)"""
+    body = urlencode(fields).encode('ascii')
+    scope = {
+        'type': 'http', 'method': method, 'path': path, 'query_string': b'',
+        'headers': [(b'content-type', b'application/x-www-form-urlencoded')],
+    }
+    if method == 'GET':
+        scope['query_string'], body = body, b''
+    sent = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(asgi_calculator.app(scope, receive, send))
+    headers = {name.decode('latin-1'): value.decode('latin-1') for name, value in sent[0]['headers']}
+    return sent[0]['status'], headers, b''.join(message.get('body', b'') for message in sent[1:])
+
+
+def call(method, path, fields):
+    """Send one request through the ASGI app and return (status, JSON body)"""
+    status, headers, body = fetch(method, path, fields)
+    return status, json.loads(body)
+
+
+def test_calculate():
+    assert call('POST', '/calculate', {'expression': '2^10+1'}) == (200, {'result': '1025', 'error': None})
+    status, response = call('POST', '/calculate', {'expression': '2^^'})
+    assert response['result'] is None and response['error']
+
+
+def test_preview():
+    fields = {'session': 'tab-1', 'expression': '2^10+1'}
+    assert call('POST', '/calculate/preview', fields) == (200, {'result': '1025', 'error': None})
+    fields['expression'] = '1' * 1000
+    assert 'limited' in call('POST', '/calculate/preview', fields)[1]['error']
+
+
+def test_is_cheap_does_not_evaluate():
+    assert asgi_calculator.is_cheap('2*sin(pi/4) + 1', 'float')
+    assert asgi_calculator.is_cheap('2 +', 'float')
+    assert not asgi_calculator.is_cheap('9^9^9^9', 'float')
+    assert not asgi_calculator.is_cheap('factorial(170)', 'float')
+    assert not asgi_calculator.is_cheap('2+2', 'exact')
+
+
+def test_plot():
+    status, response = call('GET', '/plot', {'function': 'sin(x)', 'format': 'points'})
+    assert status == 200
+    assert response['points']['x']
+
+
+def test_plot_errors_use_the_format_key():
+    status, response = call('GET', '/plot', {'function': 'sin(x', 'format': 'svg'})
+    assert status == 200
+    assert response['svg'] is None and response['error']
+
+
+def test_unknown_route_and_method():
+    assert call('GET', '/nowhere', {})[0] == 404
+    assert call('GET', '/calculate', {})[0] == 405
+
+
+def test_profiles(tmp_path, monkeypatch):
+    assert call('GET', '/profiles', {}) == (200, {'profiles': [], 'enabled': False})
+    assert call('GET', '/profiles/missing/pstats', {})[0] == 404
+    store = profiling.ProfileStore(str(tmp_path))
+    monkeypatch.setattr(web_calculator, 'profile_store', store)
+    with profiling.ProfileCapture() as capture:
+        sum(range(1000))
+    entry = store.save(capture, {'path': '/plot'})
+    status, response = call('GET', '/profiles', {})
+    assert response['enabled'] and response['profiles'][0]['id'] == entry['id']
+    status, headers, body = fetch('GET', response['profiles'][0]['downloads']['collapsed'], {})
+    assert status == 200 and headers['content-type'] == 'text/plain'
+    assert entry['id'] in headers['content-disposition']
+    assert body == open(store.path(entry['id'], 'collapsed'), 'rb').read()
+    assert call('GET', f"/profiles/{entry['id']}/nope", {})[0] == 404
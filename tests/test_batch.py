@@ -0,0 +1,33 @@
+import json
+
+import batch
+
+
+def run(tmp_path, command, lines, *options):
+    source = tmp_path / 'input.txt'
+    source.write_text('\n'.join(lines) + '\n')
+    output = tmp_path / 'output.jsonl'
+    status = batch.main([command, str(source), '--jobs', '0', '--output', str(output), *options])
+    return status, [json.loads(line) for line in output.read_text().splitlines()]
+
+
+def test_eval_keeps_input_order_and_skips_comments(tmp_path):
+    status, records = run(tmp_path, 'eval', [
+        '2^10', '# a comment', '', '1/0', '{"expression": "1/3", "mode": "exact"}'])
+    assert status == 0
+    assert [record['result'] if record['error'] is None else None for record in records] == ['1024', None, '1/3']
+    assert records[1]['error']
+
+
+def test_strict_fails_on_errors(tmp_path):
+    assert run(tmp_path, 'eval', ['1 +'], '--strict')[0] == 1
+
+
+def test_plot_writes_files(tmp_path):
+    output_dir = tmp_path / 'plots'
+    status, records = run(tmp_path, 'plot', ['sin(x)', '{"function": "x^2", "name": "square"}'],
+                          '--format', 'svg', '--output-dir', str(output_dir))
+    assert status == 0
+    files = sorted(path.name for path in output_dir.iterdir())
+    assert len(files) == 2 and 'square.svg' in files
+    assert all(record['file'].endswith('.svg') for record in records)
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from calculus import derivative, differentiate, simplify
+from expression import ExpressionError, compile_function, parse, to_source
+from sampling import central_difference
+
+
+@pytest.mark.parametrize('text', [
+    'x^3 - 2x',
+    'sin(x) * x',
+    'cos(x^2)',
+    'tan(x) / (1 + x^2)',
+    'exp(-x) * sqrt(x)',
+    'ln(x) + log10(x)',
+    'log(x^2, 2) + log(x, 10)',
+    '2^x + x^x',
+    'nthroot(x, 3)',
+    'abs(x - 1)',
+])
+def test_derivative_matches_central_difference(text):
+    f = compile_function(text)
+    tree = derivative(f.tree)
+    x = np.linspace(0.3, 1.4, 50)
+    exact = np.broadcast_to(compile_function(to_source(tree))(x=x), x.shape)
+    assert np.allclose(exact, central_difference(lambda x: f(x=x), x), rtol=1e-6, atol=1e-6)
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('x^3', '3 * x^2'),
+    ('5', '0'),
+    ('2x + 1', '2'),
+    ('-(-x)', '1'),
+    ('log(x, 2)', '1 / (x * ln(2))'),
+])
+def test_derivative_is_simplified(text, expected):
+    assert to_source(derivative(parse(text, ('x',)))) == expected
+
+
+def test_simplify_folds_numbers():
+    assert simplify(parse('0 * x + 1 * (2 + 3)', ('x',))) == ('num', 5)
+    assert simplify(parse('x^1 - 0', ('x',))) == ('var', 'x')
+
+
+def test_functions_without_a_rule():
+    with pytest.raises(ExpressionError):
+        differentiate(parse('factorial(x)', ('x',)))
+    with pytest.raises(ExpressionError):
+        differentiate(parse('nthroot(2, x)', ('x',)))
+    with pytest.raises(ExpressionError):
+        differentiate(parse('log(2, x)', ('x',)))
@@ -0,0 +1,108 @@
+import json
+import math
+
+import numpy as np
+import pytest
+
+import core
+
+
+@pytest.mark.parametrize('mode, precision, expected', [
+    ('float', None, 0.1 + 0.2),
+    ('exact', None, core.evaluate('3/10', 'exact')),
+    ('decimal', 5, core.evaluate('0.3', 'decimal', 5)),
+])
+def test_evaluate_modes(mode, precision, expected):
+    assert core.evaluate('0.1 + 0.2', mode, precision) == expected
+
+
+def test_evaluate_rejects_bad_modes():
+    with pytest.raises(ValueError):
+        core.evaluate('1', 'complex')
+    with pytest.raises(ValueError):
+        core.evaluate('1', 'decimal', 10 ** 6)
+
+
+@pytest.mark.parametrize('renderer', core.RENDERERS)
+def test_render_plot(renderer):
+    assert core.render_plot('sin(x)', -5, 5, 'png', renderer).startswith(b'\x89PNG')
+    assert core.render_plot('sin(x)', -5, 5, 'svg', renderer).startswith(b'<svg')
+
+
+def test_render_points():
+    points = json.loads(core.render_plot('x^2', -1, 1, 'points'))
+    assert len(points['x']) == len(points['y'])
+    assert points['y'][0] == pytest.approx(1)
+
+
+def test_sampling_options():
+    x_values, y_values = core.sample_function('x', 0, 1, 'uniform')
+    assert list(x_values) == list(y_values)
+    with pytest.raises(ValueError):
+        core.render_plot('x', output_format='gif')
+    with pytest.raises(ValueError):
+        core.render_plot('x', sampling='random')
+
+
+def test_render_series_and_solve():
+    assert core.render_series([('x', -1, 1), ('x^2', 0, 2)], 'svg').startswith(b'<svg')
+    assert core.solve('x^2 = 9').roots == pytest.approx([-3, 3])
+
+
+def test_parametric_polar_and_surface():
+    x_values, y_values = core.sample_polar('2', samples=50)
+    assert x_values ** 2 + y_values ** 2 == pytest.approx([4] * 50)
+    x_values, y_values, z = core.sample_surface('x*y', 0, 1, 0, 2, resolution=3)
+    assert z[2, 2] == pytest.approx(2)
+    assert core.render_surface('x*y', output_format='png', resolution=20).startswith(b'\x89PNG')
+    assert core.render_parametric('cos(t)', 'sin(t)', output_format='svg').startswith(b'<svg')
+    with pytest.raises(ValueError):
+        core.sample_parametric('t', 't', samples=10 ** 9)
+
+
+def test_render_points_with_overlays():
+    points = json.loads(core.render_plot('x^2', -1, 1, 'points', overlays=('derivative', 'integral', 'tangent'),
+                                         tangent_at=0.5))
+    derivative, integral, tangent = (overlay['y'] for overlay in points['overlays'])
+    assert derivative[0] == pytest.approx(-2)
+    assert derivative[-1] == pytest.approx(2)
+    assert integral[0] == 0
+    assert integral[-1] == pytest.approx(2 / 3, abs=1e-3)
+    assert tangent[-1] == pytest.approx(0.75)
+    with pytest.raises(ValueError, match='Unknown overlay'):
+        core.render_plot('x', overlays=('area',))
+
+
+def test_derivative_function_falls_back_to_numeric():
+    compiled, text = core.derivative_function('x^3')
+    assert text == '3 * x^2'
+    compiled, text = core.derivative_function('log(x, 2)')
+    assert compiled(x=4.0) == pytest.approx(1 / (4 * math.log(2)))
+    # No rule for a variable root: d/dx 8^(1/x) = -ln(8) 8^(1/x) / x^2
+    numeric, text = core.derivative_function('nthroot(8, x)')
+    assert text is None
+    assert numeric([3.0])[0] == pytest.approx(-math.log(8) * 2 / 9)
+    numeric, text = core.derivative_function('log(8, x)')
+    assert text is None
+    assert numeric([2.0])[0] == pytest.approx(-math.log(8) / (2 * math.log(2) ** 2))
+
+
+@pytest.mark.parametrize('text', ['(-8)^(1/3) + x', 'nthroot(-8, 3) + y', '4^(1/2) * x'])
+def test_complex_constants_agree_with_the_chunked_path(text, monkeypatch):
+    direct = core.sample_surface(text, -2, 2, -2, 2, resolution=8)[2]
+    monkeypatch.setattr(core, 'CHUNKED_MIN_POINTS', 1)
+    chunked = core.sample_surface(text, -2, 2, -2, 2, resolution=8)[2]
+    np.testing.assert_array_equal(direct, chunked)
+
+
+def test_dense_curves_and_default_surfaces_are_chunked(monkeypatch):
+    chunked = []
+    monkeypatch.setattr(core.EVAL_PEAK_BYTES, 'observe', lambda value, kind: chunked.append(kind))
+    samples = core.CHUNKED_MIN_POINTS
+    x, y = core.sample_parametric('cos(3t)', 'sin(2t) * exp(-t/10)', samples=samples)
+    t = np.linspace(0, 2 * math.pi, samples)
+    np.testing.assert_allclose(x, np.cos(3 * t))
+    np.testing.assert_allclose(y, np.sin(2 * t) * np.exp(-t / 10))
+    x, y, z = core.sample_surface('sin(x) * cos(y)')
+    np.testing.assert_allclose(z, np.sin(x) * np.cos(y)[:, None])
+    assert chunked == ['parametric', 'parametric', 'surface']
@@ -0,0 +1,191 @@
+import decimal
+import math
+from fractions import Fraction
+
+import numpy as np
+import pytest
+
+from expression import (
+    ExpressionCache, ExpressionError, ParseState, compile_expression, compile_function, get_backend, parse,
+    to_source, token_groups, tokenize,
+)
+
+
+def test_tokenize_splits_implicit_products():
+    assert tokenize('2sin(pi/4)') == [
+        ('number', '2', 0), ('name', 'sin', 1), ('op', '(', 4), ('name', 'pi', 5),
+        ('op', '/', 7), ('number', '4', 8), ('op', ')', 9),
+    ]
+    assert [token[1] for token in tokenize('2xy', ('x', 'y'))] == ['2', 'x', 'y']
+
+
+def test_tokenize_rejects_unknown_characters():
+    with pytest.raises(ExpressionError, match="position 1"):
+        tokenize('5!')
+
+
+@pytest.mark.parametrize('text, value', [
+    ('2^10+1', 1025),
+    ('2 + 3 * 4', 14),
+    ('(2 + 3) * 4', 20),
+    ('-3^2', -9),
+    ('2^-1', 0.5),
+    ('2^3^2', 512),
+    ('50%', 0.5),
+    ('2pi', 2 * math.pi),
+    ('2sin(pi/6)', 1.0),
+    ('sqrt(16)', 4.0),
+    ('nthroot(27, 3)', 3.0),
+    ('log10(1000)', 3.0),
+    ('log(8, 2)', 3.0),
+    ('ln(e^2)', 2.0),
+    ('factorial(5)', 120),
+])
+def test_scalar_values(text, value):
+    assert compile_expression(text)() == pytest.approx(value)
+
+
+@pytest.mark.parametrize('text', [
+    '2 * (x + 1)^2',
+    '-x^2 + 3 * x - 1',
+    'sin(x) / (1 + cos(x))',
+    '2^x^2',
+    '(x - 1) * (x + 1) / x',
+])
+def test_to_source_round_trips(text):
+    tree = parse(text, ('x',))
+    assert parse(to_source(tree), ('x',)) == tree
+
+
+@pytest.mark.parametrize('text', ['2^^3', '(1 + 2', '1 +', 'sin', ')', 'sin(1, 2)', 'ln(8, 2)', 'nthroot(8)',
+                                  'log(8, 2, 3)'])
+def test_syntax_errors(text):
+    with pytest.raises(ExpressionError):
+        parse(text)
+
+
+def test_unknown_names_and_missing_values():
+    with pytest.raises(ExpressionError, match="Unknown name 'x'"):
+        parse('x + 1')
+    compiled = compile_expression('x * y', variables=('x', 'y'))
+    assert compiled(x=2, y=3) == 6
+    with pytest.raises(ExpressionError, match='Missing value for y'):
+        compiled(x=2)
+
+
+def test_compile_function_accepts_y_alone():
+    f = compile_function('y^2')
+    assert f(x=np.array([1.0, 2.0, 3.0])).tolist() == [1.0, 4.0, 9.0]
+    with pytest.raises(ExpressionError):
+        compile_function('x + y')
+
+
+def test_vector_backend_matches_scalar():
+    text = 'sin(x)^2 + exp(-x/4) * sqrt(abs(x)) - log(x^2 + 1)'
+    scalar = compile_expression(text, 'scalar', ('x',))
+    vector = compile_function(text)
+    x = np.linspace(-10, 10, 101)
+    expected = [scalar(x=value) for value in x]
+    assert np.allclose(vector(x=x), expected)
+
+
+def test_exact_backend_keeps_integers_and_fractions():
+    assert compile_expression('4/2', 'exact')() == 2
+    assert isinstance(compile_expression('4/2', 'exact')(), int)
+    assert compile_expression('1/3 + 1/6', 'exact')() == Fraction(1, 2)
+    assert compile_expression('factorial(999)/factorial(998)', 'exact')() == 999
+    assert compile_expression('2^100', 'exact')() == 2 ** 100
+
+
+def test_decimal_backend_uses_its_precision():
+    value = compile_expression('1/3', 'decimal:50')()
+    assert isinstance(value, decimal.Decimal)
+    assert str(value) == '0.' + '3' * 50
+    assert abs(compile_expression('sin(pi/6)', 'decimal:40')() - decimal.Decimal('0.5')) < decimal.Decimal('1e-38')
+
+
+@pytest.mark.parametrize('text, mode, message', [
+    ('10^100000', 'exact', 'digits'),
+    ('10^200000', 'exact', 'Exponent'),
+    ('(10^3000)*(10^3000)', 'exact', 'digits'),
+    ('1/3^3000 + 1/11^3000', 'exact', 'digits'),
+    ('factorial(1001)', 'exact', 'too large'),
+    ('sin(10^2000)', 'decimal:28', 'working digits'),
+])
+def test_cost_limits(text, mode, message):
+    with pytest.raises(ExpressionError, match=message):
+        compile_expression(text, mode)()
+
+
+def test_division_by_zero():
+    for mode in ('scalar', 'exact'):
+        with pytest.raises(ZeroDivisionError):
+            compile_expression('1/0', mode)()
+
+
+def test_unknown_mode():
+    with pytest.raises(ExpressionError):
+        compile_expression('1', 'complex')
+
+
+def test_expression_cache_counts_hits_and_evicts():
+    cache = ExpressionCache(maxsize=2)
+    first = cache.compile_expression('1 + 2')
+    assert cache.compile_expression(' 1  +   2 ') is first
+    cache.compile_expression('3 * 4')
+    cache.compile_expression('5 - 6')
+    assert cache.stats() == {'size': 2, 'maxsize': 2, 'hits': 1, 'misses': 3, 'evictions': 1}
+    assert cache.compile_expression('1 + 2') is not first
+
+
+def test_expression_cache_can_be_disabled():
+    cache = ExpressionCache(maxsize=0)
+    assert cache.compile_function('x^2') is not cache.compile_function('x^2')
+    assert cache.stats()['size'] == 0
+
+
+@pytest.mark.parametrize('text', ['2^10 + 1', '-(3 - 4)^2 * 2', '2sin(pi/4)', '50% * 8', '1/3 + 1/6', 'log(8, 2)'])
+def test_parse_state_matches_full_parse(text):
+    state = ParseState(get_backend('exact'))
+    for _, tokens in token_groups(text):
+        for token in tokens:
+            state = state.feed(token)
+    assert state.finish()[1] == compile_expression(text, 'exact')()
+
+
+def test_parse_state_checks_argument_counts():
+    state = ParseState(get_backend('scalar'))
+    for _, tokens in token_groups('sin(1, 2) + 1'):
+        for token in tokens:
+            state = state.feed(token)
+    with pytest.raises(ExpressionError, match="'sin' takes 1 argument"):
+        state.finish()
+
+
+@pytest.mark.parametrize('mode', ['scalar', 'exact', 'decimal:30'])
+def test_argument_counts_are_checked_in_every_mode(mode):
+    assert float(compile_expression('log(8, 2)', mode)()) == pytest.approx(3)
+    with pytest.raises(ExpressionError, match="'sqrt' takes 1 argument, not 2"):
+        compile_expression('sqrt(4, 5)', mode)
+    with pytest.raises(ExpressionError, match="'log' takes 1 or 2 arguments, not 3"):
+        compile_expression('log(8, 2, 3)', mode)
+
+
+def test_log_with_a_base():
+    assert compile_expression('log(8, 2)', 'decimal:30')() == 3
+    assert compile_function('log(x, 2)')(x=np.array([4.0, 8.0])).tolist() == pytest.approx([2, 3])
+
+
+@pytest.mark.parametrize('mode', ['scalar', 'exact', 'decimal:30'])
+def test_roots_of_negatives_are_real_or_a_domain_error(mode):
+    assert float(compile_expression('nthroot(-8, 3)', mode)()) == pytest.approx(-2)
+    for text in ('nthroot(-4, 2)', '(-8)^(1/3)', 'nthroot(-8, 1.5)'):
+        with pytest.raises(ValueError, match='math domain error'):
+            compile_expression(text, mode)()
+
+
+def test_vector_roots_of_negatives_are_real_or_nan():
+    x = np.array([-8.0, 8.0])
+    assert compile_function('nthroot(x, 3)')(x=x).tolist() == pytest.approx([-2, 2])
+    assert np.isnan(compile_function('nthroot(x, 2)')(x=x)[0])
+    assert np.isnan(compile_expression('nthroot(-4, 2)', 'vector')())
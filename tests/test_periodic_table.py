@@ -0,0 +1,40 @@
+import pytest
+
+from periodic_table import FIELDS, ElementTable, parse_fields, table
+
+
+def symbols(positions):
+    return [table().columns['symbol'][i] for i in positions]
+
+
+def test_lookups():
+    elements = table()
+    assert symbols(elements.search(symbol='fe')) == ['Fe']
+    assert symbols(elements.search(number=6)) == ['C']
+    assert symbols(elements.name_prefix('car')) == ['C']
+    assert symbols(elements.in_range('number', 1, 3)) == ['H', 'He', 'Li']
+    assert 'noble-gas' in elements.categories
+
+
+def test_search_combines_criteria():
+    noble = table().search(category='noble-gas', ranges={'number': (1, 10)})
+    assert symbols(noble) == ['He', 'Ne']
+    assert table().search(symbol='Fe', number=6) == []
+    assert len(table().search()) == table().size
+
+
+def test_records_pick_fields_and_map_nan_to_none():
+    elements = ElementTable(FIELDS, [
+        [2, 'He', 'Helium', 'noble-gas', 4.0, '1s2', 'Gas', -272.2, None, 1, 18],
+        [1, 'H', 'Hydrogen', 'nonmetal', 1.0, '1s1', 'Gas', -259.1, -252.9, 1, 1],
+    ])
+    assert elements.records([0, 1], ('symbol', 'boiling')) == [
+        {'symbol': 'H', 'boiling': -252.9}, {'symbol': 'He', 'boiling': None}]
+    assert elements.in_range('boiling') == [0]
+
+
+def test_parse_fields():
+    assert parse_fields('') == FIELDS
+    assert parse_fields('symbol, mass') == ('symbol', 'mass')
+    with pytest.raises(ValueError, match='Unknown field'):
+        parse_fields('symbol,colour')
@@ -0,0 +1,39 @@
+from plot_cache import PlotCache, make_key
+
+
+def test_make_key_is_stable_and_distinct():
+    assert make_key('sin(x)', -10, 10, 'png') == make_key('sin(x)', -10, 10, 'png')
+    assert make_key('sin(x)', -10, 10, 'png') != make_key('sin(x)', -10, 10, 'svg')
+    assert make_key('ab', 'c') != make_key('a', 'bc')
+
+
+def test_lru_by_entries_and_bytes():
+    cache = PlotCache(max_bytes=10, max_entries=2)
+    cache.put('a', b'1234')
+    cache.put('b', b'5678')
+    assert cache.get('a') == b'1234'
+    cache.put('c', b'9')
+    # 'b' was least recently used
+    assert cache.get('b') is None
+    cache.put('d', b'123456789')
+    assert cache.stats()['bytes'] <= 10
+    cache.put('huge', b'x' * 11)
+    assert cache.get('huge') is None
+    assert cache.stats()['hits'] == 1
+
+
+def test_spills_evictions_to_disk(tmp_path):
+    cache = PlotCache(max_entries=1, spill_dir=str(tmp_path))
+    cache.put('a', b'first')
+    cache.put('b', b'second')
+    assert cache.get('a') == b'first'
+    stats = cache.stats()
+    assert stats['disk_hits'] == 1
+    assert stats['evictions'] >= 1
+
+
+def test_prunes_the_spill_directory(tmp_path):
+    cache = PlotCache(max_entries=1, spill_dir=str(tmp_path), max_disk_bytes=10)
+    for key in 'abcde':
+        cache.put(key, b'12345')
+    assert sum(path.stat().st_size for path in tmp_path.glob('*.bin')) <= 10
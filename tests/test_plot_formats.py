@@ -0,0 +1,21 @@
+import json
+import xml.etree.ElementTree as ElementTree
+
+import numpy as np
+
+from plot_formats import encode_points, render_svg
+
+
+def test_encode_points_uses_null_for_gaps():
+    data = json.loads(encode_points(np.array([0, 1.5, 2]), np.array([1, np.nan, np.inf])))
+    assert data == {'x': [0, 1.5, 2], 'y': [1, None, None]}
+
+
+def test_render_svg_is_well_formed_and_escapes_the_title():
+    x = np.linspace(-5, 5, 50)
+    y = np.sin(x)
+    y[25] = np.nan
+    svg = render_svg(x, y, 'f(x) = x<1 & x>0')
+    root = ElementTree.fromstring(svg)
+    assert root.get('width') == '800'
+    assert 'f(x) = x<1 & x>0' in ''.join(root.itertext())
@@ -0,0 +1,66 @@
+import pytest
+
+from expression import ExpressionError, compile_expression
+from preview import PreviewSession, PreviewSessions, common_prefix_length
+
+
+def test_common_prefix_length():
+    assert common_prefix_length('2+3', '2+34') == 3
+    assert common_prefix_length('2+34', '2+3') == 3
+    assert common_prefix_length('12*5', '13*5') == 1
+    assert common_prefix_length('', 'x') == 0
+
+
+def test_typing_matches_a_full_parse():
+    session = PreviewSession('exact')
+    text = '2^10 + 3*(4 - 1/3) - 12'
+    for end in range(1, len(text) + 1):
+        prefix = text[:end]
+        try:
+            expected = compile_expression(prefix, 'exact')()
+        except (ExpressionError, ZeroDivisionError) as e:
+            with pytest.raises(type(e)):
+                session.update(prefix)
+        else:
+            assert session.update(prefix) == expected
+
+
+def test_editing_reuses_the_unchanged_prefix():
+    session = PreviewSession('scalar')
+    session.update('1 + 2 + 3 + 4 + 5 + 6')
+    assert session.update('1 + 2 + 3 + 4 + 5 + 60') == 75
+    assert session.reused > session.parsed
+    # A change near the start re-parses almost everything
+    assert session.update('9 + 2 + 3 + 4 + 5 + 60') == 83
+    assert session.reused == 0
+
+
+def test_a_bad_character_keeps_earlier_states():
+    session = PreviewSession('scalar')
+    with pytest.raises(ExpressionError):
+        session.update('1 + 2 $')
+    assert session.update('1 + 2') == 3
+
+
+def test_length_limit():
+    session = PreviewSession('scalar', max_length=10)
+    with pytest.raises(ValueError, match='limited to 10'):
+        session.update('1+' * 6 + '1')
+
+
+def test_sessions_are_separate_and_bounded():
+    sessions = PreviewSessions(maxsize=2)
+    assert sessions.preview('a', '1 + 1', 'scalar') == 2
+    assert sessions.preview('b', '2 * 3', 'scalar') == 6
+    assert sessions.preview('a', '1 + 12', 'scalar') == 13
+    sessions.preview('c', '4', 'scalar')
+    stats = sessions.stats()
+    assert stats['sessions'] == 2
+    assert stats['evictions'] == 1
+    assert stats['updates'] == 4
+
+
+def test_changing_mode_starts_a_new_session():
+    sessions = PreviewSessions()
+    assert sessions.preview('a', '1/4', 'scalar') == 0.25
+    assert str(sessions.preview('a', '1/4', 'exact')) == '1/4'
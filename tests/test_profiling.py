@@ -0,0 +1,45 @@
+import math
+import pstats
+
+import profiling
+
+
+def busy():
+    return sum(math.sqrt(i) for i in range(20000))
+
+
+def test_capture_merges_stats_from_elsewhere():
+    with profiling.ProfileCapture() as capture:
+        assert profiling.current() is capture
+        busy()
+        result, raw = profiling.profiled(math.factorial, 200)
+        capture.add(raw)
+    assert profiling.current() is None
+    assert result == math.factorial(200)
+    assert capture.elapsed > 0
+    names = {func[2] for func in capture.stats().stats}
+    assert 'busy' in names
+
+
+def test_collapsed_stacks():
+    with profiling.ProfileCapture() as capture:
+        busy()
+    folded = profiling.collapsed_stacks(capture.stats())
+    lines = folded.splitlines()
+    assert lines
+    assert all(int(line.rsplit(' ', 1)[1]) > 0 for line in lines)
+    assert any('(busy)' in line for line in lines)
+
+
+def test_store_keeps_the_latest_entries(tmp_path):
+    store = profiling.ProfileStore(str(tmp_path), max_entries=2)
+    ids = []
+    for route in ('/a', '/b', '/c'):
+        with profiling.ProfileCapture() as capture:
+            busy()
+        ids.append(store.save(capture, {'route': route})['id'])
+    assert [entry['route'] for entry in store.entries()] == ['/c', '/b']
+    assert store.get(ids[0]) is None
+    pstats.Stats(store.path(ids[2], 'pstats'))
+    # A new store reads the index back
+    assert [entry['id'] for entry in profiling.ProfileStore(str(tmp_path)).entries()] == ids[:0:-1]
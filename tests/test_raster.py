@@ -0,0 +1,50 @@
+import struct
+import zlib
+
+import numpy as np
+import pytest
+
+from raster import data_limits, format_tick, nice_ticks, render_png
+
+
+def read_png(data):
+    """Return (width, height, filtered rows) of an 8-bit truecolor PNG"""
+    assert data.startswith(b'\x89PNG\r\n\x1a\n')
+    width, height = struct.unpack('>II', data[16:24])
+    idat = b''
+    position = 8
+    while position < len(data):
+        length, kind = struct.unpack('>I4s', data[position:position + 8])
+        if kind == b'IDAT':
+            idat += data[position + 8:position + 8 + length]
+        position += 12 + length
+    raw = np.frombuffer(zlib.decompress(idat), dtype=np.uint8).reshape(height, 1 + width * 3)
+    return width, height, raw
+
+
+def test_nice_ticks():
+    ticks, step = nice_ticks(-10, 10)
+    assert step == 5
+    assert ticks.tolist() == [-10, -5, 0, 5, 10]
+    ticks, step = nice_ticks(0, 0.3)
+    assert step == pytest.approx(0.05)
+
+
+def test_format_tick():
+    assert format_tick(2.5, 0.5) == '2.5'
+    assert format_tick(-0.0, 1) == '0'
+    assert format_tick(2e7, 1e6) == '2.0e+07'
+
+
+def test_data_limits():
+    assert data_limits(np.array([0.0, 10.0, np.nan])) == pytest.approx((-0.5, 10.5))
+    assert data_limits(np.array([3.0, 3.0])) == (2.0, 4.0)
+    assert data_limits(np.array([np.nan])) == (-1.0, 1.0)
+
+
+def test_render_png_size_and_gaps():
+    x = np.linspace(-5, 5, 200)
+    y = np.sin(x)
+    y[100] = np.nan
+    width, height, _ = read_png(render_png(x, y, width=400, height=300))
+    assert (width, height) == (400, 300)
@@ -0,0 +1,41 @@
+import numpy as np
+
+from sampling import adaptive_sample, grid_sample, parametric_sample, polar_sample, uniform_sample
+
+
+def test_uniform_sample_marks_undefined_points():
+    x, y = uniform_sample(lambda x: np.log(x), -1, 1, 5)
+    assert x.tolist() == [-1, -0.5, 0, 0.5, 1]
+    assert np.isnan(y[:3]).all()
+    assert np.isfinite(y[3:]).all()
+
+
+def test_adaptive_sample_is_sparse_on_lines_and_dense_on_curves():
+    x_line, _ = adaptive_sample(lambda x: 2 * x + 1, -10, 10)
+    x_wave, y_wave = adaptive_sample(np.sin, -10, 10)
+    assert x_line.size < x_wave.size
+    assert x_wave[0] == -10 and x_wave[-1] == 10
+    assert (np.diff(x_wave) > 0).all()
+    assert np.allclose(y_wave, np.sin(x_wave))
+
+
+def test_adaptive_sample_stays_within_budget():
+    x, _ = adaptive_sample(lambda x: np.sin(1 / x), -1, 1, max_evaluations=500)
+    assert x.size <= 500
+
+
+def test_adaptive_sample_breaks_asymptotes():
+    x, y = adaptive_sample(lambda x: 1 / x, -1, 1)
+    gaps = np.flatnonzero(np.isnan(y))
+    assert gaps.size
+    assert np.abs(x[gaps]).min() < 0.01
+
+
+def test_parametric_polar_and_grid():
+    x, y = parametric_sample(np.cos, np.sin, 0, 2 * np.pi, 100)
+    assert np.allclose(x ** 2 + y ** 2, 1)
+    x, y = polar_sample(lambda theta: 2 + 0 * theta, 0, 2 * np.pi, 100)
+    assert np.allclose(np.hypot(x, y), 2)
+    x, y, z = grid_sample(lambda x, y: x - y, 0, 1, 0, 2, 5)
+    assert z.shape == (5, 5)
+    assert z[4, 0] == x[0] - y[4]
@@ -0,0 +1,75 @@
+import math
+
+import numpy as np
+import pytest
+
+from expression import compile_function
+from solver import equation_to_function, polynomial_coefficients, solve, solve_numeric, solve_polynomial
+
+
+def coefficients(text):
+    return polynomial_coefficients(compile_function(text).tree)
+
+
+def test_equation_to_function():
+    assert compile_function(equation_to_function('x^2 = 9'))(x=np.array([3.0]))[0] == 0
+
+
+def test_polynomial_coefficients_lowest_power_first():
+    assert list(coefficients('(x - 1)*(x + 2)')) == [-2, 1, 1]
+    assert list(coefficients('x^3/2 + 1')) == [1, 0, 0, 0.5]
+    assert coefficients('sin(x)') is None
+    assert coefficients('x^0.5') is None
+
+
+def test_cancelled_terms_are_dropped():
+    # 0.1*3 - 0.3 leaves rounding noise, not a real x^2 term
+    assert solve('0.1*3*x^2 - 0.3*x^2 + x - 2').roots == [2.0]
+    assert len(coefficients('x^2 - x^2 + 1')) == 1
+
+
+def test_tiny_leading_coefficient_is_kept():
+    solution = solve('1e-20*x^2 - 1')
+    assert solution.method == 'polynomial'
+    assert solution.roots == pytest.approx([-1e10, 1e10])
+
+
+@pytest.mark.parametrize('equation, roots', [
+    ('x^2 = 4', [-2, 2]),
+    ('x^3 - 6x^2 + 11x - 6', [1, 2, 3]),
+    ('(x - 1)^2', [1]),
+    ('2x + 1', [-0.5]),
+])
+def test_polynomial_roots(equation, roots):
+    solution = solve(equation)
+    assert solution.method == 'polynomial'
+    assert solution.roots == pytest.approx(roots)
+
+
+def test_complex_roots():
+    solution = solve('x^2 + 1')
+    assert solution.roots == []
+    assert sorted(solution.complex_roots, key=lambda z: z.imag) == pytest.approx([-1j, 1j])
+
+
+def test_solve_polynomial_of_a_constant():
+    assert solve_polynomial([3.0]).roots == []
+
+
+def test_numeric_sign_changes():
+    solution = solve('sin(x) = 0.5', -10, 10)
+    assert solution.method == 'numeric'
+    expected = sorted(x for k in range(-2, 2) for x in (math.pi / 6 + 2 * k * math.pi,
+                                                         5 * math.pi / 6 + 2 * k * math.pi)
+                      if -10 <= x <= 10)
+    assert solution.roots == pytest.approx(expected)
+
+
+def test_numeric_skips_poles_and_finds_touching_zeros():
+    assert solve_numeric(lambda x: np.tan(x), -1, 2).roots == pytest.approx([0], abs=1e-9)
+    assert solve('cos(x) + 1', 0, 4).roots == pytest.approx([math.pi], abs=1e-6)
+
+
+def test_numeric_interval_must_be_ordered():
+    with pytest.raises(ValueError):
+        solve('sin(x)', 1, -1)
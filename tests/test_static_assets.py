@@ -0,0 +1,35 @@
+import gzip
+
+from static_assets import Asset, StaticAssets, accepted_encodings
+
+
+def test_accepted_encodings():
+    assert accepted_encodings('gzip, br;q=0') == {'identity', 'gzip'}
+    assert accepted_encodings('') == {'identity'}
+    assert {'gzip', 'br'} <= accepted_encodings('*')
+
+
+def test_asset_negotiates_the_smallest_accepted_variant():
+    body = b'calculator ' * 100
+    asset = Asset(body, 'text/plain')
+    encoding, data = asset.negotiate('gzip')
+    assert encoding == 'gzip'
+    assert gzip.decompress(data) == body
+    assert asset.negotiate(None) == ('identity', body)
+    assert asset.headers('gzip')['Content-Encoding'] == 'gzip'
+    assert asset.matches(asset.headers('gzip')['ETag'])
+    assert not asset.matches('"other"')
+
+
+def test_small_bodies_are_not_compressed():
+    assert list(Asset(b'tiny', 'text/plain').variants) == ['identity']
+
+
+def test_fingerprinted_urls(tmp_path):
+    (tmp_path / 'app.js').write_text('console.log(1)')
+    assets = StaticAssets(str(tmp_path))
+    url = assets.url('app.js')
+    assert url.startswith('/assets/app.') and url.endswith('.js')
+    assert assets.get(url[len('/assets/'):]).content_type.startswith('text/javascript')
+    (tmp_path / 'app.js').write_text('console.log(2)')
+    assert StaticAssets(str(tmp_path)).url('app.js') != url
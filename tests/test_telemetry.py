@@ -0,0 +1,48 @@
+import io
+import json
+
+import pytest
+
+from telemetry import Registry, configure_logging
+
+
+def test_counter_and_histogram_render():
+    registry = Registry()
+    requests = registry.counter('requests_total', 'Requests', ('route',))
+    seconds = registry.histogram('seconds', 'Seconds', buckets=(0.1, 1))
+    requests.inc(route='/a')
+    requests.inc(2, route='/a')
+    seconds.observe(0.05)
+    seconds.observe(0.5)
+    text = registry.render()
+    assert 'requests_total{route="/a"} 3' in text
+    assert 'seconds_bucket{le="0.1"} 1' in text
+    assert 'seconds_bucket{le="+Inf"} 2' in text
+    assert 'seconds_count 2' in text
+
+
+def test_drain_and_merge_move_values_between_registries():
+    worker, parent = Registry(), Registry()
+    worker_jobs = worker.counter('jobs_total', 'Jobs')
+    parent_jobs = parent.counter('jobs_total', 'Jobs')
+    worker_jobs.inc(4)
+    parent.merge(worker.drain())
+    assert parent_jobs.value() == 4
+    assert worker_jobs.value() == 0
+
+
+def test_duplicate_names_are_rejected():
+    registry = Registry()
+    registry.gauge('up', 'Up')
+    with pytest.raises(ValueError):
+        registry.gauge('up', 'Up')
+
+
+def test_json_logging():
+    stream = io.StringIO()
+    log = configure_logging('tests.telemetry', 'INFO', stream=stream)
+    log.info("Rendered", extra={'fields': {'route': '/plot'}})
+    entry = json.loads(stream.getvalue())
+    assert entry['message'] == 'Rendered'
+    assert entry['route'] == '/plot'
+    assert configure_logging('tests.telemetry', 'OFF').disabled
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from expression import ExpressionError, compile_expression, compile_function
+from vector_program import CHUNK_SIZE, VectorProgram
+
+
+@pytest.mark.parametrize('text', [
+    'x',
+    'x*x + x*x',
+    'sin(x)^2 + cos(x)^2 - x/3',
+    'sqrt(abs(x)) * exp(-x^2/50)',
+    'nthroot(x, 3) + nthroot(x, 2)',
+    'log(x) + 1/x',
+    'log(x, 2) + log(x*x, x + 11)',
+    '2^3 + pi',
+])
+def test_matches_compiled_expression(text):
+    compiled = compile_function(text)
+    program = VectorProgram(compiled.tree)
+    x = np.linspace(-10, 10, 3 * CHUNK_SIZE + 7)
+    with np.errstate(all='ignore'):
+        expected = np.broadcast_to(compiled(x=x), x.shape)
+    assert np.allclose(program(x=x), expected, equal_nan=True)
+
+
+def test_broadcasts_two_variables_across_threads():
+    compiled = compile_expression('sin(x) * cos(y) + x*y', 'vector', ('x', 'y'))
+    program = VectorProgram(compiled.tree)
+    x = np.linspace(-3, 3, 500)[np.newaxis, :]
+    y = np.linspace(-2, 2, 400)[:, np.newaxis]
+    z = program(x=x, y=y, threads=4)
+    assert z.shape == (400, 500)
+    assert np.allclose(z, compiled(x=x, y=y))
+    assert program.stats['chunks'] > 1
+    assert program.stats['threads'] > 1
+
+
+def test_writes_into_out():
+    program = VectorProgram(compile_function('x + 1').tree)
+    x = np.arange(5.0)
+    out = np.empty(5)
+    assert program(x=x, out=out) is out
+    assert out.tolist() == [1, 2, 3, 4, 5]
+    with pytest.raises(ValueError):
+        program(x=x, out=np.empty(4))
+
+
+def test_errors():
+    program = VectorProgram(compile_function('x + 1').tree)
+    with pytest.raises(ExpressionError, match='Missing value for x'):
+        program()
+    with pytest.raises(ExpressionError, match='not supported'):
+        VectorProgram(compile_function('factorial(x)').tree)
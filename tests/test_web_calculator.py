@@ -0,0 +1,181 @@
+import json
+
+import pytest
+
+import web_calculator
+
+
+@pytest.fixture
+def client():
+    web_calculator.plot_cache.clear()
+    return web_calculator.app.test_client()
+
+
+def test_calculate(client):
+    assert client.post('/calculate', data={'expression': '2^10+1'}).get_json() == {
+        'result': '1025', 'error': None}
+    response = client.post('/calculate', data={'expression': '2^^3'}).get_json()
+    assert response['result'] is None
+    assert response['error']
+
+
+def test_calculate_modes(client):
+    assert client.post('/calculate', data={'expression': '1/3+1/6', 'mode': 'exact'}).get_json()['result'] == '1/2'
+    response = client.post('/calculate', data={'expression': '1/3', 'mode': 'decimal', 'precision': '5'})
+    assert response.get_json()['result'] == '0.33333'
+    response = client.post('/calculate', data={'expression': '10^100000', 'mode': 'exact'}).get_json()
+    assert response['result'] is None
+    assert 'limit' in response['error']
+    assert client.post('/calculate', data={'expression': '1', 'mode': 'complex'}).get_json()['error']
+    for mode in ('float', 'decimal', 'exact'):
+        response = client.post('/calculate', data={'expression': 'nthroot(-4, 2)', 'mode': mode}).get_json()
+        assert response['result'] is None
+        assert 'domain' in response['error']
+
+
+def test_plot(client):
+    assert client.post('/plot', data={'function': 'sin(x)'}).get_json()['image']
+    response = client.post('/plot', data={'function': 'sin(x'}).get_json()
+    assert response['image'] is None
+    assert response['error']
+
+
+def test_plot_etag(client):
+    query = {'function': 'x^2'}
+    first = client.get('/plot', query_string=query)
+    etag = first.headers['ETag']
+    assert 'max-age' in first.headers['Cache-Control']
+    assert client.get('/plot', query_string=query, headers={'If-None-Match': etag}).status_code == 304
+    assert client.get('/plot', query_string={'function': 'x^3'}).headers['ETag'] != etag
+
+
+def test_plot_renderers(client):
+    for renderer in ('matplotlib', 'raster'):
+        response = client.get('/plot', query_string={'function': 'sin(x)', 'renderer': renderer})
+        assert response.get_json()['image']
+    response = client.get('/plot', query_string={'function': 'sin(x)', 'renderer': 'ascii'})
+    assert response.get_json()['error'] == "Unknown renderer 'ascii'"
+
+
+@pytest.mark.parametrize('output_format, field', [('png', 'image'), ('svg', 'svg'), ('points', 'points')])
+def test_plot_formats_and_errors_share_a_key(client, output_format, field):
+    response = client.get('/plot', query_string={'function': 'sin(x)', 'format': output_format})
+    assert response.get_json()[field]
+    response = client.get('/plot', query_string={'function': 'sin(x', 'format': output_format}).get_json()
+    assert set(response) == {field, 'error'}
+    assert response[field] is None and response['error']
+
+
+def test_calculate_batch(client):
+    response = client.post('/calculate/batch', json=['1+1', '2^^', 3]).get_json()
+    assert response['error'] is None
+    assert [result['result'] for result in response['results']] == ['2', None, None]
+    assert response['results'][2]['error'] == 'Expression must be a string'
+    assert client.post('/calculate/batch', json={'nothing': []}).get_json()['error']
+
+
+def test_plot_batch(client):
+    response = client.post('/plot/batch', json={'functions': ['x', 'sin(', 'x^2'], 'format': 'points'}).get_json()
+    points = [result['points'] for result in response['results']]
+    assert points[0] and points[2]
+    assert points[1] is None and response['results'][1]['error']
+    shared = client.post('/plot/batch', json={'functions': ['x', 'x^2'], 'format': 'svg', 'shared': True})
+    assert shared.get_json()['svg'].startswith('<svg')
+
+
+def test_solve(client):
+    response = client.post('/solve', data={'equation': 'x^2 = 4'}).get_json()
+    assert response['roots'] == [-2, 2]
+    assert response['method'] == 'polynomial'
+    assert client.post('/solve', data={'equation': 'x^2 ='}).get_json()['error']
+
+
+def stream_events(response):
+    """Split a server-sent event stream into (event, data) pairs"""
+    events = []
+    for block in response.data.decode().strip().split('\n\n'):
+        name, data = block.split('\n', 1)
+        events.append((name[len('event: '):], json.loads(data[len('data: '):])))
+    return events
+
+
+def test_plot_stream(client):
+    events = stream_events(client.get('/plot/stream', query_string={'function': 'sin(x)', 'format': 'svg'}))
+    assert [name for name, _ in events][-2:] == ['image', 'done']
+    stages = [data['stage'] for name, data in events if name == 'points']
+    assert stages[0] == 0
+    assert stages == sorted(stages)
+    assert events[-2][1]['svg'].startswith('<svg')
+    events = stream_events(client.get('/plot/stream', query_string={'function': 'sin('}))
+    assert events[-1][0] == 'plot-error'
+
+
+def test_metrics(client):
+    client.post('/calculate', data={'expression': '1+1'})
+    text = client.get('/metrics').data.decode()
+    assert 'calculator_requests_total{route="/calculate",status="200"}' in text
+    assert 'calculator_stage_seconds' in text
+
+
+def test_profiles_are_off_by_default(client):
+    assert client.get('/profiles').get_json() == {'profiles': [], 'enabled': False}
+    assert client.get('/profiles/missing/pstats').status_code == 404
+
+
+def test_plot_kinds(client):
+    response = client.get('/plot', query_string={'kind': 'polar', 'function': '1 + cos(theta)', 'format': 'points'})
+    assert response.get_json()['points']
+    response = client.get('/plot', query_string={'kind': 'surface', 'format': 'svg', 'resolution': '20'})
+    assert response.get_json()['svg']
+    assert client.get('/plot', query_string={'kind': 'spiral'}).get_json()['error']
+
+
+def test_index_and_assets(client):
+    page = client.get('/', headers={'Accept-Encoding': 'gzip'})
+    assert page.status_code == 200
+    url = web_calculator.static_assets.url('calculator.js')
+    asset = client.get(url)
+    assert asset.status_code == 200
+    assert 'immutable' in asset.headers['Cache-Control']
+    assert client.get(url, headers={'If-None-Match': asset.headers['ETag']}).status_code == 304
+    assert client.get('/assets/missing.js').status_code == 404
+
+
+def test_elements(client):
+    page = client.get('/elements', query_string={'limit': 2, 'fields': 'symbol'}).get_json()
+    assert page['elements'] == [{'symbol': 'H'}, {'symbol': 'He'}]
+    assert page['next'] is not None
+    found = client.get('/elements/search', query_string={'name': 'car'}).get_json()
+    assert [element['symbol'] for element in found['elements']] == ['C']
+    assert client.get('/elements/search', query_string={'mass_min': 'heavy'}).get_json()['error']
+
+
+def test_plot_overlays(client):
+    query = {'function': 'x^2', 'format': 'points', 'overlays': 'derivative,tangent', 'tangent_at': '1'}
+    points = client.get('/plot', query_string=query).get_json()['points']
+    assert [overlay['label'] for overlay in points['overlays']][1] == 'tangent at x = 1'
+    query['overlays'] = 'area'
+    assert client.get('/plot', query_string=query).get_json()['error']
+
+
+def test_preview(client):
+    data = {'session': 'tab-1', 'expression': '2+'}
+    assert client.post('/calculate/preview', data=data).get_json()['result'] is None
+    data['expression'] = '2+3'
+    assert client.post('/calculate/preview', data=data).get_json() == {'result': '5', 'error': None}
+    data['mode'] = 'exact'
+    data['expression'] = '1/3+1/6'
+    assert client.post('/calculate/preview', data=data).get_json()['result'] == '1/2'
+    data['expression'] = '1' * 1000
+    assert 'limited' in client.post('/calculate/preview', data=data).get_json()['error']
+    del data['session']
+    assert client.post('/calculate/preview', data=data).get_json()['error']
+
+
+def test_plot_stream_sends_overlays_last(client):
+    events = stream_events(client.get('/plot/stream', query_string={
+        'function': 'sin(x)', 'format': 'points', 'overlays': 'derivative'}))
+    assert events[-1][0] == 'done'
+    points = [data for name, data in events if name == 'points']
+    assert 'overlays' not in points[0]['points']
+    assert points[-1]['points']['overlays'][0]['label']
@@ -0,0 +1,76 @@
+import math
+import os
+import threading
+import time
+
+import pytest
+
+from worker_pool import JobTimeout, PoolBusy, WorkerCrashed, WorkerPool
+
+
+def slow_start():
+    """A preload hook that takes longer than the jobs are allowed to"""
+    time.sleep(1.5)
+
+
+@pytest.fixture
+def pool():
+    pool = WorkerPool(processes=1, max_queue=0, timeout=5)
+    yield pool
+    pool.close()
+
+
+def test_runs_jobs_in_another_process(pool):
+    assert pool.run(math.factorial, 10) == 3628800
+    assert pool.run(os.getpid) != os.getpid()
+
+
+def test_reraises_job_errors(pool):
+    with pytest.raises(ValueError):
+        pool.run(math.sqrt, -1)
+    assert pool.run(math.sqrt, 4) == 2
+
+
+def test_timeout_replaces_the_worker(pool):
+    with pytest.raises(JobTimeout):
+        pool.run(time.sleep, 5, timeout=0.5)
+    assert pool.stats()['timeouts'] == 1
+    assert pool.run(math.sqrt, 9, timeout=5) == 3
+
+
+def test_preloading_is_not_charged_to_jobs():
+    pool = WorkerPool(processes=1, timeout=0.5, preload=('test_worker_pool:slow_start',))
+    try:
+        assert pool.run(math.sqrt, 16) == 4
+        with pytest.raises(JobTimeout):
+            pool.run(time.sleep, 5)
+        # The replacement preloads again, still outside the job's half second
+        assert pool.run(math.sqrt, 25) == 5
+    finally:
+        pool.close()
+
+
+def test_workers_that_never_start():
+    pool = WorkerPool(processes=1, preload=('test_worker_pool:slow_start',), startup_timeout=0.2)
+    try:
+        with pytest.raises(WorkerCrashed, match='did not start'):
+            pool.run(math.sqrt, 1)
+    finally:
+        pool.close()
+
+
+def test_rejects_work_beyond_the_queue(pool):
+    started = threading.Thread(target=pool.run, args=(time.sleep, 1))
+    started.start()
+    time.sleep(0.2)
+    try:
+        with pytest.raises(PoolBusy):
+            pool.run(math.sqrt, 1)
+    finally:
+        started.join()
+    assert pool.stats()['rejected'] == 1
+
+
+def test_inline_pool():
+    pool = WorkerPool(processes=0)
+    assert pool.run(os.getpid) == os.getpid()
@@ -0,0 +1,263 @@
+"""Chunked, multi-threaded evaluation of plot expressions over large arrays
+
+Evaluating a compiled expression on whole arrays allocates a full-size
+temporary for every operation, which is fine for a thousand samples but not
+for the millions in a fine surface grid or a high-resolution export.  A
+VectorProgram instead lowers the expression to a flat list of NumPy ufunc
+calls, after folding constants and merging repeated subexpressions, and
+runs it over the inputs one cache-sized chunk at a time.  Every ufunc writes
+into a small scratch buffer (out=), buffers are reused as soon as their
+value is dead, and the last step writes straight into the output.  NumPy
+releases the GIL inside ufuncs, so chunks are spread over a thread pool.
+
+    program = VectorProgram(compile_expression('sin(x) * cos(y)', 'vector', ('x', 'y')).tree)
+    z = program(x=x_row, y=y_column)    # broadcast like NumPy would
+    program.stats                        # chunks, threads and peak bytes of the last run
+"""
+import itertools
+import math
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from expression import ExpressionError, fold_constants, get_backend
+
+# Elements per chunk.  A few float64 buffers of this size stay in L2 cache.
+CHUNK_SIZE = 16384
+
+# Inputs smaller than this are evaluated in one chunk on the calling thread
+MIN_PARALLEL_ELEMENTS = 4 * CHUNK_SIZE
+
+UFUNCS = {
+    'add': np.add,
+    'sub': np.subtract,
+    'mul': np.multiply,
+    'div': np.divide,
+    'pow': np.power,
+    'neg': np.negative,
+    'sin': np.sin,
+    'cos': np.cos,
+    'tan': np.tan,
+    'exp': np.exp,
+    'sqrt': np.sqrt,
+    'log10': np.log10,
+    'log': np.log,
+    'ln': np.log,
+    'abs': np.absolute,
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _thread_pool():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 1,
+                                           thread_name_prefix='vector')
+        return _executor
+
+
+def _nthroot(value, n, out):
+    # sign(value) * |value| ** (1 / n), without the temporaries; even roots
+    # of negatives are undefined
+    np.absolute(value, out=out)
+    np.power(out, np.divide(1.0, n), out=out)
+    np.copysign(out, value, out=out)
+    np.copyto(out, np.nan, where=np.less(value, 0) & (np.remainder(n, 2) != 1))
+    return out
+
+
+def _real(value):
+    # (-8)^(1/3) folds to a complex number; the output is real, so it is undefined
+    if isinstance(value, complex):
+        return value.real if value.imag == 0 else math.nan
+    return value
+
+
+def _log_base(value, base, out):
+    np.log(value, out=out)
+    return np.divide(out, np.log(base), out=out)
+
+
+# Steps that are not a single ufunc of the same name
+SPECIAL_STEPS = {'nthroot': _nthroot, 'logbase': _log_base, 'copy': np.positive}
+
+# Special steps that read their operands after writing to out, so out must
+# not share a buffer with any of them
+_READS_AFTER_WRITE = ('nthroot', 'logbase')
+
+
+class VectorProgram:
+    """A vector-mode expression lowered to ufunc calls on reusable buffers
+
+    Each instruction is (function, destination, operands).  An operand is a
+    constant, ('input', name) or ('buffer', index); the destination is a
+    buffer index, or None for the output chunk.
+    """
+
+    def __init__(self, tree, chunk_size=CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.constant = None
+        self.instructions = []
+        self.inputs = set()
+        self.buffers = 0
+        self.stats = {}
+        tree = fold_constants(tree, get_backend('vector'))
+        if tree[0] == 'num':
+            self.constant = _real(tree[1])
+        else:
+            self._lower(tree)
+
+    def _lower(self, tree):
+        # Number every distinct subtree once; equal subtrees are equal tuples,
+        # so a repeated subexpression maps to the value computed the first time
+        values = {}
+        steps = []
+
+        def visit(node):
+            if node in values:
+                return values[node]
+            kind = node[0]
+            if kind == 'num':
+                return _real(node[1])
+            if kind == 'var':
+                operand = ('input', node[1])
+                self.inputs.add(node[1])
+            else:
+                if kind == 'call':
+                    if node[1] not in UFUNCS and node[1] not in SPECIAL_STEPS:
+                        raise ExpressionError(f"Function '{node[1]}' is not supported here")
+                    name, args = node[1], node[2]
+                    if name == 'log' and len(args) == 2:
+                        name = 'logbase'
+                else:
+                    name, args = kind, node[1:]
+                operands = [visit(arg) for arg in args]
+                operand = ('value', len(steps))
+                steps.append((name, operands))
+            values[node] = operand
+            return operand
+
+        result = visit(tree)
+        if result[0] == 'input':
+            # f(x) = x: copying the input is the only work
+            steps.append(('copy', [result]))
+        self._allocate(steps)
+
+    def _allocate(self, steps):
+        # Give each value a buffer that is handed back after its last use
+        last_use = {}
+        for i, (name, operands) in enumerate(steps):
+            for operand in operands:
+                if isinstance(operand, tuple) and operand[0] == 'value':
+                    last_use[operand[1]] = i
+        free = []
+        assigned = {}
+        for i, (name, operands) in enumerate(steps):
+            resolved = []
+            for operand in operands:
+                if isinstance(operand, tuple) and operand[0] == 'value':
+                    resolved.append(('buffer', assigned[operand[1]]))
+                else:
+                    resolved.append(operand)
+            # A value used twice by one step (x*x after CSE) is released once
+            released = list(dict.fromkeys(
+                assigned[o[1]] for o in operands
+                if isinstance(o, tuple) and o[0] == 'value' and last_use[o[1]] == i))
+            if name not in _READS_AFTER_WRITE:
+                # Elementwise ufuncs may overwrite an operand they are done with
+                free.extend(released)
+            if i == len(steps) - 1:
+                destination = None
+            elif free:
+                destination = free.pop()
+            else:
+                destination = self.buffers
+                self.buffers += 1
+            if name in _READS_AFTER_WRITE:
+                free.extend(released)
+            assigned[i] = destination
+            function = SPECIAL_STEPS.get(name) or UFUNCS[name]
+            self.instructions.append((function, destination, tuple(resolved)))
+
+    def __call__(self, out=None, threads=None, **scope):
+        """Evaluate over NumPy-broadcast inputs and return a float64 array
+
+        The result is written to out if given.  threads caps the number of
+        threads used; by default every CPU is.
+        """
+        arrays = {name: np.asarray(value, dtype=float) for name, value in scope.items()}
+        missing = self.inputs.difference(arrays)
+        if missing:
+            raise ExpressionError(f"Missing value for {', '.join(sorted(missing))}")
+        shape = np.broadcast_shapes(*(a.shape for a in arrays.values())) if arrays else ()
+        if out is None:
+            out = np.empty(shape)
+        elif out.shape != shape or out.dtype != np.float64:
+            raise ValueError(f"out must be a float64 array of shape {shape}")
+
+        if self.constant is not None:
+            out.fill(self.constant)
+            self.stats = {'elements': out.size, 'chunks': 0, 'threads': 0, 'scratch_bytes': 0,
+                          'peak_bytes': out.nbytes}
+            return out
+
+        # Chunks are runs of whole rows along the first axis, so every input
+        # slice stays a cheap broadcast view
+        full = out.reshape((1,)) if out.ndim == 0 else out
+        inputs = {name: np.broadcast_to(a, full.shape) for name, a in arrays.items()}
+        row_size = math.prod(full.shape[1:])
+        rows = max(1, self.chunk_size // max(row_size, 1))
+        chunks = -(-len(full) // rows)
+        if threads is None:
+            threads = os.cpu_count() or 1
+        threads = max(1, min(threads, chunks))
+        if full.size < MIN_PARALLEL_ELEMENTS:
+            threads = 1
+
+        counter = itertools.count()
+
+        def work():
+            scratch = [np.empty((rows,) + full.shape[1:]) for _ in range(self.buffers)]
+            with np.errstate(all='ignore'):
+                while True:
+                    start = next(counter) * rows
+                    if start >= len(full):
+                        return
+                    stop = min(start + rows, len(full))
+                    self._run_chunk(inputs, scratch, full, start, stop)
+
+        if threads == 1:
+            work()
+        else:
+            pool = _thread_pool()
+            for future in [pool.submit(work) for _ in range(threads)]:
+                future.result()
+
+        scratch_bytes = threads * self.buffers * rows * row_size * 8
+        self.stats = {
+            'elements': out.size,
+            'chunks': chunks,
+            'threads': threads,
+            'scratch_bytes': scratch_bytes,
+            'peak_bytes': out.nbytes + scratch_bytes,
+        }
+        return out
+
+    def _run_chunk(self, inputs, scratch, full, start, stop):
+        n = stop - start
+        for function, destination, operands in self.instructions:
+            args = []
+            for operand in operands:
+                if not isinstance(operand, tuple):
+                    args.append(operand)
+                elif operand[0] == 'input':
+                    args.append(inputs[operand[1]][start:stop])
+                else:
+                    args.append(scratch[operand[1]][:n])
+            target = full[start:stop] if destination is None else scratch[destination][:n]
+            function(*args, out=target)
@@ -1,154 +1,898 @@
-from flask import Flask, render_template, request, jsonify
-import numpy as np
-import matplotlib.pyplot as plt
-import io
+from flask import Flask, render_template, request, jsonify, Response, g, abort, send_file
 import base64
+import json
+import logging
 import math
-from matplotlib.figure import Figure
-import re
+import os
+import random
+import tempfile
+import threading
+import time
+import core
+import periodic_table
+import profiling
+import telemetry
+from core import PLOT_SETTINGS, STAGE_SECONDS, expression_cache
+from expression import normalize, to_source
+from plot_cache import PlotCache, make_key
+from static_assets import Asset, StaticAssets
+from worker_pool import PoolBusy, WorkerPool
 
-app = Flask(__name__)
+# Evaluating, sampling, rendering and solving live in core, which the Tk
+# app shares.  NumPy, matplotlib and the modules built on them are imported
+# there only when a plot or solve needs them, so keypad-only processes never
+# load them.  The server never needs a GUI, so matplotlib is pinned to Agg
+# before anything can import it.
+os.environ.setdefault('MPLBACKEND', 'Agg')
+
+app = Flask(__name__, static_folder=None)
+
+# CSS, scripts and data under static/ are fingerprinted and compressed once
+# at startup and served from memory at /assets/; templates link to them
+# with asset_url('name')
+static_assets = StaticAssets()
+app.jinja_env.globals['asset_url'] = static_assets.url
+
+# Compiled expressions are reused across requests; plot and keypad traffic
+# repeats the same few expressions over and over
+app.config['EXPRESSION_CACHE_SIZE'] = int(os.environ.get('EXPRESSION_CACHE_SIZE', '512'))
+expression_cache.resize(app.config['EXPRESSION_CACHE_SIZE'])
+
+# Rendered PNGs, bounded by count and total size, optionally spilling to disk
+app.config['PLOT_CACHE_MAX_BYTES'] = int(os.environ.get('PLOT_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+app.config['PLOT_CACHE_MAX_ENTRIES'] = int(os.environ.get('PLOT_CACHE_MAX_ENTRIES', '1024'))
+app.config['PLOT_CACHE_DIR'] = os.environ.get('PLOT_CACHE_DIR') or None
+app.config['PLOT_CACHE_MAX_AGE'] = int(os.environ.get('PLOT_CACHE_MAX_AGE', '3600'))
+plot_cache = PlotCache(
+    max_bytes=app.config['PLOT_CACHE_MAX_BYTES'],
+    max_entries=app.config['PLOT_CACHE_MAX_ENTRIES'],
+    spill_dir=app.config['PLOT_CACHE_DIR'],
+)
+
+# 'matplotlib' draws the full styled figure; 'raster' is the fast path that
+# draws directly into a NumPy buffer.  Requests can override it per call.
+app.config['PLOT_RENDERER'] = os.environ.get('PLOT_RENDERER', 'matplotlib')
+
+# 'adaptive' refines where the curve needs it; 'uniform' is the old fixed
+# 1000-point grid
+app.config['PLOT_SAMPLING'] = os.environ.get('PLOT_SAMPLING', 'adaptive')
+
+# Numeric mode for /calculate when the request does not pick one: 'float'
+# (math floats and ints), 'decimal' (DECIMAL_PRECISION significant digits)
+# or 'exact' (integers and fractions).  Every mode rejects results that would
+# be too large to compute quickly, such as factorial(100000) or 9^9^9.
+app.config['CALC_MODE'] = os.environ.get('CALC_MODE', 'float')
+app.config['DECIMAL_PRECISION'] = int(os.environ.get('DECIMAL_PRECISION', '28'))
+
+# Live previews keep the parse state of each page's last keypad text, for
+# up to PREVIEW_SESSIONS pages idle no longer than PREVIEW_SESSION_MAX_AGE
+# seconds.  An evicted page just gets one full parse.  Texts longer than
+# PREVIEW_MAX_LENGTH characters are not previewed.
+app.config['PREVIEW_SESSIONS'] = int(os.environ.get('PREVIEW_SESSIONS', '1024'))
+app.config['PREVIEW_SESSION_MAX_AGE'] = float(os.environ.get('PREVIEW_SESSION_MAX_AGE', '600'))
+app.config['PREVIEW_MAX_LENGTH'] = int(os.environ.get('PREVIEW_MAX_LENGTH', '500'))
+core.preview_sessions.configure(app.config['PREVIEW_SESSIONS'], app.config['PREVIEW_SESSION_MAX_AGE'],
+                                app.config['PREVIEW_MAX_LENGTH'])
+
+# Upper bound on the number of expressions or functions in one batch request
+app.config['BATCH_MAX_ITEMS'] = int(os.environ.get('BATCH_MAX_ITEMS', '100'))
+
+# Structured JSON logs on stderr.  Records below WARNING are sampled at
+# LOG_SAMPLE_RATE; LOG_LEVEL=OFF switches logging off entirely.
+app.config['LOG_LEVEL'] = os.environ.get('LOG_LEVEL', 'WARNING')
+app.config['LOG_SAMPLE_RATE'] = float(os.environ.get('LOG_SAMPLE_RATE', '0.1'))
+log = telemetry.configure_logging('calculator', app.config['LOG_LEVEL'], app.config['LOG_SAMPLE_RATE'])
+
+# Metrics served at /metrics, next to core's STAGE_SECONDS
+REQUESTS = telemetry.REGISTRY.counter(
+    'calculator_requests_total', 'Requests handled, by route and status', ('route', 'status'))
+REQUEST_SECONDS = telemetry.REGISTRY.histogram(
+    'calculator_request_seconds', 'Time to produce a response, by route', ('route',))
+ERRORS = telemetry.REGISTRY.counter(
+    'calculator_errors_total', 'Errors reported to clients, by route and exception type', ('route', 'type'))
+CACHE_LOOKUPS = telemetry.REGISTRY.counter(
+    'calculator_cache_lookups_total', 'Cache lookups, by cache and result', ('cache', 'result'))
+CACHE_HIT_RATIO = telemetry.REGISTRY.gauge(
+    'calculator_cache_hit_ratio', 'Fraction of all lookups so far that were hits', ('cache',))
+WORKER_POOL = telemetry.REGISTRY.gauge(
+    'calculator_worker_pool', 'Worker pool counters', ('stat',))
+PREVIEW_SESSIONS = telemetry.REGISTRY.gauge(
+    'calculator_preview_sessions', 'Live preview session counters', ('stat',))
+
+_counted_lookups = {}
+_counted_lookups_lock = threading.Lock()
+
+def count_cache_lookups():
+    """Add the cache hits and misses since the last call to CACHE_LOOKUPS"""
+    with _counted_lookups_lock:
+        for cache, stats, results in (
+            ('expression', expression_cache.stats(), ('hits', 'misses')),
+            ('plot', plot_cache.stats(), ('hits', 'disk_hits', 'misses')),
+        ):
+            for result in results:
+                delta = stats[result] - _counted_lookups.get((cache, result), 0)
+                if delta:
+                    CACHE_LOOKUPS.inc(delta, cache=cache, result=result)
+                    _counted_lookups[cache, result] = stats[result]
+
+def worker_report():
+    """Hand what a worker recorded since its last job to the web process"""
+    count_cache_lookups()
+    return telemetry.REGISTRY.drain()
+
+# Evaluation and rendering run in a pool of worker processes, so a slow or
+# hostile job cannot hold the GIL or stall the request thread.  Jobs beyond
+# WORKER_PROCESSES wait in a queue of WORKER_QUEUE_SIZE; past that the server
+# answers 503.  WORKER_PROCESSES=0 runs everything inline.
+app.config['WORKER_PROCESSES'] = int(os.environ.get('WORKER_PROCESSES', '2'))
+app.config['WORKER_QUEUE_SIZE'] = int(os.environ.get('WORKER_QUEUE_SIZE', '8'))
+app.config['JOB_TIMEOUT'] = float(os.environ.get('JOB_TIMEOUT', '10'))
+app.config['WORKER_MEMORY_LIMIT'] = int(os.environ.get('WORKER_MEMORY_LIMIT', str(1024 * 1024 * 1024)))
+worker_pool = WorkerPool(
+    processes=app.config['WORKER_PROCESSES'],
+    max_queue=app.config['WORKER_QUEUE_SIZE'],
+    timeout=app.config['JOB_TIMEOUT'],
+    memory_limit=app.config['WORKER_MEMORY_LIMIT'],
+    preload=(__name__, 'core:warm_up'),
+    report=worker_report,
+    on_report=telemetry.REGISTRY.merge,
+)
+
+# Opt-in profiling.  With PROFILE_THRESHOLD (seconds) set, every request
+# runs under cProfile and those slower than the threshold are kept; with
+# PROFILE_SAMPLE_RATE a random fraction is kept however fast it was.  Both
+# default to 0, which leaves profiling off.  Worker jobs of a profiled
+# request are profiled in the worker and merged in.
+app.config['PROFILE_THRESHOLD'] = float(os.environ.get('PROFILE_THRESHOLD', '0'))
+app.config['PROFILE_SAMPLE_RATE'] = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+app.config['PROFILE_DIR'] = os.environ.get('PROFILE_DIR') or os.path.join(tempfile.gettempdir(), 'calculator-profiles')
+app.config['PROFILE_MAX_ENTRIES'] = int(os.environ.get('PROFILE_MAX_ENTRIES', '50'))
+profile_store = None
+if app.config['PROFILE_THRESHOLD'] > 0 or app.config['PROFILE_SAMPLE_RATE'] > 0:
+    profile_store = profiling.ProfileStore(app.config['PROFILE_DIR'], app.config['PROFILE_MAX_ENTRIES'])
+
+def run_job(func, *args):
+    """Run a job on the worker pool, profiling it there if this request is profiled"""
+    capture = profiling.current()
+    if capture is None or worker_pool.processes <= 0:
+        # Inline jobs are already covered by the request's own profiler
+        return worker_pool.run(func, *args)
+    result, stats = worker_pool.run(profiling.profiled, func, *args)
+    capture.add(stats)
+    return result
+
+# Request fields recorded with a profile, so the slow input can be replayed
+PROFILE_FIELDS = ('expression', 'function', 'equation', 'x_min', 'x_max', 'format',
+                  'renderer', 'sampling', 'mode', 'precision', 'kind', 'x_function',
+                  'y_function', 't_min', 't_max', 'theta_min', 'theta_max', 'y_min', 'y_max',
+                  'samples', 'resolution', 'overlays', 'tangent_at')
+
+@app.before_request
+def start_profile():
+    if profile_store is None or request.path.startswith(('/profiles', '/metrics')):
+        return
+    sampled = random.random() < app.config['PROFILE_SAMPLE_RATE']
+    if sampled or app.config['PROFILE_THRESHOLD'] > 0:
+        g.profile = profiling.ProfileCapture().begin()
+        g.profile_sampled = sampled
+
+@app.after_request
+def save_profile(response):
+    capture = g.pop('profile', None)
+    if capture is None:
+        return response
+    elapsed = capture.stop()
+    slow = app.config['PROFILE_THRESHOLD'] > 0 and elapsed >= app.config['PROFILE_THRESHOLD']
+    if slow or g.profile_sampled:
+        params = {name: request.values[name] for name in PROFILE_FIELDS if name in request.values}
+        if request.is_json:
+            params['json'] = request.get_data(as_text=True)[:1000]
+        try:
+            profile_store.save(capture, {
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'reason': 'slow' if slow else 'sampled',
+                'params': params,
+            })
+        except OSError as e:
+            log.warning("Could not save profile", extra={'fields': {'error': str(e)}})
+    return response
+
+@app.teardown_request
+def stop_profile(error=None):
+    # A request that failed before after_request still has to stop its profiler
+    capture = g.pop('profile', None)
+    if capture is not None:
+        capture.stop()
+
+def profile_listing():
+    """Captured profiles, newest first, with download links"""
+    if profile_store is None:
+        return {"profiles": [], "enabled": False}
+    profiles = [
+        {**entry, "downloads": {kind: f"/profiles/{entry['id']}/{kind}" for kind in profiling.ProfileStore.KINDS}}
+        for entry in profile_store.entries()
+    ]
+    return {"profiles": profiles, "enabled": True}
+
+def profile_file(profile_id, kind):
+    """(path, mimetype, download name) of a captured profile, or None if there is none"""
+    if profile_store is None or kind not in profiling.ProfileStore.KINDS or profile_store.get(profile_id) is None:
+        return None
+    path = profile_store.path(profile_id, kind)
+    if not os.path.exists(path):
+        return None
+    mimetype = 'text/plain' if kind == 'collapsed' else 'application/octet-stream'
+    return path, mimetype, profile_id + profiling.ProfileStore.KINDS[kind]
+
+@app.route('/profiles')
+def list_profiles():
+    return jsonify(profile_listing())
+
+@app.route('/profiles/<profile_id>/<kind>')
+def download_profile(profile_id, kind):
+    found = profile_file(profile_id, kind)
+    if found is None:
+        abort(404)
+    path, mimetype, download_name = found
+    return send_file(path, mimetype=mimetype, as_attachment=True, download_name=download_name)
+
+def route_label():
+    # Unknown paths share one label so they cannot blow up the metric count
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def count_request(response):
+    route = route_label()
+    REQUESTS.inc(route=route, status=response.status_code)
+    REQUEST_SECONDS.observe(time.perf_counter() - g.request_start, route=route)
+    return response
+
+def count_error(route, error):
+    ERRORS.inc(route=route, type=type(error).__name__)
+
+def error_response(fields, error):
+    """Report a failed request in the JSON shape of its route"""
+    count_error(route_label(), error)
+    return jsonify({**fields, "error": str(error)})
+
+def asset_response(asset):
+    """Serve a prebuilt Asset: 304 if the client has it, else its best encoding"""
+    if asset.matches(request.headers.get('If-None-Match')):
+        response = app.response_class(status=304)
+        response.headers.update(asset.headers())
+        return response
+    encoding, body = asset.negotiate(request.headers.get('Accept-Encoding'))
+    response = app.response_class(body, content_type=asset.content_type)
+    response.headers.update(asset.headers(encoding))
+    return response
+
+def prerender_index():
+    """Render the page once; it has no per-request state"""
+    with app.app_context():
+        html = render_template('calculator.html').encode('utf-8')
+    # Revalidated on every load, so a new deploy shows up straight away
+    return Asset(html, 'text/html; charset=utf-8', cache_control='no-cache')
+
+index_page = prerender_index()
 
 @app.route('/')
 def index():
-    return render_template('calculator.html')
+    return asset_response(index_page)
+
+@app.route('/assets/<name>')
+def static_asset(name):
+    asset = static_assets.get(name)
+    if asset is None:
+        abort(404)
+    return asset_response(asset)
+
+def evaluate(expression, mode='float', precision=None):
+    """Evaluate one expression for a JSON response; runs in a worker process"""
+    return str(core.evaluate(expression, mode, precision))
+
+def numeric_mode(values):
+    """Read the request's mode and precision fields, falling back to the config
+
+    Returns (mode, precision), already validated.
+    """
+    mode = values.get('mode') or app.config['CALC_MODE']
+    precision = values.get('precision') or app.config['DECIMAL_PRECISION']
+    core.evaluation_mode(mode, precision)
+    return mode, precision
+
+def batch_items(body, field):
+    """Pull the item list out of a batch body: a bare array or {field: [...]}"""
+    items = body.get(field) if isinstance(body, dict) else body
+    if not isinstance(items, list):
+        raise ValueError(f"Expected a JSON array, or an object with an array in '{field}'")
+    if len(items) > app.config['BATCH_MAX_ITEMS']:
+        raise ValueError(f"Too many items (at most {app.config['BATCH_MAX_ITEMS']})")
+    return items
+
+def busy_response(fields, error):
+    """Tell the client to back off: every worker is busy and the queue is full"""
+    count_error(route_label(), error)
+    response = jsonify({**fields, "error": str(error)})
+    response.status_code = 503
+    response.headers['Retry-After'] = '1'
+    return response
 
 @app.route('/calculate', methods=['POST'])
 def calculate():
     try:
         expression = request.form.get('expression', '')
-        
-        # Replace special operations
-        expression = expression.replace("sqrt(", "math.sqrt(")
-        expression = expression.replace("log10(", "math.log10(")
-        expression = expression.replace("log(", "math.log(")
-        expression = expression.replace("factorial(", "math.factorial(")
-        expression = expression.replace("sin(", "math.sin(")
-        expression = expression.replace("cos(", "math.cos(")
-        expression = expression.replace("tan(", "math.tan(")
-        
-        # Handle percentage
-        if "%" in expression:
-            expression = expression.replace("%", "/100")
-        
-        # Calculate result
-        result = eval(expression, {"__builtins__": {}, "math": math})
-        
-        return jsonify({"result": str(result), "error": None})
+        mode, precision = numeric_mode(request.form)
+        return jsonify({"result": run_job(evaluate, expression, mode, precision), "error": None})
+    except PoolBusy as e:
+        return busy_response({"result": None}, e)
+    except Exception as e:
+        return error_response({"result": None}, e)
+
+# Longest session id a page may pick for its live preview
+MAX_SESSION_ID = 64
+
+def preview_result(values):
+    """Preview the keypad text in a request, as the JSON fields of a response
+
+    Float previews run in this process, where the session's parse state
+    lives: only the tokens from the first edit on are parsed and evaluated,
+    the text is at most PREVIEW_MAX_LENGTH characters and every float
+    operation is cheap.  Decimal and exact arithmetic can be slow, so those
+    previews are evaluated in full on the worker pool, under its time and
+    memory limits.  Text that is still being typed rarely parses, so its
+    errors are returned but not counted as errors of the route.
+    """
+    session = values.get('session', '')
+    if not 0 < len(session) <= MAX_SESSION_ID:
+        return {"result": None, "error": f"A preview needs a session id of 1 to {MAX_SESSION_ID} characters"}
+    expression = values.get('expression', '')
+    try:
+        mode, precision = numeric_mode(values)
+        if mode != 'float':
+            if len(expression) > app.config['PREVIEW_MAX_LENGTH']:
+                raise ValueError(f"Preview is limited to {app.config['PREVIEW_MAX_LENGTH']} characters")
+            return {"result": run_job(evaluate, expression, mode, precision), "error": None}
+        return {"result": str(core.preview(session, expression, mode, precision)), "error": None}
+    except Exception as e:
+        return {"result": None, "error": str(e)}
+
+@app.route('/calculate/preview', methods=['POST'])
+def calculate_preview():
+    return jsonify(preview_result(request.form))
+
+def calculate_batch_results(expressions, mode='float', precision=None, run=run_job):
+    """Evaluate every expression with run(evaluate, expression, mode, precision)
+
+    One failing expression does not affect the others; only PoolBusy aborts
+    the whole batch.
+    """
+    results = []
+    for expression in expressions:
+        try:
+            if not isinstance(expression, str):
+                raise ValueError("Expression must be a string")
+            results.append({"result": run(evaluate, expression, mode, precision), "error": None})
+        except PoolBusy:
+            raise
+        except Exception as e:
+            count_error('/calculate/batch', e)
+            results.append({"result": None, "error": str(e)})
+    return results
+
+@app.route('/calculate/batch', methods=['POST'])
+def calculate_batch():
+    try:
+        body = request.get_json(silent=True)
+        expressions = batch_items(body, 'expressions')
+        mode, precision = numeric_mode(body if isinstance(body, dict) else {})
+        return jsonify({"results": calculate_batch_results(expressions, mode, precision), "error": None})
+    except PoolBusy as e:
+        return busy_response({"results": None}, e)
+    except Exception as e:
+        return error_response({"results": None}, e)
+
+def solve_job(equation, x_min, x_max):
+    """Solve an equation in x; runs in a worker process"""
+    solution = core.solve(equation, x_min, x_max)
+    return {
+        "roots": solution.roots,
+        "complex": [[root.real, root.imag] for root in solution.complex_roots],
+        "method": solution.method,
+    }
+
+@app.route('/solve', methods=['GET', 'POST'])
+def solve_equation():
+    """Polynomials are solved exactly; anything else is scanned on [x_min, x_max]"""
+    try:
+        equation = request.values.get('equation', '')
+        x_min = float(request.values.get('x_min', '-100'))
+        x_max = float(request.values.get('x_max', '100'))
+        return jsonify({**run_job(solve_job, equation, x_min, x_max), "error": None})
+    except PoolBusy as e:
+        return busy_response({"roots": None}, e)
     except Exception as e:
-        return jsonify({"result": None, "error": str(e)})
+        return error_response({"roots": None}, e)
+
+def cacheable(response, etag):
+    """Attach validators so browsers and proxies can revalidate the plot"""
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = f"public, max-age={app.config['PLOT_CACHE_MAX_AGE']}"
+    return response
+
+# The JSON key holding the plot data for each format
+PLOT_FIELDS = {'png': 'image', 'svg': 'svg', 'points': 'points'}
+
+def plot_json(output_format, data):
+    """Encode plot bytes as the JSON object the page expects for each format"""
+    if output_format == 'png':
+        # Convert PNG bytes to base64 string
+        with STAGE_SECONDS.time(stage='base64'):
+            encoded = base64.b64encode(data)
+        return b'{"image":"' + encoded + b'","error":null}'
+    if output_format == 'svg':
+        return json.dumps({"svg": data.decode('utf-8'), "error": None}).encode('utf-8')
+    # Points are already JSON, so splice them in rather than re-serializing
+    return b'{"points":' + data + b',"error":null}'
+
+def plot_error_json(output_format, error):
+    return json.dumps({PLOT_FIELDS.get(output_format, 'image'): None, "error": str(error)}).encode('utf-8')
+
+def plot_error_fields(values):
+    """The empty payload of a failed plot, under the key its format's success uses"""
+    return {PLOT_FIELDS.get(values.get('format', 'png'), 'image'): None}
+
+def render_job(output_format, renderer, function_str, x_min, x_max, sampling, overlays=(), tangent_at=None):
+    """Compile and render one plot; runs in a worker process"""
+    return core.render_plot(function_str, x_min, x_max, output_format, renderer or 'matplotlib', sampling,
+                            overlays=overlays, tangent_at=tangent_at)
+
+def render_shared_job(output_format, renderer, items, sampling):
+    """Compile and render (function_str, x_min, x_max) items onto one figure"""
+    return core.render_series(items, output_format, renderer or 'matplotlib', sampling)
 
-@app.route('/plot', methods=['POST'])
+def plot_response(output_format, data):
+    """Wrap plot bytes in the JSON shape the page expects for each format"""
+    return app.response_class(plot_json(output_format, data), mimetype='application/json')
+
+def plot_options(values):
+    """Read and validate the format, renderer and sampling of a plot request"""
+    output_format = values.get('format', 'png')
+    if output_format not in core.PLOT_FORMATS:
+        raise ValueError(f"Unknown format '{output_format}'")
+    renderer = values.get('renderer', app.config['PLOT_RENDERER'])
+    if renderer not in core.RENDERERS:
+        raise ValueError(f"Unknown renderer '{renderer}'")
+    sampling = values.get('sampling', app.config['PLOT_SAMPLING'])
+    if sampling not in core.SAMPLINGS:
+        raise ValueError(f"Unknown sampling '{sampling}'")
+    if output_format != 'png':
+        # Only PNG output goes through a rasterizer
+        renderer = None
+    return output_format, renderer, sampling
+
+def cached_render(key, render):
+    """Return the plot bytes for key, calling render() only on a cache miss"""
+    data = plot_cache.get(key)
+    if data is None:
+        data = render()
+        plot_cache.put(key, data)
+    return data
+
+def plot_parameters(values):
+    """Read, validate and compile the parameters of a /plot request"""
+    if values.get('kind', 'function') != 'function':
+        raise ValueError("Only plots of y = f(x) can be streamed or batched")
+    function_str = normalize(values.get('function', 'x'))
+    x_min = float(values.get('x_min', '-10'))
+    x_max = float(values.get('x_max', '10'))
+    output_format, renderer, sampling = plot_options(values)
+    
+    # Parse the function into a compiled evaluator, reusing cached ones
+    function = core.compile_plot_function(function_str)
+    
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("Parsed function", extra={'fields': {
+            'original': function_str, 'parsed': to_source(function.tree)}})
+    
+    return function, function_str, x_min, x_max, output_format, renderer, sampling
+
+def overlay_options(values):
+    """Read the overlays of a y = f(x) plot: ?overlays=derivative,integral,tangent
+
+    Returns (overlays, tangent_at); tangent_at is None for the middle of the range.
+    """
+    overlays = tuple(name.strip() for name in values.get('overlays', '').split(',') if name.strip())
+    for name in overlays:
+        if name not in core.OVERLAYS:
+            raise ValueError(f"Unknown overlay '{name}' (expected one of {', '.join(core.OVERLAYS)})")
+    tangent_at = values.get('tangent_at')
+    tangent_at = float(tangent_at) if tangent_at not in (None, '') else None
+    return overlays, tangent_at
+
+def prepare_plot(values):
+    """Validate /plot parameters without rendering anything
+
+    Returns (output_format, key, render), where render() produces the plot
+    bytes in a worker.  The key addresses the rendered output, so it
+    doubles as the ETag.
+    """
+    kind = values.get('kind', 'function')
+    if kind not in core.PLOT_KINDS:
+        raise ValueError(f"Unknown kind '{kind}' (expected one of {', '.join(core.PLOT_KINDS)})")
+    if kind != 'function':
+        return prepare_graph(kind, values)
+    function, function_str, x_min, x_max, output_format, renderer, sampling = plot_parameters(values)
+    overlays, tangent_at = overlay_options(values)
+    key = core.plot_key(function_str, x_min, x_max, output_format, renderer, sampling, overlays, tangent_at)
+    render = lambda: run_job(render_job, output_format, renderer, function_str, x_min, x_max, sampling,
+                             overlays, tangent_at)
+    return output_format, key, render
+
+# Upper bounds on the points of a parametric or polar curve ('samples') and
+# on each side of a surface grid ('resolution'), which costs resolution^2
+# evaluations.  Requests above them are rejected rather than clamped.
+app.config['PLOT_MAX_SAMPLES'] = int(os.environ.get('PLOT_MAX_SAMPLES', '20000'))
+app.config['PLOT_MAX_RESOLUTION'] = int(os.environ.get('PLOT_MAX_RESOLUTION', '400'))
+
+# The request fields of the other plot kinds with their defaults, in the
+# order core's render functions take them
+GRAPH_FIELDS = {
+    'parametric': (('x_function', 'cos(t)'), ('y_function', 'sin(t)'), ('t_min', 0.0), ('t_max', 2 * math.pi)),
+    'polar': (('function', '1'), ('theta_min', 0.0), ('theta_max', 2 * math.pi)),
+    'surface': (('function', 'sin(x)cos(y)'), ('x_min', -10.0), ('x_max', 10.0), ('y_min', -10.0), ('y_max', 10.0)),
+}
+
+GRAPH_RENDERERS = {
+    'parametric': core.render_parametric,
+    'polar': core.render_polar,
+    'surface': core.render_surface,
+}
+
+def graph_parameters(kind, values):
+    """Read, validate and compile the fields of a parametric, polar or surface plot
+
+    Returns the positional arguments of the kind's render function, up to
+    the output format, and the number of samples or the grid resolution.
+    """
+    params = []
+    for name, default in GRAPH_FIELDS[kind]:
+        value = values.get(name, default)
+        if isinstance(default, float):
+            params.append(float(value))
+        else:
+            params.append(normalize(value))
+            # Compile now so a typo is reported before any work is queued
+            core.compile_plot_expression(params[-1], core.PLOT_VARIABLES[kind])
+    if kind == 'surface':
+        detail = core.check_samples(values.get('resolution', core.PLOT_SETTINGS['grid_resolution']),
+                                    app.config['PLOT_MAX_RESOLUTION'], 'Resolution')
+    else:
+        detail = core.check_samples(values.get('samples', core.PLOT_SETTINGS['curve_samples']),
+                                    app.config['PLOT_MAX_SAMPLES'], 'Samples')
+    return tuple(params), detail
+
+def render_graph_job(kind, params, output_format, renderer, detail):
+    """Render a parametric, polar or surface plot; runs in a worker process"""
+    return GRAPH_RENDERERS[kind](*params, output_format, renderer or 'matplotlib', detail)
+
+def prepare_graph(kind, values):
+    """prepare_plot() for the plot kinds other than y = f(x)"""
+    output_format, renderer, sampling = plot_options(values)
+    params, detail = graph_parameters(kind, values)
+    key = make_key(kind, output_format, renderer, params, detail, PLOT_SETTINGS)
+    render = lambda: run_job(render_graph_job, kind, params, output_format, renderer, detail)
+    return output_format, key, render
+
+@app.route('/plot', methods=['GET', 'POST'])
 def plot():
     try:
-        function_str = request.form.get('function', 'x')
-        x_min = float(request.form.get('x_min', '-10'))
-        x_max = float(request.form.get('x_max', '10'))
-        
-        # Create x values
-        x_values = np.linspace(x_min, x_max, 1000)
-        
-        # Better function parsing with improved regex
-        expression = function_str
+        output_format, key, render = prepare_plot(request.values)
+        etag = key[:32]
+        if request.if_none_match.contains(etag):
+            return cacheable(app.response_class(status=304), etag)
         
-        # Replace 'y' with 'x' for equation plotting
-        if 'y' in expression and 'x' not in expression:
-            expression = expression.replace('y', 'x')
+        data = cached_render(key, render)
         
-        # Handle more implicit multiplication cases
-        # Number followed by variable: 2x -> 2*x
-        expression = re.sub(r'(\d+)([a-zA-Z])', r'\1*\2', expression)
-        
-        # Number or variable followed by parenthesis: 2(x) -> 2*(x) or x(2) -> x*(2)
-        expression = re.sub(r'(\d+|\w)(\()', r'\1*\2', expression)
-        
-        # IMPORTANT: Don't add multiplication between function names and parentheses
-        # First, protect common function names
-        expression = expression.replace('sin(', 'SIN_FUNC(')
-        expression = expression.replace('cos(', 'COS_FUNC(')
-        expression = expression.replace('tan(', 'TAN_FUNC(')
-        expression = expression.replace('log(', 'LOG_FUNC(')
-        expression = expression.replace('ln(', 'LN_FUNC(')
-        expression = expression.replace('sqrt(', 'SQRT_FUNC(')
-        
-        # Closing parenthesis followed by opening parenthesis: )(  -> )*(
-        expression = re.sub(r'(\))(\()', r'\1*\2', expression)
-        
-        # Closing parenthesis followed by number or variable: )2 or )x -> )*2 or )*x
-        expression = re.sub(r'(\))(\w|\d)', r'\1*\2', expression)
-        
-        # Now restore the function names
-        expression = expression.replace('SIN_FUNC(', 'sin(')
-        expression = expression.replace('COS_FUNC(', 'cos(')
-        expression = expression.replace('TAN_FUNC(', 'tan(')
-        expression = expression.replace('LOG_FUNC(', 'log(')
-        expression = expression.replace('LN_FUNC(', 'ln(')
-        expression = expression.replace('SQRT_FUNC(', 'sqrt(')
-        
-        # Replace common functions with numpy versions
-        replacements = [
-            ("sin(", "np.sin("), 
-            ("cos(", "np.cos("),
-            ("tan(", "np.tan("),
-            ("exp(", "np.exp("),
-            ("sqrt(", "np.sqrt("),
-            ("log10(", "np.log10("),
-            ("log(", "np.log("),
-            ("ln(", "np.log("),
-            ("abs(", "np.abs("),
-            ("pi", "np.pi"),
-            ("^", "**"),  # Handle caret for exponents
-        ]
-        
-        for old, new in replacements:
-            expression = expression.replace(old, new)
-        
-        print(f"Original: {function_str} -> Parsed: {expression}")  # Debugging
-        
-        # Create a safe evaluation environment
-        safe_dict = {
-            'np': np,
-            'x': x_values,
-            'e': np.e,  # Add e constant
-            'pi': np.pi  # Add pi constant
-        }
-        
-        # Evaluate the function 
-        y_values = eval(expression, {"__builtins__": {}}, safe_dict)
-        
-        # Create the figure with a more attractive style
-        plt.style.use('ggplot')  # Use a nicer style
-        fig = Figure(figsize=(8, 6), dpi=100)
-        ax = fig.add_subplot(111)
-        
-        # Plot with a more visible line and better styling
-        ax.plot(x_values, y_values, linewidth=2.5, color='#2196f3')
-        
-        # Set grid and labels with better styling
-        ax.grid(True, linestyle='--', alpha=0.7)
-        ax.axhline(y=0, color='#616161', linestyle='-', alpha=0.5, linewidth=1)
-        ax.axvline(x=0, color='#616161', linestyle='-', alpha=0.5, linewidth=1)
-        ax.set_xlabel('x', fontsize=12)
-        ax.set_ylabel('y', fontsize=12)
-        ax.set_title(f'f(x) = {function_str}', fontsize=14, fontweight='bold')
-        
-        # Better styling for the figure
-        fig.patch.set_facecolor('#f5f5f5')
-        ax.set_facecolor('#f9f9f9')
-        ax.spines['top'].set_visible(False)
-        ax.spines['right'].set_visible(False)
-        
-        # Save the figure to a buffer
-        buf = io.BytesIO()
-        fig.savefig(buf, format='png', bbox_inches='tight')
-        buf.seek(0)
+        return cacheable(plot_response(output_format, data), etag)
+    except PoolBusy as e:
+        return busy_response(plot_error_fields(request.values), e)
+    except Exception as e:
+        return error_response(plot_error_fields(request.values), e)
+
+# Minimum seconds between intermediate frames of a streamed plot; the first
+# and last frames are always sent
+app.config['PLOT_STREAM_INTERVAL'] = float(os.environ.get('PLOT_STREAM_INTERVAL', '0.05'))
+
+def sse_event(event, data):
+    """Format one server-sent event; data is JSON bytes"""
+    return b'event: ' + event.encode('ascii') + b'\ndata: ' + data + b'\n\n'
+
+def plot_stream_events(values):
+    """Generate the server-sent events of a streamed plot
+
+    'points' events carry successively finer samples, starting with a coarse
+    grid straight away.  For png and svg the finished render follows as an
+    'image' event with any overlays drawn on it; for points, the final
+    samples are sent once more with the overlay series added, if any were
+    asked for.  'done' ends the stream and 'plot-error' reports a
+    failure.  Work stops at the next frame once the generator is closed,
+    which is what happens when the client disconnects.
+    """
+    try:
+        function, function_str, x_min, x_max, output_format, renderer, sampling = plot_parameters(values)
+        # Overlays go with the finished plot; the quick frames show f alone
+        overlays, tangent_at = overlay_options(values)
         
-        # Convert PNG buffer to base64 string
-        image_data = base64.b64encode(buf.getvalue()).decode('utf-8')
+        stage = 0
+        last_sent = 0.0
+        pending = None
+        for x_values, y_values in core.sample_stages(function, x_min, x_max, sampling):
+            pending = (x_values, y_values)
+            now = time.monotonic()
+            if stage == 0 or now - last_sent >= app.config['PLOT_STREAM_INTERVAL']:
+                yield stream_points(stage, x_values, y_values)
+                pending = None
+                last_sent = now
+            stage += 1
+        if output_format == 'points' and overlays:
+            extra = core.sample_overlays(function, x_values, y_values, overlays, tangent_at)
+            yield stream_points(stage - 1, x_values, y_values, extra)
+        elif pending is not None:
+            yield stream_points(stage - 1, *pending)
         
-        return jsonify({"image": image_data, "error": None})
+        if output_format != 'points':
+            key = core.plot_key(function_str, x_min, x_max, output_format, renderer, sampling,
+                                overlays, tangent_at)
+            data = cached_render(key, lambda: run_job(
+                render_job, output_format, renderer, function_str, x_min, x_max, sampling,
+                overlays, tangent_at))
+            yield sse_event('image', plot_json(output_format, data))
+        yield sse_event('done', b'{}')
+    except Exception as e:
+        count_error('/plot/stream', e)
+        yield sse_event('plot-error', json.dumps({"error": str(e)}).encode('utf-8'))
+
+def stream_points(stage, x_values, y_values, overlays=()):
+    import plot_formats
+    
+    if overlays:
+        points = plot_formats.encode_overlays(x_values, y_values, overlays).encode('utf-8')
+    else:
+        points = plot_formats.encode_points(x_values, y_values).encode('utf-8')
+    return sse_event('points', b'{"stage":' + str(stage).encode('ascii') + b',"points":' + points + b'}')
+
+# Server-sent events must not be buffered or cached along the way
+STREAM_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+@app.route('/plot/stream')
+def plot_stream():
+    return Response(plot_stream_events(request.args), mimetype='text/event-stream', headers=STREAM_HEADERS)
+
+def plot_item(item, x_min, x_max):
+    """Resolve one batch entry, a function string or an object, to a compiled function"""
+    if isinstance(item, str):
+        item = {'function': item}
+    if not isinstance(item, dict):
+        raise ValueError("Each plot must be a function string or an object")
+    function_str = normalize(str(item.get('function', 'x')))
+    # Ranges given on the item override the shared one
+    x_min = float(item.get('x_min', x_min))
+    x_max = float(item.get('x_max', x_max))
+    return core.compile_plot_function(function_str), function_str, x_min, x_max
+
+def plot_batch_body(body):
+    """Plot many functions and return the JSON response body
+
+    The body is an array of functions, or an object with a 'functions' array
+    plus shared x_min, x_max, format, renderer and sampling.  Each function
+    is a string or an object with its own function, x_min and x_max.  With
+    "shared": true every function goes onto one figure; otherwise each gets
+    its own plot in 'results'.
+    """
+    items = batch_items(body, 'functions')
+    options = body if isinstance(body, dict) else {}
+    x_min = float(options.get('x_min', -10))
+    x_max = float(options.get('x_max', 10))
+    output_format, renderer, sampling = plot_options(options)
+    shared = bool(options.get('shared', False))
+    if shared and output_format == 'points':
+        raise ValueError("Shared figures need png or svg output")
+    
+    # Compile everything first so one bad function only fails its own entry
+    functions = []
+    errors = []
+    for item in items:
+        try:
+            functions.append(plot_item(item, x_min, x_max))
+            errors.append(None)
+        except Exception as e:
+            count_error('/plot/batch', e)
+            functions.append(None)
+            errors.append(str(e))
+    
+    if shared:
+        return shared_plot_body(output_format, renderer, sampling, functions, errors)
+    
+    results = []
+    for entry, error in zip(functions, errors):
+        if entry is None:
+            results.append(plot_error_json(output_format, error))
+            continue
+        function_str, item_min, item_max = entry[1:]
+        key = core.plot_key(function_str, item_min, item_max, output_format, renderer, sampling)
+        try:
+            data = cached_render(key, lambda: run_job(
+                render_job, output_format, renderer, function_str, item_min, item_max, sampling))
+            results.append(plot_json(output_format, data))
+        except PoolBusy:
+            raise
+        except Exception as e:
+            count_error('/plot/batch', e)
+            results.append(plot_error_json(output_format, e))
+    
+    return b'{"results":[' + b','.join(results) + b'],"error":null}'
+
+def shared_plot_body(output_format, renderer, sampling, functions, errors):
+    """Draw every function that compiled onto one figure"""
+    import plot_formats
+    
+    plotted = [entry for entry in functions if entry is not None]
+    
+    # Report which colour each function was drawn in, so clients can build a legend
+    results = []
+    color_index = 0
+    for entry, error in zip(functions, errors):
+        if entry is None:
+            results.append({"function": None, "color": None, "error": error})
+        else:
+            results.append({"function": entry[1], "color": plot_formats.series_color(color_index), "error": None})
+            color_index += 1
+    
+    field = PLOT_FIELDS[output_format]
+    payload = {field: None, "results": results, "error": None}
+    if not plotted:
+        payload["error"] = "No function could be plotted"
+        return json.dumps(payload).encode('utf-8')
+    
+    items = [entry[1:] for entry in plotted]
+    key = make_key('shared', output_format, renderer, sampling, items, PLOT_SETTINGS)
+    try:
+        data = cached_render(key, lambda: run_job(
+            render_shared_job, output_format, renderer, items, sampling))
+    except PoolBusy:
+        raise
+    except Exception as e:
+        count_error('/plot/batch', e)
+        payload["error"] = str(e)
+        return json.dumps(payload).encode('utf-8')
+    
+    if output_format == 'png':
+        with STAGE_SECONDS.time(stage='base64'):
+            data = base64.b64encode(data)
+    payload[field] = data.decode('utf-8')
+    return json.dumps(payload).encode('utf-8')
+
+@app.route('/plot/batch', methods=['POST'])
+def plot_batch():
+    try:
+        body = plot_batch_body(request.get_json(silent=True))
+        return app.response_class(body, mimetype='application/json')
+    except PoolBusy as e:
+        return busy_response({"results": None}, e)
     except Exception as e:
-        return jsonify({"image": None, "error": str(e)})
+        return error_response({"results": None}, e)
+
+# The periodic table is loaded into columns with its indexes once, up front.
+# /elements and /elements/search return pages of ELEMENTS_PAGE_SIZE records
+# unless the client asks for another limit, up to ELEMENTS_MAX_PAGE_SIZE.
+app.config['ELEMENTS_PAGE_SIZE'] = int(os.environ.get('ELEMENTS_PAGE_SIZE', '50'))
+app.config['ELEMENTS_MAX_PAGE_SIZE'] = int(os.environ.get('ELEMENTS_MAX_PAGE_SIZE', '200'))
+element_table = periodic_table.table()
+
+def query_number(values, name, parse=float):
+    """Read an optional numeric query parameter, naming it in the error"""
+    text = values.get(name)
+    if text is None or text == '':
+        return None
+    try:
+        return parse(text)
+    except ValueError:
+        raise ValueError(f"'{name}' must be a number") from None
+
+def element_page(positions, values):
+    """One page of elements, with only the requested fields
+
+    ?fields=symbol,name picks the fields; ?offset= and ?limit= pick the page.
+    "next" is the offset of the following page, or null on the last one.
+    """
+    fields = periodic_table.parse_fields(values.get('fields'))
+    offset = query_number(values, 'offset', int)
+    offset = 0 if offset is None else offset
+    limit = query_number(values, 'limit', int)
+    limit = app.config['ELEMENTS_PAGE_SIZE'] if limit is None else limit
+    if offset < 0:
+        raise ValueError("'offset' must not be negative")
+    if not 1 <= limit <= app.config['ELEMENTS_MAX_PAGE_SIZE']:
+        raise ValueError(f"'limit' must be between 1 and {app.config['ELEMENTS_MAX_PAGE_SIZE']}")
+    end = offset + limit
+    return {
+        "total": len(positions),
+        "offset": offset,
+        "limit": limit,
+        "next": end if end < len(positions) else None,
+        "elements": element_table.records(positions[offset:end], fields),
+    }
+
+def list_elements(values):
+    return element_page(range(element_table.size), values)
+
+def search_elements(values):
+    """Elements matching every given filter, through the table's indexes
+
+    Filters: symbol, number, category, name (a prefix), and <field>_min /
+    <field>_max for each of periodic_table.RANGE_FIELDS.
+    """
+    ranges = {}
+    for field in periodic_table.RANGE_FIELDS:
+        low = query_number(values, f'{field}_min')
+        high = query_number(values, f'{field}_max')
+        if low is not None or high is not None:
+            ranges[field] = (-math.inf if low is None else low, math.inf if high is None else high)
+    positions = element_table.search(
+        symbol=values.get('symbol') or None,
+        name=values.get('name') or None,
+        number=query_number(values, 'number', int),
+        category=values.get('category') or None,
+        ranges=ranges,
+    )
+    return element_page(positions, values)
+
+@app.route('/elements')
+def elements():
+    try:
+        return jsonify(list_elements(request.args))
+    except ValueError as e:
+        return error_response({"elements": []}, e)
+
+@app.route('/elements/search')
+def elements_search():
+    try:
+        return jsonify(search_elements(request.args))
+    except ValueError as e:
+        return error_response({"elements": []}, e)
+
+def metrics_text():
+    """Refresh the values sampled at scrape time and render every metric"""
+    count_cache_lookups()
+    for cache, hits in (('expression', ('hits',)), ('plot', ('hits', 'disk_hits'))):
+        hit_count = sum(CACHE_LOOKUPS.value(cache=cache, result=result) for result in hits)
+        total = hit_count + CACHE_LOOKUPS.value(cache=cache, result='misses')
+        CACHE_HIT_RATIO.set(hit_count / total if total else 0.0, cache=cache)
+    for stat, value in worker_pool.stats().items():
+        WORKER_POOL.set(value, stat=stat)
+    for stat, value in core.preview_sessions.stats().items():
+        PREVIEW_SESSIONS.set(value, stat=stat)
+    return telemetry.REGISTRY.render()
+
+@app.route('/metrics')
+def metrics():
+    return Response(metrics_text(), content_type=telemetry.CONTENT_TYPE)
+
+# PRELOAD_PLOTTING=1 imports the plotting stack and draws a throwaway plot at
+# import time, so pre-fork servers hand it to every child already loaded
+app.config['PRELOAD_PLOTTING'] = os.environ.get('PRELOAD_PLOTTING', '0') == '1'
+if app.config['PRELOAD_PLOTTING']:
+    core.warm_up()
 
 if __name__ == '__main__':
+    # Warm the workers before the first request arrives.  The debug reloader
+    # serves from a child process, so only that one needs them.
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        worker_pool.start()
     app.run(debug=True, port=5000) 
\ No newline at end of file
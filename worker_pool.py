@@ -0,0 +1,243 @@
+import atexit
+import importlib
+import multiprocessing
+import queue
+import threading
+
+try:
+    import resource
+except ImportError:  # Not available on Windows; memory limits are skipped there
+    resource = None
+
+
+class PoolBusy(RuntimeError):
+    """Every worker is busy and the wait queue is full"""
+
+
+class JobTimeout(RuntimeError):
+    """A job ran past its wall-clock limit and its worker was killed"""
+
+
+class WorkerCrashed(RuntimeError):
+    """A worker process died while running a job"""
+
+
+def _worker_main(conn, memory_limit, preload, report):
+    # Import the heavy modules up front so the first job does not pay for
+    # them; 'module:function' also calls a warm-up function in that module
+    for name in preload:
+        module_name, _, function_name = name.partition(':')
+        module = importlib.import_module(module_name)
+        if function_name:
+            getattr(module, function_name)()
+
+    # Cap the address space after preloading, so the limit is spent on jobs
+    if memory_limit and resource is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+    conn.send('ready')
+
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, OSError):
+            return
+        if job is None:
+            return
+
+        func, args, kwargs = job
+        try:
+            reply = ('ok', func(*args, **kwargs))
+        except MemoryError:
+            reply = ('error', MemoryError("Job exceeded the worker memory limit"))
+        except Exception as e:
+            reply = ('error', e)
+
+        if report is not None:
+            try:
+                reply += (report(),)
+            except Exception:
+                reply += (None,)
+
+        try:
+            conn.send(reply)
+        except Exception as e:
+            # The result or exception could not be pickled
+            conn.send(('error', RuntimeError(f"{type(e).__name__}: {e}")))
+
+
+class _Worker:
+    def __init__(self, context, memory_limit, preload, report):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main,
+            args=(child_conn, memory_limit, preload, report),
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+
+    def wait_ready(self, timeout):
+        """Wait for preloading to finish; False if it takes longer than timeout"""
+        if not self.ready:
+            if not self.conn.poll(timeout):
+                return False
+            self.ready = self.conn.recv() == 'ready'
+        return self.ready
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+class WorkerPool:
+    """A warm pool of worker processes with per-job time and memory limits
+
+    At most `processes` jobs run at once and up to `max_queue` more wait for
+    a free worker; beyond that run() raises PoolBusy instead of queueing
+    without bound.  A job that runs longer than `timeout` seconds has its
+    worker killed and replaced, and raises JobTimeout.  `memory_limit` caps
+    each worker's address space in bytes, so runaway allocations fail with
+    MemoryError inside the worker.  With processes=0 jobs run inline in the
+    calling thread, without any limits.  `preload` names modules each
+    worker imports when it starts, or 'module:function' warm-up hooks.
+    Preloading is not charged to any job: a job's clock starts once its
+    worker reports ready, which may take up to `startup_timeout` seconds.
+
+    If given, report() is called in the worker after every job and its
+    result is handed to on_report() in the parent, which is how metrics
+    recorded inside a worker find their way out.  report must be picklable,
+    such as a module-level function.
+    """
+
+    def __init__(self, processes=2, max_queue=8, timeout=10.0, memory_limit=None,
+                 preload=(), start_method='spawn', report=None, on_report=None, startup_timeout=60.0):
+        self.processes = processes
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.startup_timeout = startup_timeout
+        self.memory_limit = memory_limit
+        self.preload = tuple(preload)
+        self.report = report if on_report is not None else None
+        self.on_report = on_report
+        self.submitted = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.crashes = 0
+        self._context = multiprocessing.get_context(start_method)
+        self._admission = threading.BoundedSemaphore(processes + max_queue)
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = False
+        atexit.register(self.close)
+
+    def start(self):
+        """Start the workers now rather than on the first job"""
+        with self._lock:
+            if self._started or self.processes <= 0:
+                return
+            self._started = True
+            for _ in range(self.processes):
+                self._idle.put(self._spawn())
+
+    def _spawn(self):
+        return _Worker(self._context, self.memory_limit, self.preload, self.report)
+
+    def run(self, func, *args, timeout=None, **kwargs):
+        """Run func(*args, **kwargs) in a worker and return its result
+
+        func, its arguments and its result must be picklable.  Exceptions
+        raised by the job are re-raised here.
+        """
+        if self.processes <= 0:
+            return func(*args, **kwargs)
+
+        if not self._admission.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise PoolBusy("Server is busy, try again shortly")
+        try:
+            self.start()
+            with self._lock:
+                self.submitted += 1
+            worker = self._idle.get()
+            try:
+                return self._execute(worker, (func, args, kwargs), timeout or self.timeout)
+            except (JobTimeout, WorkerCrashed):
+                worker = self._spawn()
+                raise
+            finally:
+                self._idle.put(worker)
+        finally:
+            self._admission.release()
+
+    def _execute(self, worker, job, timeout):
+        # A replacement worker may still be preloading; wait for it here so
+        # that time does not count against the job
+        try:
+            if not worker.wait_ready(self.startup_timeout):
+                raise self._crashed(worker, f"Worker did not start within {self.startup_timeout:g} seconds")
+        except (EOFError, OSError):
+            raise self._crashed(worker, "Worker exited while starting")
+        # Pickling happens before anything is written, so a bad job leaves
+        # the worker untouched
+        try:
+            worker.conn.send(job)
+        except OSError:
+            raise self._crashed(worker)
+        if not worker.conn.poll(timeout):
+            worker.kill()
+            with self._lock:
+                self.timeouts += 1
+            raise JobTimeout(f"Took longer than {timeout:g} seconds")
+        try:
+            status, value, *report = worker.conn.recv()
+        except (EOFError, OSError):
+            raise self._crashed(worker)
+        if report and report[0] is not None:
+            self.on_report(report[0])
+        if status == 'error':
+            raise value
+        return value
+
+    def _crashed(self, worker, message="Worker exited while running the job"):
+        worker.kill()
+        with self._lock:
+            self.crashes += 1
+        return WorkerCrashed(message)
+
+    def close(self):
+        """Stop every idle worker"""
+        with self._lock:
+            self._started = False
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            worker.stop()
+
+    def stats(self):
+        """Return a snapshot of the pool counters"""
+        with self._lock:
+            return {
+                'processes': self.processes,
+                'max_queue': self.max_queue,
+                'idle': self._idle.qsize(),
+                'submitted': self.submitted,
+                'rejected': self.rejected,
+                'timeouts': self.timeouts,
+                'crashes': self.crashes,
+            }